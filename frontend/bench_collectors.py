@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+"""
+Offline throughput benchmark for collect_validator_stake.py and
+profile_wallets.py against mock_solana_rpc.py.
+
+For each dataset size a mock server is started in this process and the
+scripts are run as child processes in a scratch directory, pointed at it
+through SOLANA_RPC_URL / HELIUS_RPC_URL / HELIUS_PARSE_TX_URL /
+JUPITER_PROGRAM_ID_LABELS_URL:
+
+  stake           collect_validator_stake.py for every mock validator
+  profile-rpc     profile_wallets.py over standard RPC (base64 transactions)
+  profile-helius  profile_wallets.py over Helius signatures + parseTransactions
+
+Each run reports items/sec (stake accounts for `stake`, wallets for the
+profile runs), JSON-RPC calls and HTTP requests per item, bytes transferred
+(as seen by the server, after compression) and the child's peak RSS.
+
+  python bench_collectors.py --sizes small,medium --latency-ms 20
+  python bench_collectors.py --sizes large --json-out bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Sequence, Tuple
+
+from mock_solana_rpc import MockDataset, MockSolanaServer, add_dataset_args, config_from_args
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = ("stake", "profile-rpc", "profile-helius")
+
+
+@dataclass
+class BenchSize:
+    dataset: MockDataset
+    top_n: int
+
+
+SIZES: Dict[str, BenchSize] = {
+    "small": BenchSize(MockDataset(validators=4, stake_accounts=2_000, wallets=300), top_n=25),
+    "medium": BenchSize(
+        MockDataset(validators=16, stake_accounts=20_000, wallets=3_000, signatures_per_wallet=50),
+        top_n=100,
+    ),
+    "large": BenchSize(
+        MockDataset(validators=64, stake_accounts=100_000, wallets=15_000, signatures_per_wallet=100),
+        top_n=250,
+    ),
+}
+
+
+@dataclass
+class BenchResult:
+    size: str
+    scenario: str
+    items: int
+    unit: str
+    exit_code: int
+    seconds: float
+    items_per_sec: float
+    rpc_calls: int
+    http_requests: int
+    rpc_calls_per_item: float
+    http_requests_per_item: float
+    bytes_in: int
+    bytes_out: int
+    throttled: int
+    injected_errors: int
+    peak_rss_mb: float
+    log_path: str
+
+
+def run_child(
+    script: str, args: Sequence[str], *, cwd: str, env: Dict[str, str], log_path: str
+) -> Tuple[int, float, float]:
+    """
+    Run one script to completion; returns (exit code, seconds, peak RSS in MB).
+    wait4 gives the child's own rusage, so earlier runs don't leak into ru_maxrss.
+    """
+    started = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, script), *args],
+            cwd=cwd,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        _pid, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - started
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return proc.returncode, seconds, rss_mb
+
+
+def scenario_args(scenario: str, size: BenchSize, args: argparse.Namespace) -> List[str]:
+    if scenario == "stake":
+        return ["--identities-file", "identities.txt", "--workers", str(args.workers)]
+    common = [
+        "--top-n",
+        str(size.top_n),
+        "--concurrency",
+        str(args.concurrency),
+        "--force-refresh",
+    ]
+    if scenario == "profile-helius":
+        return common + ["--helius-api-key", "bench"]
+    return common
+
+
+def bench_size(name: str, size: BenchSize, args: argparse.Namespace, workdir: str) -> List[BenchResult]:
+    results: List[BenchResult] = []
+    print(
+        f"\n== {name}: {size.dataset.validators} validators, "
+        f"{size.dataset.stake_accounts:,} stake accounts, {size.dataset.wallets:,} wallets, "
+        f"~{size.dataset.signatures_per_wallet} signatures/wallet, top {size.top_n}"
+    )
+    with MockSolanaServer(size.dataset, config_from_args(args)) as server:
+        env = {k: v for k, v in os.environ.items() if k != "HELIUS_API_KEY"}
+        env.update(server.env())
+        with open(os.path.join(workdir, "identities.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(server.network.identities) + "\n")
+
+        for scenario in args.scenarios:
+            if scenario != "stake" and not os.path.isdir(os.path.join(workdir, "output")):
+                print(f"  {scenario}: skipped (needs the stake scenario's CSVs)")
+                continue
+            server.reset_stats()
+            log_path = os.path.join(workdir, f"{scenario}.log")
+            code, seconds, rss_mb = run_child(
+                "collect_validator_stake.py" if scenario == "stake" else "profile_wallets.py",
+                scenario_args(scenario, size, args),
+                cwd=workdir,
+                env=env,
+                log_path=log_path,
+            )
+            stats = server.stats()
+            if scenario == "stake":
+                items = sum(len(v) for v in server.network.stake_by_vote.values())
+                unit = "stake accounts"
+            else:
+                items, unit = min(size.top_n, size.dataset.wallets), "wallets"
+            result = BenchResult(
+                size=name,
+                scenario=scenario,
+                items=items,
+                unit=unit,
+                exit_code=code,
+                seconds=round(seconds, 3),
+                items_per_sec=round(items / seconds, 2) if seconds > 0 else 0.0,
+                rpc_calls=stats.total_rpc_calls,
+                http_requests=stats.http_requests,
+                rpc_calls_per_item=round(stats.total_rpc_calls / max(items, 1), 3),
+                http_requests_per_item=round(stats.http_requests / max(items, 1), 3),
+                bytes_in=stats.bytes_in,
+                bytes_out=stats.bytes_out,
+                throttled=stats.throttled,
+                injected_errors=stats.injected_errors,
+                peak_rss_mb=round(rss_mb, 1),
+                log_path=log_path,
+            )
+            results.append(result)
+            report(result)
+    return results
+
+
+def report(r: BenchResult) -> None:
+    status = "ok" if r.exit_code == 0 else f"exit {r.exit_code} (see {r.log_path})"
+    print(
+        f"  {r.scenario:<15} {r.items:>8,} {r.unit:<14} {r.seconds:>8.2f}s "
+        f"{r.items_per_sec:>10,.1f}/s  {r.rpc_calls_per_item:>7.2f} calls/item "
+        f"{r.http_requests_per_item:>6.2f} req/item  "
+        f"{(r.bytes_in + r.bytes_out) / 1e6:>8.2f} MB  RSS {r.peak_rss_mb:>7.1f} MB  {status}"
+    )
+
+
+def parse_args(argv: Sequence[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmark the collectors against a local mock RPC.")
+    p.add_argument(
+        "--sizes",
+        default="small,medium",
+        help=f"Comma-separated dataset sizes: {', '.join(SIZES)} (default: small,medium).",
+    )
+    p.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help=f"Comma-separated scenarios to run, in order (default: {','.join(SCENARIOS)}).",
+    )
+    p.add_argument("--workers", type=int, default=4, help="collect_validator_stake --workers.")
+    p.add_argument("--concurrency", type=int, default=4, help="profile_wallets --concurrency.")
+    p.add_argument("--json-out", default="", help="Also write all results to this JSON file.")
+    p.add_argument(
+        "--keep", action="store_true", help="Keep the scratch directories (outputs and logs)."
+    )
+    add_dataset_args(p)
+    args = p.parse_args(argv)
+    args.sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    for s in args.sizes:
+        if s not in SIZES:
+            p.error(f"unknown size {s!r} (choose from {', '.join(SIZES)})")
+    for s in args.scenarios:
+        if s not in SCENARIOS:
+            p.error(f"unknown scenario {s!r} (choose from {', '.join(SCENARIOS)})")
+    return args
+
+
+def main(argv: Sequence[str]) -> int:
+    args = parse_args(argv)
+    print(
+        f"Mock server: latency {args.latency_ms:g} ms, "
+        f"rate limit {args.server_max_rps:g} req/s (0 = none), error rate {args.error_rate:g}"
+    )
+    results: List[BenchResult] = []
+    for name in args.sizes:
+        workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+        try:
+            results.extend(bench_size(name, SIZES[name], args, workdir))
+        finally:
+            if args.keep:
+                print(f"  outputs kept in {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+        print(f"\nWrote {len(results)} result(s) -> {args.json_out}")
+    return 1 if any(r.exit_code != 0 for r in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -3,31 +3,76 @@
 """
 Collect granular stake account data for specific Solana validator identities.
 
+Identities come from the command line and/or --identities-file (one pubkey per
+line, '#' comments allowed); with neither, the built-in VALIDATOR_IDENTITIES
+are used.
+
 Approach:
-1. Resolve each validator identity -> vote account via getVoteAccounts.
+1. Resolve each validator identity -> vote account via getVoteAccounts
+   (one call for the whole list).
 2. Query stake accounts delegated to that vote account via getProgramAccounts,
    using stake-program layout filters:
    - dataSize: 200
    - memcmp: offset 124 == vote account pubkey
-3. Emit JSON and CSV files for downstream analysis.
+   Accounts are fetched as base64 (sliced to the fields we use) and decoded
+   locally; --encoding jsonParsed asks the node to render them instead.
+3. Work out each account's effective, activating and deactivating stake at
+   the current epoch (or --epoch) from the StakeHistory sysvar, read once per
+   epoch and cached (see stake_activation.py).
+4. Emit JSON and CSV files for downstream analysis.
+Steps 2-4 run concurrently for up to --workers validators at a time; each
+validator's status, bytes received and timing are printed as it finishes.
+
+Responses are parsed incrementally: accounts are decoded one at a time as they
+come off the socket and rows are streamed straight into the JSON/CSV writers,
+so peak memory does not grow with a validator's delegator count.
+
+With --all-validators, step 2 becomes a single network-wide snapshot: every
+stake account is pulled once (dataSize filter only), decoded and partitioned
+by delegated vote account, and outputs are written for every validator in
+getVoteAccounts. Activation states are then computed for the whole snapshot
+at once (vectorized with numpy when available); per-validator runs work
+them out row by row as accounts stream in.
+
+With --snapshot-dir, nothing is fetched: stake accounts (owner Stake program,
+200 bytes), vote accounts and the StakeHistory/Clock/EpochSchedule sysvars are
+read straight out of an unpacked snapshot's account storage files
+(see solana_snapshot.py), decoded with the same layout constants, and
+written as the same rows — for the given identities, or with
+--all-validators for every vote account with delegations.
 """
 
 from __future__ import annotations
 
+import argparse
 import csv
+import itertools
 import json
+import os
+import struct
 import sys
 import time
-import urllib.error
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import rpc_transport
+import run_metrics
+import solana_snapshot
+import stake_activation
+from solana_codec import account_data_bytes, b58decode, encode_pubkey
 
 
-RPC_URL = "https://api.mainnet-beta.solana.com"
+# Endpoints can be redirected (e.g. to mock_solana_rpc.py) through the environment.
+RPC_URL = os.environ.get("SOLANA_RPC_URL") or "https://api.mainnet-beta.solana.com"
 STAKE_PROGRAM_ID = "Stake11111111111111111111111111111111111111"
+VOTE_PROGRAM_ID = "Vote111111111111111111111111111111111111111"
 
-# The two validator identity pubkeys provided by the user.
+DEFAULT_WORKERS = 4
+# Run report base path: <base>.json and <base>.prom (see run_metrics).
+METRICS_BASE_PATH = "output/stake_run_metrics"
+
+# Default validator identity pubkeys, used when none are given on the CLI.
 VALIDATOR_IDENTITIES = [
     "LeDbQ99QT342j9S5YdyXLrsq2Gu3T3dMGajExdAuE3V",
     "q9XWcZ7T1wP4bW9SB4XgNNwjnFEJ982nE8aVbbNuwot",
@@ -39,6 +84,33 @@ VALIDATOR_IDENTITIES = [
 STAKE_ACCOUNT_DATA_SIZE = 200
 VOTER_PUBKEY_OFFSET = 124
 
+# Full stake account (StakeStateV2) layout, bincode little-endian:
+#   0    u32   state: 0 Uninitialized, 1 Initialized, 2 Stake, 3 RewardsPool
+#   4    u64   meta.rent_exempt_reserve
+#   12   [32]  meta.authorized.staker
+#   44   [32]  meta.authorized.withdrawer
+#   76   48    meta.lockup (unix_timestamp, epoch, custodian)
+#   124  [32]  stake.delegation.voter_pubkey
+#   156  u64   stake.delegation.stake
+#   164  u64   stake.delegation.activation_epoch
+#   172  u64   stake.delegation.deactivation_epoch
+#   180  ...   warmup_cooldown_rate, credits_observed, stake_flags
+# Nothing past byte 180 is used, so base64 requests ask for that dataSlice.
+STAKE_STATE_INITIALIZED = 1
+STAKE_STATE_STAKE = 2
+STAKE_DATA_SLICE_LENGTH = 180
+_STAKE_LAYOUT = struct.Struct("<I8x32s32s48x32sQQQ")
+
+# (staker, withdrawer, voter, delegated lamports, activation epoch, deactivation epoch)
+StakeFields = Tuple[Optional[str], Optional[str], Optional[str], int, Optional[str], Optional[str]]
+_EMPTY_STAKE_FIELDS: StakeFields = (None, None, None, 0, None, None)
+
+# Head of a vote account (VoteStateVersions, bincode): u32 version, then
+# node_pubkey [32]; V1_14_11 (1) and Current (2) follow it with
+# authorized_withdrawer [32] and commission u8.
+VOTE_STATE_PREFIX_LENGTH = 69
+_VOTE_STATE_PREFIX = struct.Struct("<I32s32sB")
+
 
 @dataclass
 class VoteAccount:
@@ -49,62 +121,47 @@ class VoteAccount:
     epoch_credits: Optional[List[Any]]
 
 
-def _post_json_rpc(method: str, params: List[Any]) -> Dict[str, Any]:
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": method,
-        "params": params,
-    }
-    body = json.dumps(payload).encode("utf-8")
-
-    req = urllib.request.Request(
-        RPC_URL,
-        data=body,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-
-    try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            raw = resp.read()
-    except urllib.error.HTTPError as e:
-        raise RuntimeError(f"HTTP error calling {method}: {e.code} {e.reason}") from e
-    except urllib.error.URLError as e:
-        raise RuntimeError(f"Network error calling {method}: {e.reason}") from e
-
-    try:
-        parsed = json.loads(raw)
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"Invalid JSON from {method}: {raw[:200]!r}") from e
+def _post_json_rpc(method: str, params: List[Any], *, timeout: float = 60) -> Dict[str, Any]:
+    return rpc_transport.post_json_rpc(RPC_URL, method, params, timeout=timeout)
 
-    if "error" in parsed:
-        raise RuntimeError(f"RPC error calling {method}: {parsed['error']}")
 
-    return parsed["result"]
+def _stream_json_rpc(
+    method: str, params: List[Any], *, timeout: float = 60
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the entries of an array result one at a time as they are parsed
+    off the socket (timeout applies per socket read, not to the whole body).
+    """
+    return rpc_transport.stream_json_rpc_result(RPC_URL, method, params, timeout=timeout)
 
 
-def resolve_vote_accounts(identities: Iterable[str]) -> Dict[str, VoteAccount]:
+def fetch_vote_accounts() -> List[VoteAccount]:
+    """
+    All current and delinquent vote accounts from getVoteAccounts.
+    """
     result = _post_json_rpc("getVoteAccounts", [{"commitment": "finalized"}])
 
-    by_identity: Dict[str, VoteAccount] = {}
-    wanted = set(identities)
-
-    def _ingest(entries: Iterable[Dict[str, Any]]) -> None:
-        for entry in entries:
-            identity = entry.get("nodePubkey")
-            if identity not in wanted:
-                continue
-            by_identity[identity] = VoteAccount(
-                identity=identity,
+    votes: List[VoteAccount] = []
+    for entry in [*result.get("current", []), *result.get("delinquent", [])]:
+        votes.append(
+            VoteAccount(
+                identity=entry.get("nodePubkey"),
                 vote_pubkey=entry["votePubkey"],
                 activated_stake_lamports=int(entry.get("activatedStake", 0)),
                 commission=int(entry.get("commission", 0)),
                 epoch_credits=entry.get("epochCredits"),
             )
+        )
+    return votes
 
-    _ingest(result.get("current", []))
-    _ingest(result.get("delinquent", []))
+
+def resolve_vote_accounts(identities: Iterable[str]) -> Dict[str, VoteAccount]:
+    by_identity: Dict[str, VoteAccount] = {}
+    wanted = set(identities)
+
+    for vote in fetch_vote_accounts():
+        if vote.identity in wanted:
+            by_identity[vote.identity] = vote
 
     missing = wanted.difference(by_identity.keys())
     if missing:
@@ -116,71 +173,266 @@ def resolve_vote_accounts(identities: Iterable[str]) -> Dict[str, VoteAccount]:
     return by_identity
 
 
-def get_stake_accounts_for_vote(vote_pubkey: str) -> List[Dict[str, Any]]:
+def get_stake_accounts_for_vote(
+    vote_pubkey: str, *, encoding: str = "base64"
+) -> Iterator[Dict[str, Any]]:
     filters = [
         {"dataSize": STAKE_ACCOUNT_DATA_SIZE},
         {"memcmp": {"offset": VOTER_PUBKEY_OFFSET, "bytes": vote_pubkey}},
     ]
 
-    config = {
+    config: Dict[str, Any] = {
         "commitment": "finalized",
-        "encoding": "jsonParsed",
+        "encoding": encoding,
         "filters": filters,
     }
+    if encoding == "base64":
+        config["dataSlice"] = {"offset": 0, "length": STAKE_DATA_SLICE_LENGTH}
 
-    result = _post_json_rpc("getProgramAccounts", [STAKE_PROGRAM_ID, config])
-    if not isinstance(result, list):
-        raise RuntimeError(f"Unexpected getProgramAccounts result type: {type(result)}")
-    return result
+    return _stream_json_rpc("getProgramAccounts", [STAKE_PROGRAM_ID, config])
+
+
+def get_all_stake_accounts(*, encoding: str = "base64") -> Iterator[Dict[str, Any]]:
+    """
+    Every stake account on the network in one getProgramAccounts scan
+    (dataSize filter only). Expect a very large response.
+    """
+    config: Dict[str, Any] = {
+        "commitment": "finalized",
+        "encoding": encoding,
+        "filters": [{"dataSize": STAKE_ACCOUNT_DATA_SIZE}],
+    }
+    if encoding == "base64":
+        config["dataSlice"] = {"offset": 0, "length": STAKE_DATA_SLICE_LENGTH}
+
+    return _stream_json_rpc("getProgramAccounts", [STAKE_PROGRAM_ID, config], timeout=600)
 
 
 def _lamports_to_sol(lamports: int) -> float:
     return lamports / 1_000_000_000
 
 
-def extract_rows(
-    identity: str, vote_pubkey: str, accounts: Iterable[Dict[str, Any]]
-) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
+def decode_stake_account(data: bytes) -> StakeFields:
+    """
+    Decode the fields extract_rows uses from raw stake account data.
+
+    Values are rendered the way jsonParsed renders them (epochs as decimal
+    strings, no delegation fields for Initialized accounts), so both encodings
+    produce identical rows.
+    """
+    if len(data) < _STAKE_LAYOUT.size:
+        return _EMPTY_STAKE_FIELDS
+    tag, staker, withdrawer, voter, stake, activation, deactivation = _STAKE_LAYOUT.unpack_from(
+        data
+    )
+    if tag == STAKE_STATE_STAKE:
+        return (
+            encode_pubkey(staker),
+            encode_pubkey(withdrawer),
+            encode_pubkey(voter),
+            stake,
+            str(activation),
+            str(deactivation),
+        )
+    if tag == STAKE_STATE_INITIALIZED:
+        return encode_pubkey(staker), encode_pubkey(withdrawer), None, 0, None, None
+    return _EMPTY_STAKE_FIELDS
+
+
+def _parsed_stake_fields(data: Dict[str, Any]) -> StakeFields:
+    parsed = data.get("parsed", {})
+    info = parsed.get("info", {})
+
+    meta = info.get("meta", {})
+    authorized = meta.get("authorized", {})
+    staker = authorized.get("staker")
+    withdrawer = authorized.get("withdrawer")
+
+    stake = info.get("stake", {})
+    delegation = stake.get("delegation", {})
+
+    return (
+        staker,
+        withdrawer,
+        delegation.get("voter"),
+        int(delegation.get("stake", 0)),
+        delegation.get("activationEpoch"),
+        delegation.get("deactivationEpoch"),
+    )
+
+
+def _stake_fields(account: Dict[str, Any]) -> StakeFields:
+    data = account.get("data", {})
+    raw = account_data_bytes(data)
+    return decode_stake_account(raw) if raw is not None else _parsed_stake_fields(data)
+
+
+def _make_row(
+    identity: str,
+    vote_pubkey: str,
+    stake_account: Optional[str],
+    lamports: int,
+    fields: StakeFields,
+    activation: RowActivation,
+) -> Dict[str, Any]:
+    (
+        staker,
+        withdrawer,
+        delegated_vote,
+        delegated_stake_lamports,
+        activation_epoch,
+        deactivation_epoch,
+    ) = fields
+    return {
+        "validator_identity": identity,
+        "validator_vote_account": vote_pubkey,
+        "stake_account": stake_account,
+        "account_lamports": lamports,
+        "account_sol": _lamports_to_sol(lamports),
+        "delegated_vote_account": delegated_vote,
+        "delegated_stake_lamports": delegated_stake_lamports,
+        "delegated_stake_sol": _lamports_to_sol(delegated_stake_lamports),
+        "staker_authority": staker,
+        "withdraw_authority": withdrawer,
+        "activation_epoch": activation_epoch,
+        "deactivation_epoch": deactivation_epoch,
+        "effective_stake_lamports": activation[0],
+        "activating_stake_lamports": activation[1],
+        "deactivating_stake_lamports": activation[2],
+    }
+
+
+# Activation columns of a row; all None when the stake history could not be
+# loaded and rows are written without activation states.
+RowActivation = Tuple[Optional[int], Optional[int], Optional[int]]
+_NO_ACTIVATION: RowActivation = (None, None, None)
+
+
+def activation_of(
+    fields: StakeFields, *, target_epoch: int, history: Optional[stake_activation.StakeHistory]
+) -> RowActivation:
+    if history is None:
+        return _NO_ACTIVATION
+    return stake_activation.activation_status(
+        fields[3],
+        stake_activation.parse_epoch(fields[4]),
+        stake_activation.parse_epoch(fields[5]),
+        target_epoch,
+        history,
+    )
 
+
+def iter_rows(
+    identity: str,
+    vote_pubkey: str,
+    accounts: Iterable[Dict[str, Any]],
+    *,
+    target_epoch: int,
+    history: Optional[stake_activation.StakeHistory],
+) -> Iterator[Dict[str, Any]]:
     for entry in accounts:
-        stake_account = entry.get("pubkey")
         account = entry.get("account", {})
-        lamports = int(account.get("lamports", 0))
-
-        parsed = account.get("data", {}).get("parsed", {})
-        info = parsed.get("info", {})
-
-        meta = info.get("meta", {})
-        authorized = meta.get("authorized", {})
-        staker = authorized.get("staker")
-        withdrawer = authorized.get("withdrawer")
-
-        stake = info.get("stake", {})
-        delegation = stake.get("delegation", {})
-
-        delegated_vote = delegation.get("voter")
-        delegated_stake_lamports = int(delegation.get("stake", 0))
-        activation_epoch = delegation.get("activationEpoch")
-        deactivation_epoch = delegation.get("deactivationEpoch")
-
-        row = {
-            "validator_identity": identity,
-            "validator_vote_account": vote_pubkey,
-            "stake_account": stake_account,
-            "account_lamports": lamports,
-            "account_sol": _lamports_to_sol(lamports),
-            "delegated_vote_account": delegated_vote,
-            "delegated_stake_lamports": delegated_stake_lamports,
-            "delegated_stake_sol": _lamports_to_sol(delegated_stake_lamports),
-            "staker_authority": staker,
-            "withdraw_authority": withdrawer,
-            "activation_epoch": activation_epoch,
-            "deactivation_epoch": deactivation_epoch,
-        }
-        rows.append(row)
-
-    return rows
+        fields = _stake_fields(account)
+        yield _make_row(
+            identity,
+            vote_pubkey,
+            entry.get("pubkey"),
+            int(account.get("lamports", 0)),
+            fields,
+            activation_of(fields, target_epoch=target_epoch, history=history),
+        )
+
+
+def extract_rows(
+    identity: str,
+    vote_pubkey: str,
+    accounts: Iterable[Dict[str, Any]],
+    *,
+    target_epoch: int,
+    history: Optional[stake_activation.StakeHistory],
+) -> List[Dict[str, Any]]:
+    return list(
+        iter_rows(identity, vote_pubkey, accounts, target_epoch=target_epoch, history=history)
+    )
+
+
+# (stake account pubkey, account lamports, decoded fields) kept per voter in
+# snapshot mode; rows are only materialized when a validator's files are written.
+CompactStake = Tuple[Optional[str], int, StakeFields]
+
+
+def partition_by_voter(
+    accounts: Iterable[Dict[str, Any]], vote_pubkeys: Iterable[str]
+) -> Dict[str, List[CompactStake]]:
+    """
+    One pass over a network-wide stake snapshot, grouping delegated accounts
+    by vote account. Accounts delegated to votes outside vote_pubkeys (and
+    undelegated ones) are dropped.
+    """
+    return partition_stakes(map(_compact_stake, accounts), vote_pubkeys)
+
+
+def _compact_stake(entry: Dict[str, Any]) -> CompactStake:
+    account = entry.get("account", {})
+    return entry.get("pubkey"), int(account.get("lamports", 0)), _stake_fields(account)
+
+
+def partition_stakes(
+    stakes: Iterable[CompactStake], vote_pubkeys: Iterable[str]
+) -> Dict[str, List[CompactStake]]:
+    partitions: Dict[str, List[CompactStake]] = {vote: [] for vote in vote_pubkeys}
+    for stake in stakes:
+        voter = stake[2][2]
+        bucket = partitions.get(voter) if voter else None
+        if bucket is not None:
+            bucket.append(stake)
+    return partitions
+
+
+# Per-voter (effective, activating, deactivating) columns, aligned with the
+# voter's CompactStake list.
+ActivationColumns = Tuple[List[Optional[int]], List[Optional[int]], List[Optional[int]]]
+
+
+def activation_by_voter(
+    partitions: Dict[str, List[CompactStake]],
+    *,
+    target_epoch: int,
+    history: Optional[stake_activation.StakeHistory],
+) -> Dict[str, ActivationColumns]:
+    """
+    Activation states for a whole snapshot in one stake_activation.activation_arrays
+    pass over every partition's accounts, split back per voter. Without a
+    history every column is None.
+    """
+    if history is None:
+        return {vote: ([None] * len(stakes),) * 3 for vote, stakes in partitions.items()}
+    votes = list(partitions)
+    stakes = [stake for vote in votes for stake in partitions[vote]]
+    effective, activating, deactivating = stake_activation.activation_arrays(
+        [fields[3] for _pubkey, _lamports, fields in stakes],
+        [stake_activation.parse_epoch(fields[4]) for _pubkey, _lamports, fields in stakes],
+        [stake_activation.parse_epoch(fields[5]) for _pubkey, _lamports, fields in stakes],
+        target_epoch=target_epoch,
+        history=history,
+    )
+    columns: Dict[str, ActivationColumns] = {}
+    start = 0
+    for vote in votes:
+        end = start + len(partitions[vote])
+        columns[vote] = (effective[start:end], activating[start:end], deactivating[start:end])
+        start = end
+    return columns
+
+
+def rows_from_partition(
+    identity: str,
+    vote_pubkey: str,
+    stakes: Iterable[CompactStake],
+    activation: ActivationColumns,
+) -> Iterator[Dict[str, Any]]:
+    for (stake_account, lamports, fields), state in zip(stakes, zip(*activation)):
+        yield _make_row(identity, vote_pubkey, stake_account, lamports, fields, state)
 
 
 def _ensure_output_dir() -> None:
@@ -193,79 +445,528 @@ def _ensure_output_dir() -> None:
         raise RuntimeError(f"Failed to create output directory: {e}") from e
 
 
-def write_outputs(identity: str, rows: List[Dict[str, Any]]) -> Tuple[str, str]:
+FIELDNAMES = [
+    "validator_identity",
+    "validator_vote_account",
+    "stake_account",
+    "account_lamports",
+    "account_sol",
+    "delegated_vote_account",
+    "delegated_stake_lamports",
+    "delegated_stake_sol",
+    "staker_authority",
+    "withdraw_authority",
+    "activation_epoch",
+    "deactivation_epoch",
+    "effective_stake_lamports",
+    "activating_stake_lamports",
+    "deactivating_stake_lamports",
+]
+
+
+@dataclass
+class StakeTotals:
+    accounts: int = 0
+    delegated_lamports: int = 0
+    effective_lamports: int = 0
+    activating_lamports: int = 0
+    deactivating_lamports: int = 0
+    # Set when rows were written without a stake history (activation columns None).
+    activation_unknown: bool = False
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.accounts += 1
+        self.delegated_lamports += row["delegated_stake_lamports"]
+        if row["effective_stake_lamports"] is None:
+            self.activation_unknown = True
+            return
+        self.effective_lamports += row["effective_stake_lamports"]
+        self.activating_lamports += row["activating_stake_lamports"]
+        self.deactivating_lamports += row["deactivating_stake_lamports"]
+
+    def sol(self, lamports: int) -> str:
+        # Activation totals render as "n/a" when they could not be computed.
+        return "n/a" if self.activation_unknown else f"{_lamports_to_sol(lamports):,.2f}"
+
+
+def _json_array_item(row: Dict[str, Any]) -> str:
+    # Same text json.dump(rows, indent=2, sort_keys=True) emits for one element.
+    return "\n".join(
+        "  " + line for line in json.dumps(row, indent=2, sort_keys=True).split("\n")
+    )
+
+
+def write_outputs(
+    identity: str, rows: Iterable[Dict[str, Any]], totals: Optional[StakeTotals] = None
+) -> Tuple[str, str]:
+    """
+    Stream rows into the identity's JSON and CSV files in a single pass.
+
+    The JSON is byte-identical to json.dump(list(rows), indent=2,
+    sort_keys=True). When given, `totals` is filled in along the way. Both
+    files are written under a .tmp name and renamed into place only once
+    `rows` is exhausted, so a fetch that fails mid-stream leaves the previous
+    outputs untouched.
+    """
     _ensure_output_dir()
 
     json_path = f"output/{identity}.stake_accounts.json"
     csv_path = f"output/{identity}.stake_accounts.csv"
+    totals = totals if totals is not None else StakeTotals()
 
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(rows, f, indent=2, sort_keys=True)
-
-    fieldnames = [
-        "validator_identity",
-        "validator_vote_account",
-        "stake_account",
-        "account_lamports",
-        "account_sol",
-        "delegated_vote_account",
-        "delegated_stake_lamports",
-        "delegated_stake_sol",
-        "staker_authority",
-        "withdraw_authority",
-        "activation_epoch",
-        "deactivation_epoch",
-    ]
-
-    with open(csv_path, "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+    try:
+        with open(json_path + ".tmp", "w", encoding="utf-8") as jf, open(
+            csv_path + ".tmp", "w", encoding="utf-8", newline=""
+        ) as cf:
+            writer = csv.DictWriter(cf, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            jf.write("[")
+            for row in rows:
+                jf.write("\n" if totals.accounts == 0 else ",\n")
+                jf.write(_json_array_item(row))
+                writer.writerow(row)
+                totals.add(row)
+            jf.write("\n]" if totals.accounts else "]")
+        os.replace(json_path + ".tmp", json_path)
+        os.replace(csv_path + ".tmp", csv_path)
+    except BaseException:
+        for path in (json_path, csv_path):
+            try:
+                os.remove(path + ".tmp")
+            except OSError:
+                pass
+        raise
 
     return json_path, csv_path
 
 
-def summarize(identity: str, vote: VoteAccount, rows: List[Dict[str, Any]]) -> str:
-    total_accounts = len(rows)
-    total_delegated_lamports = sum(r["delegated_stake_lamports"] for r in rows)
-    total_delegated_sol = _lamports_to_sol(total_delegated_lamports)
+def summarize_totals(identity: str, vote: VoteAccount, totals: StakeTotals) -> str:
+    total_delegated_sol = _lamports_to_sol(totals.delegated_lamports)
 
     return (
         f"{identity}\n"
         f"  vote account: {vote.vote_pubkey}\n"
-        f"  stake accounts: {total_accounts}\n"
+        f"  stake accounts: {totals.accounts}\n"
         f"  delegated stake (sum): {total_delegated_sol:,.2f} SOL\n"
+        f"  effective stake: {totals.sol(totals.effective_lamports)} SOL "
+        f"(getVoteAccounts: {_lamports_to_sol(vote.activated_stake_lamports):,.2f} SOL)\n"
+        f"  activating: {totals.sol(totals.activating_lamports)} SOL, "
+        f"deactivating: {totals.sol(totals.deactivating_lamports)} SOL\n"
     )
 
 
-def main() -> int:
-    identities = VALIDATOR_IDENTITIES
-    print("Resolving vote accounts for validator identities...")
-    votes_by_identity = resolve_vote_accounts(identities)
+def summarize(identity: str, vote: VoteAccount, rows: List[Dict[str, Any]]) -> str:
+    totals = StakeTotals()
+    for row in rows:
+        totals.add(row)
+    return summarize_totals(identity, vote, totals)
+
+
+def parse_args(argv: Sequence[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument(
+        "identities",
+        nargs="*",
+        help="Validator identity pubkeys (default: the built-in VALIDATOR_IDENTITIES).",
+    )
+    p.add_argument(
+        "--identities-file",
+        help="File with one validator identity per line ('#' starts a comment).",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Validators fetched and written in parallel (default: {DEFAULT_WORKERS}).",
+    )
+    p.add_argument(
+        "--max-rps",
+        type=float,
+        default=0.0,
+        help=(
+            "Requests-per-second ceiling for the RPC endpoint, shared by all workers "
+            "(default: 0 = no ceiling; the limiter still backs off on 429s)."
+        ),
+    )
+    p.add_argument(
+        "--encoding",
+        choices=("base64", "jsonParsed"),
+        default="base64",
+        help=(
+            "Stake account encoding requested from getProgramAccounts (default: base64, "
+            "decoded locally; jsonParsed has the RPC node render each account)."
+        ),
+    )
+    p.add_argument(
+        "--epoch",
+        type=int,
+        default=None,
+        help=(
+            "Epoch to compute effective/activating/deactivating stake at "
+            "(default: the current epoch)."
+        ),
+    )
+    p.add_argument(
+        "--all-validators",
+        action="store_true",
+        help=(
+            "Snapshot mode: scan every stake account once and write outputs for "
+            "every validator in getVoteAccounts."
+        ),
+    )
+    p.add_argument(
+        "--snapshot-dir",
+        help=(
+            "Read stake, vote and sysvar accounts from an unpacked snapshot (its accounts/ "
+            "storage files) instead of the RPC node; works with identities or --all-validators."
+        ),
+    )
+    p.add_argument(
+        "--scan-workers",
+        type=int,
+        default=0,
+        help="Processes scanning snapshot storage files (default: 0 = CPU count).",
+    )
+    p.add_argument(
+        "--metrics-out",
+        default=METRICS_BASE_PATH,
+        help=(
+            "Write the run report (per-method latency/bytes/retries) to <path>.json and "
+            f"<path>.prom (default: {METRICS_BASE_PATH}; empty disables)."
+        ),
+    )
+    return p.parse_args(argv)
 
-    for identity in identities:
-        vote = votes_by_identity[identity]
-        print(f"\nCollecting stake accounts delegated to {identity}...")
-        print(f"Resolved vote account: {vote.vote_pubkey}")
 
-        accounts = get_stake_accounts_for_vote(vote.vote_pubkey)
-        rows = extract_rows(identity, vote.vote_pubkey, accounts)
+def collect_all_validators(
+    *, encoding: str, target_epoch: int, history: Optional[stake_activation.StakeHistory]
+) -> None:
+    print("Fetching all vote accounts...")
+    votes = fetch_vote_accounts()
+    print(f"  {len(votes):,} vote accounts")
 
-        json_path, csv_path = write_outputs(identity, rows)
-        print(summarize(identity, vote, rows))
-        print(f"  wrote: {json_path}")
-        print(f"  wrote: {csv_path}")
+    print("Fetching network-wide stake snapshot (single getProgramAccounts scan)...")
+    started = time.monotonic()
+    partitions = partition_by_voter(
+        get_all_stake_accounts(encoding=encoding), (v.vote_pubkey for v in votes)
+    )
+    delegated = sum(len(p) for p in partitions.values())
+    print(
+        f"  {delegated:,} delegated stake accounts partitioned in "
+        f"{time.monotonic() - started:,.1f}s"
+    )
 
-        # Be polite to the RPC.
-        time.sleep(0.5)
+    started = time.monotonic()
+    with run_metrics.registry().phase("stake_activation"):
+        activation = activation_by_voter(partitions, target_epoch=target_epoch, history=history)
+    if history is not None:
+        print(
+            f"  activation states at epoch {target_epoch} computed in "
+            f"{time.monotonic() - started:,.1f}s"
+        )
+
+    write_partitions(votes, partitions, activation)
+
+
+def write_partitions(
+    votes: Iterable[VoteAccount],
+    partitions: Dict[str, List[CompactStake]],
+    activation: Dict[str, ActivationColumns],
+) -> None:
+    """
+    Write each identity's outputs from its vote accounts' partitions. Files
+    are named by identity, so an identity running several vote accounts gets
+    one pair holding all of them (each row keeps its validator_vote_account).
+    """
+    by_identity: Dict[str, List[VoteAccount]] = {}
+    for vote in sorted(votes, key=lambda v: v.activated_stake_lamports, reverse=True):
+        by_identity.setdefault(vote.identity, []).append(vote)
+    for identity, identity_votes in by_identity.items():
+        totals = StakeTotals()
+        rows = itertools.chain.from_iterable(
+            rows_from_partition(
+                identity,
+                vote.vote_pubkey,
+                partitions.pop(vote.vote_pubkey),
+                activation.pop(vote.vote_pubkey),
+            )
+            for vote in identity_votes
+        )
+        write_outputs(identity, rows, totals)
+        print(
+            f"{identity} ({', '.join(v.vote_pubkey for v in identity_votes)}): "
+            f"{totals.accounts:,} stake accounts, "
+            f"{_lamports_to_sol(totals.delegated_lamports):,.2f} SOL delegated, "
+            f"{totals.sol(totals.effective_lamports)} SOL effective"
+        )
+
+
+def decode_vote_account(vote_pubkey: str, data: bytes) -> Optional[VoteAccount]:
+    """
+    Identity and commission from the head of raw vote account data; None for
+    uninitialized accounts. activated_stake_lamports is left for the caller.
+    """
+    if len(data) < _VOTE_STATE_PREFIX.size:
+        return None
+    version, node, _withdrawer, commission = _VOTE_STATE_PREFIX.unpack_from(data)
+    if node == bytes(32):
+        return None
+    return VoteAccount(
+        identity=encode_pubkey(node),
+        vote_pubkey=vote_pubkey,
+        activated_stake_lamports=0,
+        commission=commission if version in (1, 2) else 0,
+        epoch_credits=None,
+    )
 
-    print("\nDone.")
+
+def collect_from_snapshot(
+    snapshot_dir: str,
+    *,
+    identities: Optional[List[str]],
+    epoch: Optional[int],
+    workers: Optional[int],
+) -> None:
+    """
+    Offline counterpart of collect_all_validators / collect_validator: one
+    scan of the snapshot's storage files, then the same partition, activation
+    and row code. identities=None writes every vote account with delegations.
+    """
+    print(f"Scanning account storage files under {snapshot_dir}...")
+    started = time.monotonic()
+    sysvars = [
+        stake_activation.STAKE_HISTORY_SYSVAR,
+        stake_activation.CLOCK_SYSVAR,
+        stake_activation.EPOCH_SCHEDULE_SYSVAR,
+        stake_activation.REDUCE_STAKE_WARMUP_COOLDOWN_FEATURE,
+    ]
+    stake_owner, vote_owner = b58decode(STAKE_PROGRAM_ID), b58decode(VOTE_PROGRAM_ID)
+    with run_metrics.registry().phase("snapshot_scan"):
+        accounts = solana_snapshot.scan_snapshot(
+            snapshot_dir,
+            owners={
+                stake_owner: (STAKE_ACCOUNT_DATA_SIZE, STAKE_DATA_SLICE_LENGTH),
+                vote_owner: (None, VOTE_STATE_PREFIX_LENGTH),
+            },
+            pubkeys=[b58decode(key) for key in sysvars],
+            workers=workers,
+        )
+    stakes: List[CompactStake] = []
+    votes_by_pubkey: Dict[str, VoteAccount] = {}
+    sysvar_data: Dict[str, bytes] = {}
+    for raw, account in accounts.items():
+        pubkey = encode_pubkey(raw)
+        if pubkey in sysvars:
+            sysvar_data[pubkey] = account.data
+        elif account.owner == stake_owner:
+            stakes.append((pubkey, account.lamports, decode_stake_account(account.data)))
+        elif account.owner == vote_owner:
+            vote = decode_vote_account(pubkey, account.data)
+            if vote is not None:
+                votes_by_pubkey[pubkey] = vote
+    print(
+        f"  {len(stakes):,} stake accounts, {len(votes_by_pubkey):,} vote accounts in "
+        f"{time.monotonic() - started:,.1f}s"
+    )
+
+    history = stake_activation.stake_history_from_accounts(sysvar_data)
+    target_epoch = epoch if epoch is not None else history.epoch
+    print(
+        f"Stake history: {len(history.entries)} epochs, snapshot epoch {history.epoch}; "
+        f"activation computed at epoch {target_epoch}"
+    )
+
+    if identities is not None:
+        wanted = set(identities)
+        votes = [vote for vote in votes_by_pubkey.values() if vote.identity in wanted]
+        found = {vote.identity for vote in votes}
+        missing = [identity for identity in identities if identity not in found]
+        if missing:
+            raise RuntimeError(
+                f"No vote account found in the snapshot for identities: {', '.join(missing)}"
+            )
+    else:
+        votes = list(votes_by_pubkey.values())
+
+    partitions = partition_stakes(stakes, (v.vote_pubkey for v in votes))
+    if identities is None:
+        votes = [v for v in votes if partitions[v.vote_pubkey]]
+    with run_metrics.registry().phase("stake_activation"):
+        activation = activation_by_voter(partitions, target_epoch=target_epoch, history=history)
+    # What getVoteAccounts reports as activatedStake: the summed effective stake.
+    for vote in votes:
+        vote.activated_stake_lamports = sum(activation[vote.vote_pubkey][0])
+    write_partitions(votes, partitions, activation)
+
+
+def load_identities(args: argparse.Namespace) -> List[str]:
+    """
+    CLI identities followed by --identities-file entries, de-duplicated in
+    first-seen order; the built-in list when neither is given.
+    """
+    identities: List[str] = list(args.identities)
+    if args.identities_file:
+        with open(args.identities_file, "r", encoding="utf-8") as f:
+            for line in f:
+                identity = line.split("#", 1)[0].strip()
+                if identity:
+                    identities.append(identity)
+    if not identities:
+        identities = list(VALIDATOR_IDENTITIES)
+    return list(dict.fromkeys(identities))
+
+
+@dataclass
+class ValidatorResult:
+    identity: str
+    vote: VoteAccount
+    totals: StakeTotals
+    json_path: Optional[str] = None
+    csv_path: Optional[str] = None
+    bytes_received: int = 0
+    elapsed_s: float = 0.0
+    error: Optional[str] = None
+
+
+def collect_validator(
+    identity: str,
+    vote: VoteAccount,
+    *,
+    encoding: str,
+    target_epoch: int,
+    history: Optional[stake_activation.StakeHistory],
+) -> ValidatorResult:
+    """
+    Fetch and write one validator's stake accounts. Errors are captured in the
+    result so one bad validator does not abort the rest of the run; its
+    previous output files are left as they were and no paths are reported.
+    """
+    result = ValidatorResult(identity=identity, vote=vote, totals=StakeTotals())
+    started = time.monotonic()
+    bytes_before = rpc_transport.thread_bytes_received()
+    try:
+        accounts = get_stake_accounts_for_vote(vote.vote_pubkey, encoding=encoding)
+        rows = iter_rows(
+            identity, vote.vote_pubkey, accounts, target_epoch=target_epoch, history=history
+        )
+        paths = write_outputs(identity, rows, result.totals)
+    except Exception as e:
+        # RPC/transport errors are RuntimeErrors with a readable message;
+        # anything else (e.g. undecodable data) is named by its type.
+        result.error = str(e) if isinstance(e, RuntimeError) else f"{type(e).__name__}: {e}"
+        result.totals = StakeTotals()  # rows streamed before the failure were not kept
+    else:
+        result.json_path, result.csv_path = paths
+    result.bytes_received = rpc_transport.thread_bytes_received() - bytes_before
+    result.elapsed_s = time.monotonic() - started
+    return result
+
+
+def report_validator(result: ValidatorResult, done: int, total: int) -> None:
+    status = "FAILED" if result.error else "ok"
+    print(
+        f"[{done}/{total}] {status} {result.identity} ({result.vote.vote_pubkey}): "
+        f"{result.totals.accounts:,} stake accounts, "
+        f"{_lamports_to_sol(result.totals.delegated_lamports):,.2f} SOL delegated "
+        f"({result.totals.sol(result.totals.effective_lamports)} effective), "
+        f"{result.bytes_received / 1e6:,.2f} MB in {result.elapsed_s:,.1f}s"
+    )
+    if result.error:
+        print(f"  error: {result.error}")
+    else:
+        print(f"  wrote: {result.json_path}")
+        print(f"  wrote: {result.csv_path}")
+
+
+def main(argv: Sequence[str]) -> int:
+    args = parse_args(argv)
+    if args.snapshot_dir:
+        collect_from_snapshot(
+            args.snapshot_dir,
+            identities=None if args.all_validators else load_identities(args),
+            epoch=args.epoch,
+            workers=args.scan_workers or None,
+        )
+        if args.metrics_out:
+            run_metrics.write_report(args.metrics_out, mode="snapshot")
+        print("Done.")
+        return 0
+
+    rpc_transport.configure(max_rps=args.max_rps)
+    history: Optional[stake_activation.StakeHistory]
+    try:
+        history = stake_activation.load_stake_history(RPC_URL)
+    except RuntimeError as e:
+        history = None
+        print(
+            f"WARN: could not load the stake history ({e}); "
+            "writing rows without activation states"
+        )
+    if history is not None:
+        target_epoch = args.epoch if args.epoch is not None else history.epoch
+        print(
+            f"Stake history: {len(history.entries)} epochs, current epoch {history.epoch}; "
+            f"activation computed at epoch {target_epoch}"
+        )
+    else:
+        target_epoch = args.epoch if args.epoch is not None else 0
+    if args.all_validators:
+        collect_all_validators(encoding=args.encoding, target_epoch=target_epoch, history=history)
+        print(f"\nHTTP transport: {rpc_transport.stats().summary()}")
+        if args.metrics_out:
+            run_metrics.write_report(
+                args.metrics_out, transport=rpc_transport.stats().as_dict(), mode="all-validators"
+            )
+        print("Done.")
+        return 0
+
+    identities = load_identities(args)
+    print(f"Resolving vote accounts for {len(identities):,} validator identities...")
+    votes_by_identity = resolve_vote_accounts(identities)
+
+    workers = max(1, min(args.workers, len(identities)))
+    print(f"Collecting stake accounts with {workers} worker(s)...\n")
+    failed: List[str] = []
+    progress = run_metrics.ProgressLine(
+        len(identities), unit="validators", registry=run_metrics.registry()
+    )
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="validator") as executor:
+        futures = [
+            executor.submit(
+                collect_validator,
+                identity,
+                votes_by_identity[identity],
+                encoding=args.encoding,
+                target_epoch=target_epoch,
+                history=history,
+            )
+            for identity in identities
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            report_validator(result, done, len(futures))
+            progress.advance(failed=bool(result.error))
+            if result.error:
+                failed.append(result.identity)
+
+    print(f"\nHTTP transport: {rpc_transport.stats().summary()}")
+    if args.metrics_out:
+        run_metrics.write_report(
+            args.metrics_out,
+            transport=rpc_transport.stats().as_dict(),
+            validators=len(identities),
+            validators_failed=len(failed),
+        )
+    if failed:
+        print(f"{len(failed)} validator(s) failed: {', '.join(failed)}")
+        return 1
+    print("Done.")
     return 0
 
 
 if __name__ == "__main__":
     try:
-        raise SystemExit(main())
+        raise SystemExit(main(sys.argv[1:]))
     except KeyboardInterrupt:
         print("\nInterrupted.", file=sys.stderr)
         raise SystemExit(130)
@@ -0,0 +1,1020 @@
+#!/usr/bin/env python3
+
+"""
+Local stand-in for the Solana JSON-RPC, Helius and Jupiter endpoints used by
+collect_validator_stake.py and profile_wallets.py.
+
+Serves a deterministic synthetic dataset (validators, stake accounts, wallets
+and their transaction history) with configurable latency, a request-rate
+limit answered with 429s, and random 503s, and counts every HTTP request,
+JSON-RPC call and byte so runs can be measured offline. bench_collectors.py
+drives it; it can also be run on its own:
+
+  python mock_solana_rpc.py --port 8899 --latency-ms 20
+
+and point the scripts at it with the environment variables it prints on
+startup (SOLANA_RPC_URL, HELIUS_RPC_URL, HELIUS_PARSE_TX_URL,
+JUPITER_PROGRAM_ID_LABELS_URL).
+
+Served methods: getVoteAccounts, getProgramAccounts (dataSize/memcmp filters,
+dataSlice), getBalance, getMultipleAccounts (wallets, mints, the StakeHistory
+sysvar), getEpochInfo, getEpochSchedule, getGenesisHash,
+getTokenAccountsByOwner, getSignaturesForAddress, getTransaction (base64 and
+jsonParsed), getTransactionsForAddress; POST /v0/transactions (Helius
+parseTransactions); GET /program-id-to-label (Jupiter, with ETag revalidation).
+
+--write-snapshot DIR writes the same stake accounts, vote accounts and sysvars
+as account storage files under DIR/accounts/ (see solana_snapshot.py) instead
+of serving, for collect_validator_stake.py --snapshot-dir.
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import random
+import struct
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import solana_snapshot
+import stake_activation
+from solana_codec import b58decode, b58encode, ui_amount, ui_amount_string
+
+
+STAKE_PROGRAM_ID = "Stake11111111111111111111111111111111111111"
+VOTE_PROGRAM_ID = "Vote111111111111111111111111111111111111111"
+SYSTEM_PROGRAM_ID = "11111111111111111111111111111111"
+TOKEN_PROGRAM_ID = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+TOKEN_2022_PROGRAM_ID = "TokenzQdBNbLqP5VEhdkAS6EPFLC1PHnBqCXEpPxuEb"
+ORCA_WHIRLPOOLS_PROGRAM_ID = "whirLbMiicVdio4qvUfM5KAg6Ct8VwpYzGff3uctyCc"
+JUPITER_V6_PROGRAM_ID = "JUP6LkbZbjS1jKKwapdHNy74zcZ3tLUZoi5QNyVTaV4"
+JUPITER_LABELS = {
+    JUPITER_V6_PROGRAM_ID: "Jupiter Aggregator v6",
+    "JUP4Fb2cqiRUcaTHdrPC8h2gNsA2ETXiPDD33WcGuJB": "Jupiter Aggregator v4",
+}
+
+STAKE_ACCOUNT_LAYOUT = struct.Struct("<IQ32s32sqQ32s32sQQQdQB3x")  # 200 bytes
+TOKEN_ACCOUNT_LAYOUT = struct.Struct("<32s32sQI32sBIQQI32s")  # 165 bytes
+MINT_LAYOUT = struct.Struct("<I32sQBBI32s")  # 82 bytes
+# Token-2022 ScaledUiAmount extension (type 25): authority, multiplier,
+# new_multiplier_effective_timestamp, new_multiplier.
+SCALED_UI_AMOUNT_EXTENSION = struct.Struct("<HH32sdqd")
+U64_MAX = 2**64 - 1
+CURRENT_EPOCH = 750
+# Epoch the reduced (9%) warmup/cooldown rate took effect on the mock cluster.
+NEW_RATE_ACTIVATION_EPOCH = 600
+SLOTS_PER_EPOCH = 432_000
+STAKE_RENT_EXEMPT_RESERVE = 2_282_880
+TOKEN_RENT_EXEMPT_RESERVE = 2_039_280
+MINT_COUNT = 40
+TOKEN_2022_MINT_COUNT = 8
+
+
+def _digest(*parts: Any) -> bytes:
+    return hashlib.sha256(":".join(str(p) for p in parts).encode()).digest()
+
+
+def _pubkey(*parts: Any) -> str:
+    return b58encode(_digest(*parts))
+
+
+@dataclass
+class MockConfig:
+    """
+    Fault and latency injection, applied per HTTP request (a JSON-RPC batch
+    is one request).
+    """
+
+    latency_ms: float = 0.0  # mean; each request sleeps 0.5x-1.5x of this
+    max_rps: float = 0.0  # token bucket over all endpoints; 0 = unlimited
+    error_rate: float = 0.0  # fraction of requests answered with a 503
+    seed: int = 0
+
+
+@dataclass
+class MockDataset:
+    """
+    Sizes of the synthetic network. Stake is skewed so that a few validators
+    and wallets hold most of it; every wallet gets roughly
+    signatures_per_wallet transactions spaced signature_interval_s apart.
+    """
+
+    validators: int = 4
+    stake_accounts: int = 2_000
+    wallets: int = 300
+    signatures_per_wallet: int = 25
+    signature_interval_s: int = 6 * 3600
+    seed: int = 7
+
+
+@dataclass
+class MockStats:
+    http_requests: int = 0
+    rpc_calls: Counter = field(default_factory=Counter)
+    throttled: int = 0
+    injected_errors: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+    @property
+    def total_rpc_calls(self) -> int:
+        return sum(self.rpc_calls.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "http_requests": self.http_requests,
+            "rpc_calls": dict(self.rpc_calls),
+            "total_rpc_calls": self.total_rpc_calls,
+            "throttled": self.throttled,
+            "injected_errors": self.injected_errors,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+class _TokenBucket:
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class MockNetwork:
+    """
+    The synthetic chain state and the JSON-RPC method implementations.
+    Stake accounts are generated up front; wallet activity is derived on
+    demand from the wallet pubkey, so any address has a stable history.
+    """
+
+    def __init__(self, dataset: MockDataset) -> None:
+        self.dataset = dataset
+        self.now = int(time.time())
+        self.slot = CURRENT_EPOCH * SLOTS_PER_EPOCH + 1_000
+        rnd = random.Random(dataset.seed)
+
+        self.identities = [_pubkey("identity", i) for i in range(dataset.validators)]
+        self.votes = [_pubkey("vote", i) for i in range(dataset.validators)]
+        self.wallets = [_pubkey("wallet", i) for i in range(dataset.wallets)]
+        self.mints = {
+            TOKEN_PROGRAM_ID: [
+                (_pubkey("mint", i), rnd.choice((0, 5, 6, 8, 9))) for i in range(MINT_COUNT)
+            ],
+            TOKEN_2022_PROGRAM_ID: [
+                (_pubkey("mint-2022", i), (0, 6, 9)[_digest("mint-2022", i)[0] % 3])
+                for i in range(TOKEN_2022_MINT_COUNT)
+            ],
+        }
+        # mint -> (token program, decimals, UI multiplier). Token-2022 mints
+        # carry TokenMetadata; the first also has a ScaledUiAmount extension.
+        self.mint_info: Dict[str, Tuple[str, int, float]] = {
+            mint: (program_id, decimals, 1.0)
+            for program_id, mints in self.mints.items()
+            for mint, decimals in mints
+        }
+        scaled, scaled_decimals = self.mints[TOKEN_2022_PROGRAM_ID][0]
+        self.mint_info[scaled] = (TOKEN_2022_PROGRAM_ID, scaled_decimals, 1.5)
+
+        vote_raw = [b58decode(v) for v in self.votes]
+        wallet_raw = [b58decode(w) for w in self.wallets]
+        self.stake_accounts: List[Tuple[str, int, bytes]] = []
+        self.stake_by_vote: Dict[bytes, List[int]] = {v: [] for v in vote_raw}
+        self.activated_stake = [0] * dataset.validators
+        for j in range(dataset.stake_accounts):
+            v = min(int(dataset.validators * rnd.random() ** 2), dataset.validators - 1)
+            w = min(int(dataset.wallets * rnd.random() ** 3), dataset.wallets - 1)
+            staker = wallet_raw[w]
+            withdrawer = staker if rnd.random() < 0.8 else wallet_raw[rnd.randrange(dataset.wallets)]
+            lamports = STAKE_RENT_EXEMPT_RESERVE + int(10**9 * 10 ** (rnd.random() * 5))
+            if rnd.random() < 0.05:
+                state, voter, stake, activation, deactivation = 1, bytes(32), 0, 0, 0
+            else:
+                state, voter = 2, vote_raw[v]
+                stake = lamports - STAKE_RENT_EXEMPT_RESERVE
+                activation = rnd.randrange(CURRENT_EPOCH - 400, CURRENT_EPOCH + 1)
+                deactivation = (
+                    rnd.randrange(activation, CURRENT_EPOCH + 1) if rnd.random() < 0.05 else U64_MAX
+                )
+            data = STAKE_ACCOUNT_LAYOUT.pack(
+                state,
+                STAKE_RENT_EXEMPT_RESERVE,
+                staker,
+                withdrawer,
+                0,
+                0,
+                bytes(32),
+                voter,
+                stake,
+                activation,
+                deactivation,
+                0.25,
+                rnd.randrange(10**6),
+                0,
+            )
+            self.stake_accounts.append((_pubkey("stake", j), lamports, data))
+            if state == 2:
+                self.stake_by_vote[voter].append(j)
+
+        # Cluster stake history for the last 512 epochs (its own seed, so the
+        # accounts above don't move); activatedStake follows from it exactly
+        # as the cluster would report it.
+        hist_rnd = random.Random(dataset.seed + 1)
+        self.stake_history = stake_activation.StakeHistory(
+            epoch=CURRENT_EPOCH,
+            entries={
+                e: (
+                    hist_rnd.randrange(38 * 10**16, 40 * 10**16),
+                    hist_rnd.randrange(10**16, 10**17),
+                    hist_rnd.randrange(10**15, 5 * 10**16),
+                )
+                for e in range(CURRENT_EPOCH - 512, CURRENT_EPOCH)
+            },
+            new_rate_activation_epoch=NEW_RATE_ACTIVATION_EPOCH,
+        )
+        vote_index = {raw: i for i, raw in enumerate(vote_raw)}
+        for voter, indexes in self.stake_by_vote.items():
+            for j in indexes:
+                fields = STAKE_ACCOUNT_LAYOUT.unpack(self.stake_accounts[j][2])
+                stake, activation, deactivation = fields[8:11]
+                effective, _activating, _deactivating = stake_activation.activation_status(
+                    stake, activation, deactivation, CURRENT_EPOCH, self.stake_history
+                )
+                self.activated_stake[vote_index[voter]] += effective
+
+        self._signatures: Dict[str, Tuple[str, int]] = {}
+        self._sig_lock = threading.Lock()
+
+    # -- wallets -----------------------------------------------------------
+
+    def _wallet_rng(self, wallet: str) -> random.Random:
+        return random.Random(int.from_bytes(_digest("wallet-seed", wallet)[:8], "little"))
+
+    def _signature_count(self, wallet: str) -> int:
+        base = self.dataset.signatures_per_wallet
+        return int(base * (0.5 + self._wallet_rng(wallet).random()))
+
+    def balance(self, wallet: str) -> int:
+        return int(10**9 * 10 ** (self._wallet_rng(wallet).random() * 4))
+
+    def token_accounts(self, wallet: str, program_id: str) -> List[Tuple[str, str, int, int]]:
+        """
+        (token account, mint, raw amount, decimals) for the wallet's holdings
+        under the given token program.
+        """
+        rnd = random.Random(int.from_bytes(_digest("tokens", wallet, program_id)[:8], "little"))
+        count = rnd.randrange(0, 7) if program_id == TOKEN_PROGRAM_ID else rnd.randrange(0, 2)
+        out = []
+        for k in range(count):
+            mints = self.mints[program_id]
+            mint, decimals = mints[rnd.randrange(len(mints))]
+            amount = 0 if rnd.random() < 0.15 else rnd.randrange(1, 10 ** (decimals + 6))
+            out.append((_pubkey("token", wallet, program_id, k), mint, amount, decimals))
+        return out
+
+    def _signature(self, wallet: str, i: int) -> str:
+        sig = b58encode(_digest("sig", wallet, i) + _digest("sig2", wallet, i))
+        with self._sig_lock:
+            self._signatures[sig] = (wallet, i)
+        return sig
+
+    def _sig_info(self, wallet: str, i: int) -> Dict[str, Any]:
+        interval = self.dataset.signature_interval_s
+        return {
+            "signature": self._signature(wallet, i),
+            "slot": self.slot - i * (interval * 5 // 2),
+            "blockTime": self.now - 60 - i * interval,
+            "err": None,
+            "memo": None,
+            "confirmationStatus": "finalized",
+        }
+
+    def _tx_shape(self, wallet: str, i: int) -> Tuple[str, str, str, int]:
+        """
+        (kind, fee payer, counterparty, lamports) for the wallet's i-th
+        newest transaction.
+        """
+        rnd = random.Random(int.from_bytes(_digest("tx", wallet, i)[:8], "little"))
+        kind = ("orca", "jupiter", "transfer_out", "transfer_in", "other")[rnd.randrange(5)]
+        counterparty = self.wallets[rnd.randrange(len(self.wallets))] if self.wallets else wallet
+        if counterparty == wallet:
+            counterparty = _pubkey("counterparty", wallet, i)
+        payer = counterparty if kind == "transfer_in" else wallet
+        return kind, payer, counterparty, rnd.randrange(10**6, 10**11)
+
+    def _tx_keys(self, wallet: str, i: int) -> List[str]:
+        kind, payer, counterparty, _lamports = self._tx_shape(wallet, i)
+        program = {
+            "orca": ORCA_WHIRLPOOLS_PROGRAM_ID,
+            "jupiter": JUPITER_V6_PROGRAM_ID,
+            "other": _pubkey("program", i % 7),
+        }.get(kind, SYSTEM_PROGRAM_ID)
+        other = wallet if payer != wallet else counterparty
+        return [payer, other, program]
+
+    def _wire_transaction(self, sig: str, keys: Sequence[str]) -> bytes:
+        message = bytes([1, 0, 1, len(keys)])
+        message += b"".join(b58decode(k) for k in keys)
+        message += _digest("blockhash", sig)
+        message += bytes([1, 2, 2, 0, 1, 8]) + _digest("ix", sig)[:8]
+        return bytes([1]) + b58decode(sig) + message
+
+    def get_transaction(self, sig: str, encoding: str) -> Optional[Dict[str, Any]]:
+        with self._sig_lock:
+            known = self._signatures.get(sig)
+        if known is None:
+            return None
+        wallet, i = known
+        info = self._sig_info(wallet, i)
+        keys = self._tx_keys(wallet, i)
+        _kind, _payer, _counterparty, lamports = self._tx_shape(wallet, i)
+        meta = {
+            "err": None,
+            "fee": 5000,
+            "preBalances": [lamports * 3, 10**9, 1],
+            "postBalances": [lamports * 2 - 5000, 10**9 + lamports, 1],
+            "innerInstructions": [],
+            "logMessages": [f"Program {keys[2]} invoke [1]", f"Program {keys[2]} success"],
+            "preTokenBalances": [],
+            "postTokenBalances": [],
+            "rewards": [],
+            "loadedAddresses": {"writable": [], "readonly": []},
+            "computeUnitsConsumed": 21_000,
+        }
+        if encoding == "base64":
+            tx: Any = [base64.b64encode(self._wire_transaction(sig, keys)).decode(), "base64"]
+        else:
+            tx = {
+                "signatures": [sig],
+                "message": {
+                    "accountKeys": [
+                        {"pubkey": k, "signer": n == 0, "writable": n < 2, "source": "transaction"}
+                        for n, k in enumerate(keys)
+                    ],
+                    "instructions": [
+                        {
+                            "programId": keys[2],
+                            "accounts": keys[:2],
+                            "data": b58encode(_digest("ix", sig)[:8]),
+                            "stackHeight": None,
+                        }
+                    ],
+                    "recentBlockhash": b58encode(_digest("blockhash", sig)),
+                },
+            }
+        return {
+            "slot": info["slot"],
+            "blockTime": info["blockTime"],
+            "meta": meta,
+            "transaction": tx,
+            "version": "legacy",
+        }
+
+    def parse_transaction(self, sig: str) -> Optional[Dict[str, Any]]:
+        with self._sig_lock:
+            known = self._signatures.get(sig)
+        if known is None:
+            return None
+        wallet, i = known
+        info = self._sig_info(wallet, i)
+        kind, payer, counterparty, lamports = self._tx_shape(wallet, i)
+        tx_type, source = {
+            "orca": ("SWAP", "ORCA"),
+            "jupiter": ("SWAP", "JUPITER"),
+            "transfer_out": ("TRANSFER", "SYSTEM_PROGRAM"),
+            "transfer_in": ("TRANSFER", "SYSTEM_PROGRAM"),
+        }.get(kind, ("UNKNOWN", "UNKNOWN"))
+        transfers = []
+        if kind == "transfer_out":
+            transfers.append({"fromUserAccount": wallet, "toUserAccount": counterparty, "amount": lamports})
+        elif kind == "transfer_in":
+            transfers.append({"fromUserAccount": counterparty, "toUserAccount": wallet, "amount": lamports})
+        return {
+            "signature": sig,
+            "slot": info["slot"],
+            "timestamp": info["blockTime"],
+            "type": tx_type,
+            "source": source,
+            "description": f"{payer} executed a {tx_type.lower()}",
+            "fee": 5000,
+            "feePayer": payer,
+            "nativeTransfers": transfers,
+            "tokenTransfers": [],
+            "accountData": [],
+            "events": {},
+        }
+
+    # -- JSON-RPC methods -------------------------------------------------
+
+    def call(self, method: str, params: List[Any]) -> Any:
+        handler = getattr(self, f"rpc_{method}", None)
+        if handler is None:
+            raise LookupError(method)
+        return handler(*params)
+
+    def _context(self, value: Any) -> Dict[str, Any]:
+        return {"context": {"apiVersion": "2.1.0", "slot": self.slot}, "value": value}
+
+    def rpc_getVoteAccounts(self, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        current = [
+            {
+                "nodePubkey": identity,
+                "votePubkey": vote,
+                "activatedStake": self.activated_stake[i],
+                "commission": 5,
+                "epochVoteAccount": True,
+                "epochCredits": [[CURRENT_EPOCH, 1_000, 0]],
+                "lastVote": self.slot,
+                "rootSlot": self.slot - 32,
+            }
+            for i, (identity, vote) in enumerate(zip(self.identities, self.votes))
+        ]
+        return {"current": current, "delinquent": []}
+
+    def rpc_getProgramAccounts(self, program_id: str, config: Optional[Dict[str, Any]] = None) -> List[Any]:
+        config = config or {}
+        if program_id != STAKE_PROGRAM_ID:
+            return []
+        candidates: Sequence[int] = range(len(self.stake_accounts))
+        checks: List[Tuple[int, bytes]] = []
+        for f in config.get("filters") or []:
+            if "dataSize" in f and f["dataSize"] != STAKE_ACCOUNT_LAYOUT.size:
+                return []
+            memcmp = f.get("memcmp")
+            if memcmp:
+                wanted = b58decode(memcmp["bytes"])
+                if memcmp["offset"] == 124 and wanted in self.stake_by_vote:
+                    candidates = self.stake_by_vote[wanted]
+                else:
+                    checks.append((memcmp["offset"], wanted))
+        encoding = config.get("encoding", "base64")
+        data_slice = config.get("dataSlice")
+        out = []
+        for j in candidates:
+            pubkey, lamports, data = self.stake_accounts[j]
+            if any(data[off : off + len(b)] != b for off, b in checks):
+                continue
+            out.append(
+                {
+                    "pubkey": pubkey,
+                    "account": self._account(lamports, STAKE_PROGRAM_ID, data, encoding, data_slice),
+                }
+            )
+        return out
+
+    def _account(
+        self,
+        lamports: int,
+        owner: str,
+        data: bytes,
+        encoding: str,
+        data_slice: Optional[Dict[str, int]],
+    ) -> Dict[str, Any]:
+        if encoding == "jsonParsed" and owner == STAKE_PROGRAM_ID:
+            rendered: Any = self._parsed_stake(data)
+        elif (
+            encoding == "jsonParsed"
+            and owner in (TOKEN_PROGRAM_ID, TOKEN_2022_PROGRAM_ID)
+            and len(data) == TOKEN_ACCOUNT_LAYOUT.size
+        ):
+            rendered = self._parsed_token(data, owner)
+        else:
+            if data_slice:
+                data = data[data_slice["offset"] : data_slice["offset"] + data_slice["length"]]
+            rendered = [base64.b64encode(data).decode(), "base64"]
+        return {
+            "data": rendered,
+            "executable": False,
+            "lamports": lamports,
+            "owner": owner,
+            "rentEpoch": U64_MAX,
+            "space": len(data),
+        }
+
+    def _parsed_stake(self, data: bytes) -> Dict[str, Any]:
+        fields = STAKE_ACCOUNT_LAYOUT.unpack(data)
+        state, reserve, staker, withdrawer = fields[:4]
+        custodian, voter, stake, activation, deactivation, rate, credits = fields[6:13]
+        info: Dict[str, Any] = {
+            "meta": {
+                "authorized": {"staker": b58encode(staker), "withdrawer": b58encode(withdrawer)},
+                "lockup": {"custodian": b58encode(custodian), "epoch": 0, "unixTimestamp": 0},
+                "rentExemptReserve": str(reserve),
+            }
+        }
+        if state == 2:
+            info["stake"] = {
+                "creditsObserved": credits,
+                "delegation": {
+                    "activationEpoch": str(activation),
+                    "deactivationEpoch": str(deactivation),
+                    "stake": str(stake),
+                    "voter": b58encode(voter),
+                    "warmupCooldownRate": rate,
+                },
+            }
+        return {
+            "parsed": {"info": info, "type": "delegated" if state == 2 else "initialized"},
+            "program": "stake",
+            "space": STAKE_ACCOUNT_LAYOUT.size,
+        }
+
+    def _token_data(self, wallet: str, mint: str, amount: int) -> bytes:
+        return TOKEN_ACCOUNT_LAYOUT.pack(
+            b58decode(mint), b58decode(wallet), amount, 0, bytes(32), 1, 0, 0, 0, 0, bytes(32)
+        )
+
+    def _mint_data(self, mint: str) -> bytes:
+        program_id, decimals, multiplier = self.mint_info[mint]
+        data = MINT_LAYOUT.pack(0, bytes(32), 10**18, decimals, 1, 0, bytes(32))
+        if program_id != TOKEN_2022_PROGRAM_ID:
+            return data
+        # Base mint padded to the token-account size, account type 1 (mint), TLV.
+        data = data.ljust(TOKEN_ACCOUNT_LAYOUT.size, b"\0") + b"\x01"
+        if multiplier != 1.0:
+            data += SCALED_UI_AMOUNT_EXTENSION.pack(25, 56, bytes(32), multiplier, 0, multiplier)
+        fields = (b"Mock " + mint[:4].encode(), mint[:4].upper().encode(), b"")
+        metadata = bytes(32) + b58decode(mint) + b"".join(
+            struct.pack("<I", len(f)) + f for f in fields
+        ) + struct.pack("<I", 0)
+        return data + struct.pack("<HH", 19, len(metadata)) + metadata
+
+    def _parsed_token(self, data: bytes, owner: str) -> Dict[str, Any]:
+        mint_raw, wallet_raw, amount = TOKEN_ACCOUNT_LAYOUT.unpack(data)[:3]
+        mint = b58encode(mint_raw)
+        _program_id, decimals, multiplier = self.mint_info.get(mint, (owner, 0, 1.0))
+        if multiplier != 1.0:
+            scaled = ui_amount(amount, decimals) * multiplier
+            ui_float, ui = scaled, repr(scaled)
+        else:
+            ui_float, ui = ui_amount(amount, decimals), ui_amount_string(amount, decimals)
+        return {
+            "parsed": {
+                "info": {
+                    "isNative": False,
+                    "mint": mint,
+                    "owner": b58encode(wallet_raw),
+                    "state": "initialized",
+                    "tokenAmount": {
+                        "amount": str(amount),
+                        "decimals": decimals,
+                        "uiAmount": ui_float,
+                        "uiAmountString": ui,
+                    },
+                },
+                "type": "account",
+            },
+            "program": "spl-token" if owner == TOKEN_PROGRAM_ID else "spl-token-2022",
+            "space": TOKEN_ACCOUNT_LAYOUT.size,
+        }
+
+    def rpc_getBalance(self, wallet: str, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self._context(self.balance(wallet))
+
+    def rpc_getEpochInfo(self, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return {
+            "absoluteSlot": self.slot,
+            "blockHeight": self.slot - 10_000,
+            "epoch": CURRENT_EPOCH,
+            "slotIndex": self.slot - CURRENT_EPOCH * SLOTS_PER_EPOCH,
+            "slotsInEpoch": SLOTS_PER_EPOCH,
+            "transactionCount": None,
+        }
+
+    def rpc_getGenesisHash(self) -> str:
+        return _pubkey("genesis", self.dataset.seed)
+
+    def rpc_getEpochSchedule(self) -> Dict[str, Any]:
+        return {
+            "firstNormalEpoch": 0,
+            "firstNormalSlot": 0,
+            "leaderScheduleSlotOffset": SLOTS_PER_EPOCH,
+            "slotsPerEpoch": SLOTS_PER_EPOCH,
+            "warmup": False,
+        }
+
+    def _sysvar_account(self, key: str) -> Optional[Tuple[str, bytes]]:
+        if key == stake_activation.STAKE_HISTORY_SYSVAR:
+            entries = sorted(self.stake_history.entries.items(), reverse=True)
+            data = struct.pack("<Q", len(entries)) + b"".join(
+                struct.pack("<QQQQ", e, *values) for e, values in entries
+            )
+            return "Sysvar1111111111111111111111111111111111111", data
+        if key == stake_activation.CLOCK_SYSVAR:
+            epoch = CURRENT_EPOCH
+            data = struct.pack("<QqQQq", self.slot, self.now, epoch, epoch + 1, self.now)
+            return "Sysvar1111111111111111111111111111111111111", data
+        if key == stake_activation.EPOCH_SCHEDULE_SYSVAR:
+            data = struct.pack("<QQ?QQ", SLOTS_PER_EPOCH, SLOTS_PER_EPOCH, False, 0, 0)
+            return "Sysvar1111111111111111111111111111111111111", data
+        if key == stake_activation.REDUCE_STAKE_WARMUP_COOLDOWN_FEATURE:
+            slot = NEW_RATE_ACTIVATION_EPOCH * SLOTS_PER_EPOCH
+            return "Feature111111111111111111111111111111111111", struct.pack("<BQ", 1, slot)
+        return None
+
+    def write_snapshot(self, snapshot_dir: str) -> List[str]:
+        """
+        The stake accounts, vote accounts and sysvars as account storage
+        files. An older slot holds stale copies of every stake account plus
+        some that have since been closed, so readers must keep only the
+        newest version of each.
+        """
+        stake_owner, vote_owner = b58decode(STAKE_PROGRAM_ID), b58decode(VOTE_PROGRAM_ID)
+        account = solana_snapshot.StoredAccount
+        closed = [b58decode(_pubkey("closed-stake", j)) for j in range(10)]
+        older = [
+            account(b58decode(pubkey), lamports + 1, stake_owner, data)
+            for pubkey, lamports, data in self.stake_accounts
+        ]
+        older += [account(pubkey, 10**9, stake_owner, older[0].data) for pubkey in closed]
+
+        newer = [account(pubkey, 0, bytes(32), b"") for pubkey in closed]
+        newer += [
+            account(b58decode(pubkey), lamports, stake_owner, data)
+            for pubkey, lamports, data in self.stake_accounts
+        ]
+        for identity, vote in zip(self.identities, self.votes):
+            head = struct.pack("<I32s32sB", 2, b58decode(identity), b58decode(identity), 5)
+            newer.append(account(b58decode(vote), 27_074_400, vote_owner, head.ljust(3762, b"\0")))
+        for key in (
+            stake_activation.STAKE_HISTORY_SYSVAR,
+            stake_activation.CLOCK_SYSVAR,
+            stake_activation.EPOCH_SCHEDULE_SYSVAR,
+            stake_activation.REDUCE_STAKE_WARMUP_COOLDOWN_FEATURE,
+        ):
+            owner, data = self._sysvar_account(key)
+            newer.append(account(b58decode(key), 1_000_000_000, b58decode(owner), data))
+        return solana_snapshot.write_snapshot_dir(
+            snapshot_dir, {self.slot - SLOTS_PER_EPOCH: older, self.slot: newer}
+        )
+
+    def rpc_getMultipleAccounts(self, keys: List[str], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        config = config or {}
+        accounts = []
+        for key in keys:
+            sysvar = self._sysvar_account(key)
+            if key in self.mint_info:
+                lamports, owner, data = 1_461_600, self.mint_info[key][0], self._mint_data(key)
+            elif sysvar is not None:
+                lamports, (owner, data) = 1_000_000_000, sysvar
+            else:
+                lamports, owner, data = self.balance(key), SYSTEM_PROGRAM_ID, b""
+            accounts.append(
+                self._account(
+                    lamports, owner, data, config.get("encoding", "base64"), config.get("dataSlice")
+                )
+            )
+        return self._context(accounts)
+
+    def rpc_getTokenAccountsByOwner(
+        self, wallet: str, filt: Dict[str, Any], config: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        config = config or {}
+        program_id = filt.get("programId", TOKEN_PROGRAM_ID)
+        return self._context(
+            [
+                {
+                    "pubkey": account,
+                    "account": self._account(
+                        TOKEN_RENT_EXEMPT_RESERVE,
+                        program_id,
+                        self._token_data(wallet, mint, amount),
+                        config.get("encoding", "base64"),
+                        config.get("dataSlice"),
+                    ),
+                }
+                for account, mint, amount, _decimals in self.token_accounts(wallet, program_id)
+            ]
+        )
+
+    def rpc_getSignaturesForAddress(
+        self, wallet: str, config: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        config = config or {}
+        total = self._signature_count(wallet)
+        start = 0
+        before = config.get("before")
+        if before:
+            with self._sig_lock:
+                known = self._signatures.get(before)
+            start = known[1] + 1 if known and known[0] == wallet else total
+        stop = total
+        until = config.get("until")
+        if until:
+            with self._sig_lock:
+                known = self._signatures.get(until)
+            if known and known[0] == wallet:
+                stop = min(stop, known[1])
+        limit = min(int(config.get("limit") or 1000), 1000)
+        return [self._sig_info(wallet, i) for i in range(start, min(stop, start + limit))]
+
+    def rpc_getTransaction(self, sig: str, config: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        return self.get_transaction(sig, (config or {}).get("encoding", "json"))
+
+    def rpc_getTransactionsForAddress(self, wallet: str, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        config = config or {}
+        filters = config.get("filters") or {}
+        gte = (filters.get("blockTime") or {}).get("gte")
+        after_slot = (filters.get("slot") or {}).get("gt")
+        start = int(config.get("paginationToken") or 0)
+        limit = min(int(config.get("limit") or 1000), 1000)
+        data = []
+        i = start
+        total = self._signature_count(wallet)
+        while i < total and len(data) < limit:
+            info = self._sig_info(wallet, i)
+            if (gte is not None and info["blockTime"] < gte) or (
+                after_slot is not None and info["slot"] <= after_slot
+            ):
+                i = total
+                break
+            data.append(info)
+            i += 1
+        return {"data": data, "paginationToken": str(i) if i < total else None}
+
+
+class MockSolanaServer:
+    """
+    HTTP front end for a MockNetwork. Runs on a background thread:
+
+        with MockSolanaServer(MockDataset(), MockConfig(latency_ms=20)) as server:
+            env = server.env()  # SOLANA_RPC_URL etc. for a child process
+            ...
+            print(server.stats().to_dict())
+    """
+
+    def __init__(
+        self,
+        dataset: MockDataset,
+        config: Optional[MockConfig] = None,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.network = MockNetwork(dataset)
+        self.config = config or MockConfig()
+        self._bucket = _TokenBucket(self.config.max_rps) if self.config.max_rps > 0 else None
+        self._rnd = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._stats = MockStats()
+        labels_digest = hashlib.sha256(json.dumps(JUPITER_LABELS, sort_keys=True).encode())
+        self._jupiter_etag = f'"{labels_digest.hexdigest()[:16]}"'
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def env(self) -> Dict[str, str]:
+        return {
+            "SOLANA_RPC_URL": self.url,
+            "HELIUS_RPC_URL": self.url,
+            "HELIUS_PARSE_TX_URL": self.url + "v0/transactions/",
+            "JUPITER_PROGRAM_ID_LABELS_URL": self.url + "program-id-to-label",
+        }
+
+    def start(self) -> "MockSolanaServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="mock-solana-rpc", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockSolanaServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def stats(self) -> MockStats:
+        with self._lock:
+            return MockStats(
+                http_requests=self._stats.http_requests,
+                rpc_calls=Counter(self._stats.rpc_calls),
+                throttled=self._stats.throttled,
+                injected_errors=self._stats.injected_errors,
+                bytes_in=self._stats.bytes_in,
+                bytes_out=self._stats.bytes_out,
+            )
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = MockStats()
+
+    # -- request handling (called from handler threads) -------------------
+
+    def _admit(self, body_len: int) -> Optional[int]:
+        """
+        Count the request and apply latency/faults; returns an HTTP status
+        to fail it with, or None to serve it.
+        """
+        with self._lock:
+            self._stats.http_requests += 1
+            self._stats.bytes_in += body_len
+            fail = self.config.error_rate > 0 and self._rnd.random() < self.config.error_rate
+            jitter = 0.5 + self._rnd.random()
+        if self.config.latency_ms > 0:
+            time.sleep(self.config.latency_ms * jitter / 1000.0)
+        if self._bucket is not None and not self._bucket.take():
+            with self._lock:
+                self._stats.throttled += 1
+            return 429
+        if fail:
+            with self._lock:
+                self._stats.injected_errors += 1
+            return 503
+        return None
+
+    def _record_out(self, n: int) -> None:
+        with self._lock:
+            self._stats.bytes_out += n
+
+    def _rpc_one(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        method = str(req.get("method"))
+        with self._lock:
+            self._stats.rpc_calls[method] += 1
+        out: Dict[str, Any] = {"jsonrpc": "2.0", "id": req.get("id")}
+        try:
+            out["result"] = self.network.call(method, list(req.get("params") or []))
+        except LookupError:
+            out["error"] = {"code": -32601, "message": "Method not found"}
+        except (TypeError, ValueError, KeyError) as e:
+            out["error"] = {"code": -32602, "message": f"Invalid params: {e}"}
+        return out
+
+    def handle_post(self, path: str, payload: Any) -> Any:
+        if path.startswith("/v0/transactions"):
+            with self._lock:
+                self._stats.rpc_calls["parseTransactions"] += 1
+            sigs = (payload.get("transactions") or []) if isinstance(payload, dict) else []
+            return [tx for tx in (self.network.parse_transaction(s) for s in sigs) if tx]
+        if isinstance(payload, list):
+            return [self._rpc_one(req) for req in payload]
+        return self._rpc_one(payload)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; with Nagle on, every
+    # response after the first on a keep-alive connection would wait out the
+    # client's delayed ACK (~40 ms) and swamp the injected latency.
+    disable_nagle_algorithm = True
+
+    @property
+    def mock(self) -> MockSolanaServer:
+        return self.server.mock  # type: ignore[attr-defined]
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None) -> None:
+        if len(body) > 1024 and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=1)
+            headers = {**(headers or {}), "Content-Encoding": "gzip"}
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+        self.mock._record_out(len(body))
+
+    def do_GET(self) -> None:
+        status = self.mock._admit(0)
+        if status is not None:
+            self._send(status, b'{"error":"unavailable"}')
+            return
+        if urlsplit(self.path).path.rstrip("/") != "/program-id-to-label":
+            self._send(404, b'{"error":"not found"}')
+            return
+        etag = self.mock._jupiter_etag
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send(200, json.dumps(JUPITER_LABELS).encode(), {"ETag": etag})
+
+    def do_POST(self) -> None:
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        status = self.mock._admit(len(raw))
+        if status is not None:
+            self._send(status, b'{"error":"unavailable"}')
+            return
+        try:
+            payload = json.loads(raw)
+        except json.JSONDecodeError:
+            self._send(400, b'{"error":"invalid json"}')
+            return
+        result = self.mock.handle_post(urlsplit(self.path).path, payload)
+        self._send(200, json.dumps(result, separators=(",", ":")).encode())
+
+
+def add_dataset_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--latency-ms", type=float, default=0.0, help="Mean per-request latency.")
+    p.add_argument(
+        "--server-max-rps",
+        type=float,
+        default=0.0,
+        help="Answer requests beyond this rate with 429 (default: 0 = unlimited).",
+    )
+    p.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503."
+    )
+    p.add_argument("--seed", type=int, default=0, help="Seed for latency and fault injection.")
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        max_rps=args.server_max_rps,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+
+def parse_args(argv: Sequence[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Serve a synthetic Solana/Helius/Jupiter API locally.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8899)
+    p.add_argument("--validators", type=int, default=MockDataset.validators)
+    p.add_argument("--stake-accounts", type=int, default=MockDataset.stake_accounts)
+    p.add_argument("--wallets", type=int, default=MockDataset.wallets)
+    p.add_argument("--signatures-per-wallet", type=int, default=MockDataset.signatures_per_wallet)
+    p.add_argument(
+        "--write-snapshot",
+        metavar="DIR",
+        help="Write the stake/vote/sysvar accounts as snapshot storage files under DIR and exit.",
+    )
+    add_dataset_args(p)
+    return p.parse_args(argv)
+
+
+def main(argv: Sequence[str]) -> int:
+    args = parse_args(argv)
+    dataset = MockDataset(
+        validators=args.validators,
+        stake_accounts=args.stake_accounts,
+        wallets=args.wallets,
+        signatures_per_wallet=args.signatures_per_wallet,
+    )
+    if args.write_snapshot:
+        network = MockNetwork(dataset)
+        for path in network.write_snapshot(args.write_snapshot):
+            print(f"wrote: {path}")
+        for identity in network.identities:
+            print(f"#   {identity}", file=sys.stderr)
+        return 0
+    server = MockSolanaServer(dataset, config_from_args(args), host=args.host, port=args.port)
+    for key, value in server.env().items():
+        print(f"export {key}={value}")
+    print(
+        f"# Serving {dataset.validators} validators, {dataset.stake_accounts:,} stake accounts, "
+        f"{dataset.wallets:,} wallets. Validator identities:",
+        file=sys.stderr,
+    )
+    for identity in server.network.identities:
+        print(f"#   {identity}", file=sys.stderr)
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"# {json.dumps(server.stats().to_dict())}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -15,42 +15,112 @@ This script:
 Outputs:
 - output/profiles/wallet_profiles.json
 - output/profiles/wallet_profiles.csv
+- output/profiles/profile_store.sqlite3 (profile cache + checkpoint manifest)
 """
 
 from __future__ import annotations
 
 import argparse
+import copy
 import csv
+import heapq
 import json
 import os
+import sqlite3
 import sys
+import threading
 import time
-import urllib.error
 import urllib.parse
-import urllib.request
-from dataclasses import dataclass
+import zlib
+from collections import OrderedDict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
-
-
-RPC_URL = "https://api.mainnet-beta.solana.com"
-HELIUS_RPC_BASE = "https://mainnet.helius-rpc.com/"
-HELIUS_PARSE_TX_URL_BASE = "https://api-mainnet.helius-rpc.com/v0/transactions/"
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: speeds up stake CSV aggregation
+    np = None  # type: ignore[assignment]
+
+import rpc_transport
+import run_metrics
+from rpc_transport import DEFAULT_RPC_BATCH_SIZE, RpcBatchItem, RpcCall
+from solana_codec import (
+    EXTENSION_INTEREST_BEARING_CONFIG,
+    EXTENSION_SCALED_UI_AMOUNT,
+    EXTENSION_TOKEN_METADATA,
+    MINT_SUPPLY_OFFSET,
+    MINT_SUPPLY_SLICE_LENGTH,
+    TOKEN_ACCOUNT_SLICE_LENGTH,
+    account_data_bytes,
+    decode_lookup_table_addresses,
+    decode_mint_supply,
+    decode_token_account_slice,
+    decode_transaction_keys,
+    is_mint_account,
+    mint_extensions,
+    token_metadata_symbol,
+    ui_amount,
+    ui_amount_string,
+)
+
+
+# Endpoints can be redirected (e.g. to mock_solana_rpc.py) through the environment.
+RPC_URL = os.environ.get("SOLANA_RPC_URL") or "https://api.mainnet-beta.solana.com"
+HELIUS_RPC_BASE = os.environ.get("HELIUS_RPC_URL") or "https://mainnet.helius-rpc.com/"
+HELIUS_PARSE_TX_URL_BASE = (
+    os.environ.get("HELIUS_PARSE_TX_URL") or "https://api-mainnet.helius-rpc.com/v0/transactions/"
+)
 INPUT_DIR = "output"
 OUT_DIR = os.path.join(INPUT_DIR, "profiles")
-CACHE_DIR = os.path.join(OUT_DIR, "cache")
-MANIFEST_PATH = os.path.join(OUT_DIR, "checkpoint_manifest.json")
 JSONL_PATH = os.path.join(OUT_DIR, "wallet_profiles.jsonl")
+TX_STORE_PATH = os.path.join(OUT_DIR, "tx_store.sqlite3")
+PROFILE_STORE_PATH = os.path.join(OUT_DIR, "profile_store.sqlite3")
+MINT_STORE_PATH = os.path.join(OUT_DIR, "mint_store.sqlite3")
+# Mint supply moves; older entries are refetched for the concentration report.
+MINT_CACHE_TTL_HOURS = 24.0
+TOKEN_CONCENTRATION_PATH = os.path.join(OUT_DIR, "token_concentration.csv")
+# Run report base path: <base>.json and <base>.prom (see run_metrics).
+METRICS_BASE_PATH = os.path.join(OUT_DIR, "run_metrics")
+# Pre-SQLite layout (one JSON file per wallet + a JSON manifest); only read by
+# ProfileStore.migrate_legacy.
+LEGACY_CACHE_DIR = os.path.join(OUT_DIR, "cache")
+LEGACY_MANIFEST_PATH = os.path.join(OUT_DIR, "checkpoint_manifest.json")
 
 LAMPORTS_PER_SOL = 1_000_000_000
 TOKEN_PROGRAM_ID = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
 TOKEN_2022_PROGRAM_ID = "TokenzQdBNbLqP5VEhdkAS6EPFLC1PHnBqCXEpPxuEb"
+# getMultipleAccounts accepts at most 100 pubkeys per call.
+MAX_ACCOUNTS_PER_MULTIPLE_CALL = 100
 
 # Swap program IDs:
 # - Orca Whirlpools official deployment: whirLb... (from Orca docs)
 # - Jupiter program IDs are fetched dynamically via Jupiter's public map when available.
 ORCA_WHIRLPOOLS_PROGRAM_ID = "whirLbMiicVdio4qvUfM5KAg6Ct8VwpYzGff3uctyCc"
-JUPITER_PROGRAM_ID_LABELS_URL = "https://lite-api.jup.ag/swap/v1/program-id-to-label"
+JUPITER_PROGRAM_ID_LABELS_URL = (
+    os.environ.get("JUPITER_PROGRAM_ID_LABELS_URL")
+    or "https://lite-api.jup.ag/swap/v1/program-id-to-label"
+)
+# On-disk copy of Jupiter's map; revalidated with ETag/Last-Modified once stale.
+JUPITER_MAP_CACHE_PATH = os.path.join(OUT_DIR, "jupiter_program_ids.json")
+JUPITER_MAP_TTL_HOURS = 24.0
+
+# Helius parseTransactions accepts at most 100 signatures per request.
+HELIUS_PARSE_CHUNK_SIZE = 100
+HELIUS_PARSE_CONCURRENCY = 4
+# Rounds per chunk, on top of the transport's own per-request retries.
+HELIUS_PARSE_CHUNK_ATTEMPTS = 3
+# How long the run-level parse scheduler holds a partial chunk open for other
+# wallets' signatures, and how many parsed transactions it keeps for reuse.
+HELIUS_PARSE_LINGER_S = 0.05
+HELIUS_PARSE_CACHE_SIZE = 50_000
 
 
 def lamports_to_sol(lamports: int) -> float:
@@ -64,30 +134,7 @@ def _iso(ts: Optional[int]) -> Optional[str]:
 
 
 def _post_json_rpc(method: str, params: Sequence[Any]) -> Any:
-    payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": list(params)}
-    body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        RPC_URL,
-        data=body,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            raw = resp.read()
-    except urllib.error.HTTPError as e:
-        raise RuntimeError(f"HTTP error calling {method}: {e.code} {e.reason}") from e
-    except urllib.error.URLError as e:
-        raise RuntimeError(f"Network error calling {method}: {e.reason}") from e
-
-    try:
-        parsed = json.loads(raw)
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"Invalid JSON from {method}: {raw[:200]!r}") from e
-
-    if "error" in parsed:
-        raise RuntimeError(f"RPC error calling {method}: {parsed['error']}")
-    return parsed["result"]
+    return rpc_transport.post_json_rpc(RPC_URL, method, params, timeout=60)
 
 
 def _rpc_url(helius_api_key: Optional[str]) -> str:
@@ -117,55 +164,90 @@ def _parse_api_key(value: Optional[str]) -> Optional[str]:
 
 
 def _post_json_rpc_url(url: str, method: str, params: Sequence[Any]) -> Any:
-    payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": list(params)}
-    body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        data=body,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    try:
-        with urllib.request.urlopen(req, timeout=90) as resp:
-            raw = resp.read()
-    except urllib.error.HTTPError as e:
-        raise RuntimeError(f"HTTP error calling {method}: {e.code} {e.reason}") from e
-    except urllib.error.URLError as e:
-        raise RuntimeError(f"Network error calling {method}: {e.reason}") from e
+    return rpc_transport.post_json_rpc(url, method, params, timeout=90)
 
-    try:
-        parsed = json.loads(raw)
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"Invalid JSON from {method}: {raw[:200]!r}") from e
 
-    if "error" in parsed:
-        raise RuntimeError(f"RPC error calling {method}: {parsed['error']}")
-    return parsed["result"]
+def _post_json_rpc_batch_url(
+    url: str,
+    calls: Sequence[RpcCall],
+    *,
+    max_batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+) -> List[RpcBatchItem]:
+    return rpc_transport.post_json_rpc_batch(
+        url, calls, max_batch_size=max_batch_size, timeout=90
+    )
 
 
-def _get_json(url: str) -> Any:
-    req = urllib.request.Request(url, method="GET")
+def _read_jupiter_map_cache(path: str) -> Optional[Dict[str, Any]]:
     try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            raw = resp.read()
-    except urllib.error.URLError:
+        with open(path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, json.JSONDecodeError):
         return None
-    try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
+    if not isinstance(cached, dict) or not isinstance(cached.get("program_ids"), dict):
         return None
+    return cached
 
 
-def load_jupiter_program_ids() -> Dict[str, str]:
+def _write_jupiter_map_cache(path: str, cached: Dict[str, Any]) -> None:
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cached, f, sort_keys=True)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"WARN: could not write {path}: {e}")
+
+
+def load_jupiter_program_ids(
+    *,
+    cache_path: str = JUPITER_MAP_CACHE_PATH,
+    ttl_hours: float = JUPITER_MAP_TTL_HOURS,
+) -> Dict[str, str]:
     """
     Returns a map of program_id -> label from Jupiter when reachable.
-    Falls back to an empty map if the endpoint is unavailable.
+
+    The map is cached at cache_path. Within ttl_hours it is used without any
+    network request; once stale it is revalidated with If-None-Match /
+    If-Modified-Since, so an unchanged map costs a 304 and no body. If the
+    endpoint is unavailable the stale copy is used, or an empty map when
+    there is none.
     """
-    data = _get_json(JUPITER_PROGRAM_ID_LABELS_URL)
-    if isinstance(data, dict):
+    metrics = run_metrics.registry()
+    cached = _read_jupiter_map_cache(cache_path)
+    now = time.time()
+    if cached is not None and now - float(cached.get("fetched_at") or 0) < ttl_hours * 3600:
+        metrics.cache_event("jupiter_map", "hit")
+        return dict(cached["program_ids"])
+    metrics.cache_event("jupiter_map", "stale" if cached is not None else "miss")
+
+    result = rpc_transport.get_json_conditional(
+        JUPITER_PROGRAM_ID_LABELS_URL,
+        etag=cached.get("etag") if cached else None,
+        last_modified=cached.get("last_modified") if cached else None,
+        timeout=30,
+    )
+    if result is None:
+        return dict(cached["program_ids"]) if cached else {}
+    if result.not_modified and cached is not None:
+        program_ids = cached["program_ids"]
+    elif isinstance(result.data, dict):
         # Expecting {program_id: label}
-        return {str(k): str(v) for k, v in data.items()}
-    return {}
+        program_ids = {str(k): str(v) for k, v in result.data.items()}
+    else:
+        return dict(cached["program_ids"]) if cached else {}
+
+    _write_jupiter_map_cache(
+        cache_path,
+        {
+            "fetched_at": now,
+            "etag": result.etag,
+            "last_modified": result.last_modified,
+            "program_ids": program_ids,
+        },
+    )
+    return dict(program_ids)
 
 
 def discover_csvs(input_dir: str) -> List[str]:
@@ -182,8 +264,69 @@ def discover_csvs(input_dir: str) -> List[str]:
     return paths
 
 
+# Authorities as (wallet, delegated_lamports, stake_accounts) in first-seen order.
+AuthorityColumns = Tuple[List[str], List[int], List[int]]
+
+
+def _aggregate_stake_csv(path: str, mode: str) -> AuthorityColumns:
+    """
+    Aggregate one stake CSV column-wise: authority pubkeys are dictionary
+    encoded to integer ids in first-seen order, then lamports and account
+    counts are summed per id (NumPy group-by when available).
+    """
+    columns: List[str] = []
+    if mode in ("staker", "both"):
+        columns.append("staker_authority")
+    if mode in ("withdrawer", "both"):
+        columns.append("withdraw_authority")
+
+    ids: Dict[str, int] = {}
+    codes: List[int] = []
+    lamports: List[int] = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return [], [], []
+        index = {name: i for i, name in enumerate(header)}
+        lamports_col = index.get("delegated_stake_lamports")
+        wallet_cols = [index.get(name) for name in columns]
+        for row in reader:
+            if not row:
+                continue
+            delegated = int(_csv_cell(row, lamports_col) or 0)
+            for col in wallet_cols:
+                wallet = _csv_cell(row, col) or "UNKNOWN"
+                code = ids.get(wallet)
+                if code is None:
+                    code = ids[wallet] = len(ids)
+                codes.append(code)
+                lamports.append(delegated)
+
+    wallets = list(ids)
+    if np is not None and codes:
+        code_arr = np.asarray(codes, dtype=np.int64)
+        # int64 add.at rather than bincount(weights=...), which sums in float64
+        # and loses lamport precision past 2**53.
+        sums = np.zeros(len(wallets), dtype=np.int64)
+        np.add.at(sums, code_arr, np.asarray(lamports, dtype=np.int64))
+        counts = np.bincount(code_arr, minlength=len(wallets))
+        return wallets, sums.tolist(), counts.tolist()
+
+    sums_py = [0] * len(wallets)
+    counts_py = [0] * len(wallets)
+    for code, delegated in zip(codes, lamports):
+        sums_py[code] += delegated
+        counts_py[code] += 1
+    return wallets, sums_py, counts_py
+
+
+def _csv_cell(row: List[str], col: Optional[int]) -> str:
+    return row[col] if col is not None and col < len(row) else ""
+
+
 def aggregate_authorities(
-    csv_paths: Iterable[str], *, mode: str
+    csv_paths: Iterable[str], *, mode: str, workers: Optional[int] = None
 ) -> Dict[str, Dict[str, int]]:
     """
     Returns:
@@ -191,66 +334,129 @@ def aggregate_authorities(
         "delegated_lamports": int,
         "stake_accounts": int,
       }
+
+    Files are aggregated in parallel across processes (workers defaults to
+    the CPU count) and merged in path order, so the result, including key
+    order, is the same as reading the files one after another.
     """
-    agg: Dict[str, Dict[str, int]] = {}
+    paths = list(csv_paths)
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            per_file: Iterable[AuthorityColumns] = list(
+                executor.map(_aggregate_stake_csv, paths, [mode] * len(paths))
+            )
+    else:
+        per_file = (_aggregate_stake_csv(path, mode) for path in paths)
 
-    for path in csv_paths:
-        with open(path, "r", encoding="utf-8", newline="") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                delegated = int(row.get("delegated_stake_lamports") or 0)
-
-                wallets: List[str] = []
-                if mode in ("staker", "both"):
-                    wallets.append(row.get("staker_authority") or "UNKNOWN")
-                if mode in ("withdrawer", "both"):
-                    wallets.append(row.get("withdraw_authority") or "UNKNOWN")
-
-                for wallet in wallets:
-                    entry = agg.setdefault(
-                        wallet, {"delegated_lamports": 0, "stake_accounts": 0}
-                    )
-                    entry["delegated_lamports"] += delegated
-                    entry["stake_accounts"] += 1
+    agg: Dict[str, Dict[str, int]] = {}
+    for wallets, sums, counts in per_file:
+        for wallet, delegated, accounts in zip(wallets, sums, counts):
+            entry = agg.get(wallet)
+            if entry is None:
+                agg[wallet] = {"delegated_lamports": delegated, "stake_accounts": accounts}
+            else:
+                entry["delegated_lamports"] += delegated
+                entry["stake_accounts"] += accounts
 
     # Drop UNKNOWN if present.
     agg.pop("UNKNOWN", None)
     return agg
 
 
+def _authority_rank(kv: Tuple[str, Dict[str, int]]) -> Tuple[int, int]:
+    return kv[1]["delegated_lamports"], kv[1]["stake_accounts"]
+
+
 def top_wallets(
     authority_agg: Dict[str, Dict[str, int]], *, top_n: int
 ) -> List[Tuple[str, Dict[str, int]]]:
-    items = sorted(
-        authority_agg.items(),
-        key=lambda kv: (kv[1]["delegated_lamports"], kv[1]["stake_accounts"]),
-        reverse=True,
-    )
-    return items[:top_n]
+    # Partial selection; heapq.nlargest keeps ties in input order, exactly
+    # like sorted(..., reverse=True)[:top_n].
+    return heapq.nlargest(top_n, authority_agg.items(), key=_authority_rank)
 
 
-def rpc_get_balance(wallet: str, *, helius_api_key: Optional[str]) -> int:
-    url = _rpc_url(helius_api_key)
-    result = _post_json_rpc_url(url, "getBalance", [wallet, {"commitment": "finalized"}])
-    return int(result["value"])
+def _balance_call(wallet: str) -> RpcCall:
+    return "getBalance", [wallet, {"commitment": "finalized"}]
 
 
-def rpc_get_token_accounts_by_owner(
-    wallet: str, program_id: str, *, helius_api_key: Optional[str]
-) -> List[Dict[str, Any]]:
-    url = _rpc_url(helius_api_key)
-    result = _post_json_rpc_url(
-        url,
-        "getTokenAccountsByOwner",
+def _token_accounts_call(wallet: str, program_id: str, *, encoding: str = "jsonParsed") -> RpcCall:
+    config: Dict[str, Any] = {"commitment": "finalized", "encoding": encoding}
+    if encoding == "base64":
+        # Mint and amount only; decimals come from MintInfoCache.
+        config["dataSlice"] = {"offset": 0, "length": TOKEN_ACCOUNT_SLICE_LENGTH}
+    return "getTokenAccountsByOwner", [wallet, {"programId": program_id}, config]
+
+
+def _signatures_call(wallet: str, *, limit: int, until: Optional[str] = None) -> RpcCall:
+    config: Dict[str, Any] = {"limit": limit, "commitment": "finalized"}
+    if until:
+        # Only signatures newer than `until` (exclusive).
+        config["until"] = until
+    return "getSignaturesForAddress", [wallet, config]
+
+
+def _transaction_call(signature: str, *, encoding: str = "jsonParsed") -> RpcCall:
+    return (
+        "getTransaction",
         [
-            wallet,
-            {"programId": program_id},
-            {"commitment": "finalized", "encoding": "jsonParsed"},
+            signature,
+            {
+                "commitment": "finalized",
+                "encoding": encoding,
+                "maxSupportedTransactionVersion": 0,
+            },
         ],
     )
+
+
+def _balance_value(result: Any) -> int:
+    return int(result["value"])
+
+
+def _token_accounts_value(result: Any) -> List[Dict[str, Any]]:
     return result.get("value", []) if isinstance(result, dict) else []
 
 
+def rpc_get_balances(
+    wallets: Sequence[str],
+    *,
+    helius_api_key: Optional[str],
+    batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Lamports for each wallet from getMultipleAccounts
+    (up to 100 pubkeys per call) with an empty dataSlice, so only account
+    metadata comes back. A missing account has a zero balance, as with
+    getBalance; wallets in a failed call are left out.
+    """
+    if not wallets:
+        return {}
+    per_call = MAX_ACCOUNTS_PER_MULTIPLE_CALL
+    starts = range(0, len(wallets), per_call)
+    config = {
+        "commitment": "finalized",
+        "encoding": "base64",
+        "dataSlice": {"offset": 0, "length": 0},
+    }
+    try:
+        items = _post_json_rpc_batch_url(
+            _rpc_url(helius_api_key),
+            [("getMultipleAccounts", [list(wallets[i : i + per_call]), config]) for i in starts],
+            max_batch_size=batch_size,
+        )
+    except RuntimeError:
+        return {}
+    balances: Dict[str, int] = {}
+    for start, item in zip(starts, items):
+        if not item.ok or not isinstance(item.result, dict):
+            continue
+        values = item.result.get("value") or []
+        for wallet, account in zip(wallets[start : start + per_call], values):
+            balances[wallet] = int(account["lamports"]) if account else 0
+    return balances
+
+
 def extract_token_holdings(accounts: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
     holdings: List[Dict[str, Any]] = []
     for entry in accounts:
@@ -286,35 +492,415 @@ def extract_token_holdings(accounts: Iterable[Dict[str, Any]]) -> List[Dict[str,
     return holdings
 
 
-def rpc_get_signatures(
-    wallet: str, *, limit: int, helius_api_key: Optional[str]
+@dataclass(frozen=True)
+class MintInfo:
+    program_id: str
+    decimals: int
+    supply: int
+    # From a Token-2022 TokenMetadata extension; Tokenkeg mints keep their
+    # metadata in a separate (Metaplex) account, which is not read.
+    symbol: Optional[str] = None
+    # Token-2022 interest-bearing or scaled-UI mint: the node's uiAmount is
+    # not amount / 10^decimals, so such balances are read as jsonParsed.
+    ui_scaled: bool = False
+    fetched_at: float = 0.0
+
+
+class MintInfoCache:
+    """
+    Mint metadata (token program, decimals, supply, symbol), kept in SQLite
+    and shared by every wallet in a run and across runs.
+
+    Program, decimals and extensions are fixed once a mint is initialized, so
+    holdings decoding uses any cached entry; supply moves, so resolve(fresh=True)
+    refetches entries older than ttl_hours. Unknown mints are loaded with
+    batched getMultipleAccounts (base64): a supply+decimals dataSlice for
+    mints known to be Tokenkeg, whole accounts otherwise (the owner gives the
+    program; Token-2022 extensions give scaling and the symbol).
+
+    With url=None (cache-only runs) nothing is fetched; with path=None
+    nothing is persisted.
+    """
+
+    MAX_ACCOUNTS_PER_CALL = MAX_ACCOUNTS_PER_MULTIPLE_CALL
+
+    def __init__(
+        self,
+        url: Optional[str],
+        *,
+        path: Optional[str] = MINT_STORE_PATH,
+        ttl_hours: float = MINT_CACHE_TTL_HOURS,
+        batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+    ) -> None:
+        self.url = url
+        self.ttl_hours = ttl_hours
+        self.batch_size = batch_size
+        self.fetched = 0
+        self._mints: Dict[str, MintInfo] = {}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS mints ("
+                "mint TEXT PRIMARY KEY, program_id TEXT NOT NULL, decimals INTEGER NOT NULL, "
+                "supply TEXT NOT NULL, symbol TEXT, ui_scaled INTEGER NOT NULL, "
+                "fetched_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            self._conn.commit()
+
+    def _lookup(self, mints: Sequence[str]) -> Dict[str, MintInfo]:
+        with self._lock:
+            found = {m: self._mints[m] for m in mints if m in self._mints}
+            unknown = [m for m in mints if m not in found]
+            if self._conn is None or not unknown:
+                return found
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(unknown), 500):
+                chunk = unknown[start : start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    "SELECT mint, program_id, decimals, supply, symbol, ui_scaled, fetched_at "
+                    f"FROM mints WHERE mint IN ({marks})",
+                    chunk,
+                ).fetchall()
+                for mint, program_id, decimals, supply, symbol, ui_scaled, fetched_at in rows:
+                    info = MintInfo(
+                        program_id=program_id,
+                        decimals=decimals,
+                        supply=int(supply),
+                        symbol=symbol,
+                        ui_scaled=bool(ui_scaled),
+                        fetched_at=fetched_at,
+                    )
+                    self._mints[mint] = info
+                    found[mint] = info
+        return found
+
+    def _store(self, loaded: Dict[str, MintInfo]) -> None:
+        with self._lock:
+            self._mints.update(loaded)
+            self.fetched += len(loaded)
+            if self._conn is None or not loaded:
+                return
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO mints "
+                "(mint, program_id, decimals, supply, symbol, ui_scaled, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        mint,
+                        info.program_id,
+                        info.decimals,
+                        str(info.supply),  # u64 may not fit SQLite's INTEGER
+                        info.symbol,
+                        int(info.ui_scaled),
+                        info.fetched_at,
+                    )
+                    for mint, info in loaded.items()
+                ],
+            )
+            self._conn.commit()
+
+    def resolve(
+        self, needed: Dict[str, Optional[str]], *, fresh: bool = False
+    ) -> Dict[str, MintInfo]:
+        """
+        MintInfo for each mint in `needed` (mint -> owning token program, or
+        None if unknown). Mints that cannot be loaded are left out; with
+        fresh=True, entries past ttl_hours are refetched (or kept if that fails).
+        """
+        found = self._lookup(list(needed))
+        cutoff = time.time() - self.ttl_hours * 3600
+        stale = [m for m, info in found.items() if fresh and info.fetched_at < cutoff]
+        missing = [m for m in needed if m not in found]
+        metrics = run_metrics.registry()
+        metrics.cache_event("mint_info", "hit", len(found) - len(stale))
+        metrics.cache_event("mint_info", "stale", len(stale))
+        metrics.cache_event("mint_info", "miss", len(missing))
+        to_fetch = stale + missing
+        if not to_fetch or self.url is None:
+            return found
+
+        sliced_config: Dict[str, Any] = {
+            "commitment": "finalized",
+            "encoding": "base64",
+            "dataSlice": {"offset": MINT_SUPPLY_OFFSET, "length": MINT_SUPPLY_SLICE_LENGTH},
+        }
+        full_config: Dict[str, Any] = {"commitment": "finalized", "encoding": "base64"}
+        known = {m: found[m].program_id for m in stale}
+        known.update((m, needed[m]) for m in missing if needed[m])
+        groups: List[Tuple[List[str], Dict[str, Any]]] = []
+        for sliced in (True, False):
+            mints = [m for m in to_fetch if (known.get(m) == TOKEN_PROGRAM_ID) == sliced]
+            for i in range(0, len(mints), self.MAX_ACCOUNTS_PER_CALL):
+                chunk = mints[i : i + self.MAX_ACCOUNTS_PER_CALL]
+                groups.append((chunk, sliced_config if sliced else full_config))
+        try:
+            items = _post_json_rpc_batch_url(
+                self.url,
+                [("getMultipleAccounts", [chunk, config]) for chunk, config in groups],
+                max_batch_size=self.batch_size,
+            )
+        except RuntimeError:
+            return found
+
+        now = time.time()
+        loaded: Dict[str, MintInfo] = {}
+        for (chunk, config), item in zip(groups, items):
+            if not item.ok or not isinstance(item.result, dict):
+                continue
+            for mint, account in zip(chunk, item.result.get("value") or []):
+                info = self._decode(account, sliced=config is sliced_config, fetched_at=now)
+                if info is not None:
+                    loaded[mint] = info
+        self._store(loaded)
+        found.update(loaded)
+        return found
+
+    @staticmethod
+    def _decode(account: Any, *, sliced: bool, fetched_at: float) -> Optional[MintInfo]:
+        if not isinstance(account, dict):
+            return None
+        owner = account.get("owner")
+        data = account_data_bytes(account.get("data"))
+        if owner not in (TOKEN_PROGRAM_ID, TOKEN_2022_PROGRAM_ID) or data is None:
+            return None
+        try:
+            if sliced:
+                supply, decimals = decode_mint_supply(data, 0)
+                return MintInfo(owner, decimals, supply, fetched_at=fetched_at)
+            if not is_mint_account(data):
+                return None
+            supply, decimals = decode_mint_supply(data)
+        except ValueError:
+            return None
+        extensions = mint_extensions(data) if owner == TOKEN_2022_PROGRAM_ID else {}
+        metadata = extensions.get(EXTENSION_TOKEN_METADATA)
+        return MintInfo(
+            owner,
+            decimals,
+            supply,
+            symbol=token_metadata_symbol(metadata) if metadata else None,
+            ui_scaled=(
+                EXTENSION_INTEREST_BEARING_CONFIG in extensions
+                or EXTENSION_SCALED_UI_AMOUNT in extensions
+            ),
+            fetched_at=fetched_at,
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def decode_token_holdings(
+    wallet: str,
+    accounts_by_program: Sequence[Tuple[str, List[Dict[str, Any]]]],
+    *,
+    url: str,
+    mint_cache: MintInfoCache,
+    batch_size: int = DEFAULT_RPC_BATCH_SIZE,
 ) -> List[Dict[str, Any]]:
-    url = _rpc_url(helius_api_key)
-    result = _post_json_rpc_url(
-        url,
-        "getSignaturesForAddress",
-        [wallet, {"limit": limit, "commitment": "finalized"}],
-    )
-    return result if isinstance(result, list) else []
+    """
+    extract_token_holdings for accounts fetched as base64 with a mint+amount
+    dataSlice, in (program, accounts) order; the result is the same list the
+    jsonParsed accounts would give.
+
+    Zero balances are dropped while decoding, before any mint is looked up.
+    A program whose accounts reference a mint that can't be loaded, or one
+    with a scaled UI amount, is refetched as jsonParsed instead.
+    """
+    decoded: List[Tuple[str, List[Tuple[Any, str, int]]]] = []
+    needed: Dict[str, str] = {}
+    for program_id, accounts in accounts_by_program:
+        rows: List[Tuple[Any, str, int]] = []
+        for entry in accounts:
+            data = account_data_bytes(entry.get("account", {}).get("data"))
+            try:
+                mint, amount = decode_token_account_slice(data or b"")
+            except ValueError:
+                continue
+            if amount == 0:
+                continue
+            rows.append((entry.get("pubkey"), mint, amount))
+            needed[mint] = program_id
+        decoded.append((program_id, rows))
+
+    mints = mint_cache.resolve(needed) if needed else {}
+    by_program: Dict[str, List[Dict[str, Any]]] = {}
+    reparse: List[str] = []
+    for program_id, rows in decoded:
+        if any(mint not in mints or mints[mint].ui_scaled for _, mint, _ in rows):
+            reparse.append(program_id)
+            continue
+        by_program[program_id] = [
+            {
+                "token_account": pubkey,
+                "mint": mint,
+                "amount_ui": ui_amount(amount, mints[mint].decimals),
+                "amount_ui_str": ui_amount_string(amount, mints[mint].decimals),
+                "decimals": mints[mint].decimals,
+            }
+            for pubkey, mint, amount in rows
+        ]
+    if reparse:
+        items = _post_json_rpc_batch_url(
+            url,
+            [_token_accounts_call(wallet, program_id) for program_id in reparse],
+            max_batch_size=batch_size,
+        )
+        for program_id, item in zip(reparse, items):
+            by_program[program_id] = extract_token_holdings(_token_accounts_value(item.unwrap()))
+
+    # Concatenate in program order so ties sort exactly as on the jsonParsed path.
+    holdings = [h for program_id, _rows in decoded for h in by_program[program_id]]
+    holdings.sort(key=lambda h: h["amount_ui"], reverse=True)
+    return holdings
 
 
-def rpc_get_transaction(signature: str, *, helius_api_key: Optional[str]) -> Optional[Dict[str, Any]]:
+def rpc_get_transactions(
+    signatures: Sequence[str],
+    *,
+    helius_api_key: Optional[str],
+    batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+    encoding: str = "jsonParsed",
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    getTransaction for each signature, batched: one entry per signature, None
+    where the transaction could not be fetched.
+    """
+    if not signatures:
+        return []
     try:
-        url = _rpc_url(helius_api_key)
-        return _post_json_rpc_url(
-            url,
-            "getTransaction",
-            [
-                signature,
-                {
-                    "commitment": "finalized",
-                    "encoding": "jsonParsed",
-                    "maxSupportedTransactionVersion": 0,
-                },
-            ],
+        items = _post_json_rpc_batch_url(
+            _rpc_url(helius_api_key),
+            [_transaction_call(sig, encoding=encoding) for sig in signatures],
+            max_batch_size=batch_size,
         )
     except RuntimeError:
-        return None
+        return [None] * len(signatures)
+    return [item.result if item.ok and isinstance(item.result, dict) else None for item in items]
+
+
+class AddressLookupTableCache:
+    """
+    Address lookup table contents, fetched with batched getMultipleAccounts
+    (base64) and kept for the rest of the run.
+
+    Tables are append-only while active, so a cached table stays valid for
+    every index it already holds; an index past its end triggers a refetch.
+    """
+
+    MAX_ACCOUNTS_PER_CALL = MAX_ACCOUNTS_PER_MULTIPLE_CALL
+
+    def __init__(self, url: str, *, batch_size: int = DEFAULT_RPC_BATCH_SIZE) -> None:
+        self.url = url
+        self.batch_size = batch_size
+        self.fetched = 0
+        self._tables: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, needed: Dict[str, int]) -> Dict[str, List[str]]:
+        """
+        Contents of each table in `needed` (table -> highest index used).
+        Tables that cannot be loaded are left out.
+        """
+        with self._lock:
+            found = {t: self._tables[t] for t in needed if t in self._tables}
+        missing = [t for t, top in needed.items() if len(found.get(t, ())) <= top]
+        metrics = run_metrics.registry()
+        metrics.cache_event("alt_tables", "hit", len(needed) - len(missing))
+        stale = sum(1 for t in missing if t in found)
+        metrics.cache_event("alt_tables", "stale", stale)
+        metrics.cache_event("alt_tables", "miss", len(missing) - stale)
+        if missing:
+            calls = [
+                (
+                    "getMultipleAccounts",
+                    [
+                        missing[i : i + self.MAX_ACCOUNTS_PER_CALL],
+                        {"commitment": "finalized", "encoding": "base64"},
+                    ],
+                )
+                for i in range(0, len(missing), self.MAX_ACCOUNTS_PER_CALL)
+            ]
+            try:
+                items = _post_json_rpc_batch_url(self.url, calls, max_batch_size=self.batch_size)
+            except RuntimeError:
+                # Best effort, like transaction fetches: keys from tables we
+                # could not load are simply left out.
+                return found
+            loaded: Dict[str, List[str]] = {}
+            for start, item in zip(range(0, len(missing), self.MAX_ACCOUNTS_PER_CALL), items):
+                if not item.ok or not isinstance(item.result, dict):
+                    continue
+                values = item.result.get("value") or []
+                for table, account in zip(missing[start:], values):
+                    data = account_data_bytes((account or {}).get("data"))
+                    if data is None:
+                        continue
+                    try:
+                        loaded[table] = decode_lookup_table_addresses(data)
+                    except ValueError:
+                        continue
+            with self._lock:
+                self._tables.update(loaded)
+                self.fetched += len(loaded)
+            found.update(loaded)
+        return found
+
+
+def transaction_account_keys(
+    tx: Dict[str, Any], *, alt_cache: Optional[AddressLookupTableCache] = None
+) -> List[str]:
+    """
+    Every account key of a getTransaction result, including addresses loaded
+    through v0 lookup tables (writable, then readonly).
+
+    base64 results are decoded locally; loaded addresses come from
+    meta.loadedAddresses when the node supplies them, else from alt_cache.
+    Other encodings fall back to extract_program_ids_from_tx.
+    """
+    raw = account_data_bytes(tx.get("transaction"))
+    if raw is None:
+        return extract_program_ids_from_tx(tx)
+    try:
+        decoded = decode_transaction_keys(raw)
+    except ValueError:
+        return []
+    if not decoded.lookups:
+        return decoded.static_keys
+
+    loaded = (tx.get("meta") or {}).get("loadedAddresses")
+    if isinstance(loaded, dict):
+        return [
+            *decoded.static_keys,
+            *(str(k) for k in loaded.get("writable") or []),
+            *(str(k) for k in loaded.get("readonly") or []),
+        ]
+    if alt_cache is None:
+        return decoded.static_keys
+
+    needed: Dict[str, int] = {}
+    for lookup in decoded.lookups:
+        indexes = [*lookup.writable_indexes, *lookup.readonly_indexes]
+        if indexes:
+            needed[lookup.table] = max(needed.get(lookup.table, -1), *indexes)
+    tables = alt_cache.resolve(needed)
+
+    def _load(table: str, indexes: List[int]) -> List[str]:
+        addresses = tables.get(table, [])
+        return [addresses[i] for i in indexes if i < len(addresses)]
+
+    writable = [k for lk in decoded.lookups for k in _load(lk.table, lk.writable_indexes)]
+    readonly = [k for lk in decoded.lookups for k in _load(lk.table, lk.readonly_indexes)]
+    return [*decoded.static_keys, *writable, *readonly]
 
 
 def extract_program_ids_from_tx(tx: Dict[str, Any]) -> List[str]:
@@ -336,6 +922,122 @@ def extract_program_ids_from_tx(tx: Dict[str, Any]) -> List[str]:
     return program_ids
 
 
+def compact_transaction(
+    tx: Dict[str, Any], *, alt_cache: Optional[AddressLookupTableCache] = None
+) -> Dict[str, Any]:
+    """
+    Reduce a getTransaction result (jsonParsed or base64) to the fields swap
+    detection reads: blockTime, slot and the resolved account keys.
+    """
+    return {
+        "blockTime": tx.get("blockTime"),
+        "slot": tx.get("slot"),
+        "transaction": {
+            "message": {"accountKeys": transaction_account_keys(tx, alt_cache=alt_cache)}
+        },
+    }
+
+
+class TransactionStore:
+    """
+    Signature-keyed on-disk store of finalized transactions.
+
+    Finalized transactions never change, so one store is shared by every wallet
+    in a run and reused across runs: each signature is downloaded at most once.
+    Entries are kept in compact form (see compact_transaction), zlib-compressed.
+    """
+
+    def __init__(self, path: str = TX_STORE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS transactions ("
+            "signature TEXT PRIMARY KEY, block_time INTEGER, slot INTEGER, data BLOB NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def get_many(self, signatures: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        found: Dict[str, Dict[str, Any]] = {}
+        unique = list(dict.fromkeys(signatures))
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(unique), 500):
+                chunk = unique[start : start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT signature, data FROM transactions WHERE signature IN ({marks})",
+                    chunk,
+                ).fetchall()
+                for sig, data in rows:
+                    try:
+                        found[sig] = json.loads(zlib.decompress(data))
+                    except (zlib.error, json.JSONDecodeError):
+                        continue
+        return found
+
+    def put_many(self, transactions: Dict[str, Dict[str, Any]]) -> None:
+        if not transactions:
+            return
+        rows = [
+            (
+                sig,
+                tx.get("blockTime"),
+                tx.get("slot"),
+                zlib.compress(json.dumps(tx, separators=(",", ":")).encode("utf-8")),
+            )
+            for sig, tx in transactions.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO transactions (signature, block_time, slot, data) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def fetch_transactions(
+    signatures: Sequence[str],
+    *,
+    helius_api_key: Optional[str],
+    tx_store: Optional[TransactionStore],
+    batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+    encoding: str = "base64",
+    alt_cache: Optional[AddressLookupTableCache] = None,
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Like rpc_get_transactions, but returning compact transactions (see
+    compact_transaction) and served from tx_store where possible; only
+    signatures the store has never seen go to the RPC, and they are stored.
+    """
+    known = tx_store.get_many(signatures) if tx_store is not None else {}
+    missing = [sig for sig in dict.fromkeys(signatures) if sig not in known]
+    if tx_store is not None:
+        run_metrics.registry().cache_event("tx_store", "hit", len(known))
+        run_metrics.registry().cache_event("tx_store", "miss", len(missing))
+    fetched: Dict[str, Dict[str, Any]] = {}
+    for sig, tx in zip(
+        missing,
+        rpc_get_transactions(
+            missing, helius_api_key=helius_api_key, batch_size=batch_size, encoding=encoding
+        ),
+    ):
+        if tx:
+            fetched[sig] = compact_transaction(tx, alt_cache=alt_cache)
+    if tx_store is not None:
+        tx_store.put_many(fetched)
+    known.update(fetched)
+    return [known.get(sig) for sig in signatures]
+
+
 @dataclass
 class SwapStats:
     recent_signatures: int
@@ -390,6 +1092,44 @@ def helius_get_transactions_for_address(
     return data if isinstance(data, list) else []
 
 
+def _helius_signatures_call(
+    wallet: str,
+    *,
+    limit: int,
+    lookback_days: int,
+    token_accounts: str,
+    strict_last_n: bool,
+    after_slot: Optional[int] = None,
+) -> RpcCall:
+    filters: Dict[str, Any] = {"status": "succeeded", "tokenAccounts": token_accounts}
+    if not strict_last_n and lookback_days > 0:
+        now_ts = int(time.time())
+        gte_ts = max(0, now_ts - lookback_days * 86400)
+        filters["blockTime"] = {"gte": gte_ts}
+    if after_slot is not None:
+        filters["slot"] = {"gt": after_slot}
+    return (
+        "getTransactionsForAddress",
+        [
+            wallet,
+            {
+                "transactionDetails": "signatures",
+                "sortOrder": "desc",
+                "limit": min(limit, 1000),
+                "commitment": "finalized",
+                "filters": filters,
+            },
+        ],
+    )
+
+
+def _helius_signatures_value(result: Any) -> List[Dict[str, Any]]:
+    if not isinstance(result, dict):
+        return []
+    data = result.get("data")
+    return data if isinstance(data, list) else []
+
+
 def helius_get_signatures_for_address(
     wallet: str,
     *,
@@ -398,6 +1138,7 @@ def helius_get_signatures_for_address(
     lookback_days: int,
     token_accounts: str,
     strict_last_n: bool,
+    after_slot: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
     """
     Use Helius getTransactionsForAddress in signatures mode.
@@ -406,62 +1147,364 @@ def helius_get_signatures_for_address(
     - If strict_last_n is True, we omit the blockTime filter so we truly get
       the most recent N signatures regardless of age.
     - If lookback_days <= 0, we also omit the blockTime filter.
+    - after_slot restricts results to slots strictly after it (delta refresh).
     """
-    filters: Dict[str, Any] = {"status": "succeeded", "tokenAccounts": token_accounts}
-    if not strict_last_n and lookback_days > 0:
-        now_ts = int(time.time())
-        gte_ts = max(0, now_ts - lookback_days * 86400)
-        filters["blockTime"] = {"gte": gte_ts}
-    params = [
-        wallet,
-        {
-            "transactionDetails": "signatures",
-            "sortOrder": "desc",
-            "limit": min(limit, 1000),
-            "commitment": "finalized",
-            "filters": filters,
-        },
-    ]
     url = _rpc_url(helius_api_key)
-    result = _post_json_rpc_url(url, "getTransactionsForAddress", params)
-    if not isinstance(result, dict):
-        return []
-    data = result.get("data")
-    return data if isinstance(data, list) else []
+    result = _post_json_rpc_url(
+        url,
+        *_helius_signatures_call(
+            wallet,
+            limit=limit,
+            lookback_days=lookback_days,
+            token_accounts=token_accounts,
+            strict_last_n=strict_last_n,
+            after_slot=after_slot,
+        ),
+    )
+    return _helius_signatures_value(result)
+
+
+@dataclass
+class SignatureQuery:
+    """
+    One wallet's signature listing: getSignaturesForAddress on standard RPC,
+    getTransactionsForAddress (signatures mode) on Helius. Newest first.
+
+    `until` (standard) / `after_slot` (Helius) stop the listing at a previous
+    cursor for delta refreshes.
+    """
+
+    wallet: str
+    page_size: int
+    helius_api_key: Optional[str] = None
+    helius_lookback_days: int = 0
+    helius_token_accounts: str = "balanceChanged"
+    helius_strict_last_n: bool = False
+    until: Optional[str] = None
+    after_slot: Optional[int] = None
+
+    def page_call(self, page_token: Optional[str]) -> RpcCall:
+        if self.helius_api_key:
+            method, params = _helius_signatures_call(
+                self.wallet,
+                limit=self.page_size,
+                lookback_days=self.helius_lookback_days,
+                token_accounts=self.helius_token_accounts,
+                strict_last_n=self.helius_strict_last_n,
+                after_slot=self.after_slot,
+            )
+            if page_token:
+                params[1]["paginationToken"] = page_token
+            return method, params
+        method, params = _signatures_call(self.wallet, limit=self.page_size, until=self.until)
+        if page_token:
+            params[1]["before"] = page_token
+        return method, params
+
+    def page_value(self, result: Any) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        (page, token for the next-older page or None when the listing is done).
+        """
+        if self.helius_api_key:
+            page = _helius_signatures_value(result)
+            token = result.get("paginationToken") if isinstance(result, dict) else None
+            return page, (str(token) if token and page else None)
+        page = result if isinstance(result, list) else []
+        if len(page) < self.page_size or not page[-1].get("signature"):
+            return page, None
+        return page, str(page[-1]["signature"])
+
+
+class SignaturePager:
+    """
+    Iterate a SignatureQuery page by page, back to a count and/or time bound.
+
+    Pages are yielded as they arrive so callers can parse and summarize each
+    one and drop it; memory is bounded by one page, not the history.
+    `truncated` is set when a bound (rather than the end of the listing)
+    stopped iteration. `first_result` lets the first page ride along in an
+    earlier JSON-RPC batch.
+    """
+
+    _NOT_FETCHED = object()
+
+    def __init__(
+        self,
+        query: SignatureQuery,
+        *,
+        max_signatures: int = 0,
+        since_ts: int = 0,
+        first_result: Any = _NOT_FETCHED,
+    ) -> None:
+        self.query = query
+        self.max_signatures = max_signatures
+        self.since_ts = since_ts
+        self.first_result = first_result
+        self.count = 0
+        self.pages = 0
+        self.truncated = False
+
+    def __iter__(self) -> Iterator[List[Dict[str, Any]]]:
+        url = _rpc_url(self.query.helius_api_key)
+        result = self.first_result
+        if result is SignaturePager._NOT_FETCHED:
+            result = _post_json_rpc_url(url, *self.query.page_call(None))
+        while True:
+            page, token = self.query.page_value(result)
+            if self.since_ts > 0:
+                # Entries without a blockTime are kept; the list is newest first.
+                kept = [s for s in page if (s.get("blockTime") or self.since_ts) >= self.since_ts]
+                if len(kept) < len(page):
+                    page, token, self.truncated = kept, None, True
+            remaining = self.max_signatures - self.count
+            if self.max_signatures > 0 and (
+                len(page) > remaining or (len(page) == remaining and token is not None)
+            ):
+                page, token, self.truncated = page[:remaining], None, True
+            if page:
+                self.count += len(page)
+                self.pages += 1
+                yield page
+            if token is None:
+                return
+            result = _post_json_rpc_url(url, *self.query.page_call(token))
 
 
 def helius_parse_transactions(
-    signatures: Sequence[str], *, helius_api_key: str
+    signatures: Sequence[str],
+    *,
+    helius_api_key: str,
+    chunk_size: int = HELIUS_PARSE_CHUNK_SIZE,
+    concurrency: int = HELIUS_PARSE_CONCURRENCY,
 ) -> List[Dict[str, Any]]:
     """
     Parse transactions into human-readable structures using Helius Enhanced API.
+
+    Takes any number of signatures: they are split into chunks of chunk_size
+    that run up to `concurrency` at a time, and results come back in input
+    signature order. Chunks that still fail after the transport's retries are
+    re-sent on their own (up to HELIUS_PARSE_CHUNK_ATTEMPTS rounds); chunks
+    that succeeded are never repeated.
     """
     if not signatures:
         return []
     url = f"{HELIUS_PARSE_TX_URL_BASE}?api-key={urllib.parse.quote(helius_api_key)}"
-    payload = {"transactions": list(signatures)}
-    body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        data=body,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    try:
-        with urllib.request.urlopen(req, timeout=90) as resp:
-            raw = resp.read()
-    except urllib.error.HTTPError as e:
+    chunk_size = max(1, min(chunk_size, HELIUS_PARSE_CHUNK_SIZE))
+    chunks = [list(signatures[i : i + chunk_size]) for i in range(0, len(signatures), chunk_size)]
+
+    def _parse(chunk: List[str]) -> List[Dict[str, Any]]:
+        parsed = rpc_transport.post_json(
+            url,
+            {"transactions": chunk},
+            label="Helius parseTransactions",
+            timeout=90,
+            metric="parseTransactions",
+        )
+        if not isinstance(parsed, list):
+            return []
+        # null / non-object items stand for transactions Helius could not parse.
+        parsed = [tx for tx in parsed if isinstance(tx, dict)]
+        order = {sig: i for i, sig in enumerate(chunk)}
+        return sorted(parsed, key=lambda tx: order.get(tx.get("signature"), len(order)))
+
+    def _attempt(idx: int) -> Tuple[int, Optional[List[Dict[str, Any]]], Optional[RuntimeError]]:
+        try:
+            return idx, _parse(chunks[idx]), None
+        except RuntimeError as e:
+            return idx, None, e
+
+    results: Dict[int, List[Dict[str, Any]]] = {}
+    pending = list(range(len(chunks)))
+    last_error: Optional[RuntimeError] = None
+    for attempt in range(HELIUS_PARSE_CHUNK_ATTEMPTS):
+        if attempt:
+            time.sleep(rpc_transport.backoff_delay(attempt))
+        if concurrency <= 1 or len(pending) == 1:
+            outcomes = [_attempt(idx) for idx in pending]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(concurrency, len(pending)), thread_name_prefix="helius-parse"
+            ) as executor:
+                outcomes = list(executor.map(_attempt, pending))
+
+        failed: List[int] = []
+        for idx, parsed, error in outcomes:
+            if error is None:
+                results[idx] = parsed or []
+                continue
+            if isinstance(error, rpc_transport.CircuitOpenError):
+                raise error
+            failed.append(idx)
+            last_error = error
+        pending = failed
+        if not pending:
+            break
+
+    if pending:
         raise RuntimeError(
-            f"HTTP error calling Helius parseTransactions: {e.code} {e.reason}"
-        ) from e
-    except urllib.error.URLError as e:
-        raise RuntimeError(f"Network error calling Helius parseTransactions: {e.reason}") from e
+            f"Helius parseTransactions failed for {len(pending)} of {len(chunks)} "
+            f"chunk(s) after {HELIUS_PARSE_CHUNK_ATTEMPTS} attempts: {last_error}"
+        ) from last_error
+    return [tx for idx in range(len(chunks)) for tx in results[idx]]
 
-    try:
-        parsed = json.loads(raw)
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"Invalid JSON from Helius parseTransactions: {raw[:200]!r}") from e
-    return parsed if isinstance(parsed, list) else []
+
+class HeliusParseScheduler:
+    """
+    Run-level parseTransactions front end shared by every wallet in flight.
+
+    Staker wallets often share transactions (batch delegations, common funding
+    sources, multisig authorities). Each unique signature is parsed once:
+    requests for a signature already queued or in flight wait on the same
+    future, and recently parsed transactions are served from a bounded LRU.
+    There is no lookahead: a signature is only shared if another wallet asks
+    for it while it is queued, in flight or still in the LRU. While more than
+    one wallet is in flight, partial chunks linger briefly so the others can
+    fill them; a lone wallet's chunk goes out at once. Parsed dicts are shared
+    between wallets and must be treated as read-only.
+    """
+
+    def __init__(
+        self,
+        helius_api_key: str,
+        *,
+        concurrency: int = HELIUS_PARSE_CONCURRENCY,
+        linger_s: float = HELIUS_PARSE_LINGER_S,
+        cache_size: int = HELIUS_PARSE_CACHE_SIZE,
+    ) -> None:
+        self.helius_api_key = helius_api_key
+        self.linger_s = linger_s
+        self.cache_size = cache_size
+        self.requested = 0
+        self.parsed = 0
+        self._cond = threading.Condition()
+        self._futures: "OrderedDict[str, Future]" = OrderedDict()
+        self._queue: List[str] = []
+        self._queued_at = 0.0
+        self._callers = 0
+        self._closed = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, concurrency), thread_name_prefix="helius-parse"
+        )
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="helius-parse-flush", daemon=True
+        )
+        self._flusher.start()
+
+    def parse(self, signatures: Sequence[str]) -> List[Dict[str, Any]]:
+        """
+        Same contract as helius_parse_transactions: parsed transactions in
+        input signature order; RuntimeError if a signature's chunk failed.
+        """
+        futures: List[Future] = []
+        hits = 0
+        with self._cond:
+            self._callers += 1
+            for sig in signatures:
+                self.requested += 1
+                fut = self._futures.get(sig)
+                if fut is None:
+                    fut = Future()
+                    self._futures[sig] = fut
+                    if not self._queue:
+                        self._queued_at = time.monotonic()
+                    self._queue.append(sig)
+                else:
+                    hits += 1
+                    self._futures.move_to_end(sig)
+                futures.append(fut)
+            if self._queue:
+                self._cond.notify_all()
+        # Hits include signatures still in flight for another wallet.
+        run_metrics.registry().cache_event("helius_parse", "hit", hits)
+        run_metrics.registry().cache_event("helius_parse", "miss", len(signatures) - hits)
+
+        parsed: List[Dict[str, Any]] = []
+        try:
+            for fut in futures:
+                tx = fut.result()
+                if tx is not None:
+                    parsed.append(tx)
+        finally:
+            with self._cond:
+                self._callers -= 1
+                # A chunk lingering for other wallets may now be alone.
+                self._cond.notify_all()
+        return parsed
+
+    def _flush_loop(self) -> None:
+        with self._cond:
+            while True:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                deadline = self._queued_at + self.linger_s
+                # Only worth waiting while another wallet could add signatures.
+                while (
+                    len(self._queue) < HELIUS_PARSE_CHUNK_SIZE
+                    and self._callers > 1
+                    and not self._closed
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                chunk = self._queue[:HELIUS_PARSE_CHUNK_SIZE]
+                del self._queue[: len(chunk)]
+                self.parsed += len(chunk)
+                self._executor.submit(self._run_chunk, chunk)
+
+    def _run_chunk(self, chunk: List[str]) -> None:
+        try:
+            txs = helius_parse_transactions(
+                chunk, helius_api_key=self.helius_api_key, concurrency=1
+            )
+            by_sig = {tx.get("signature"): tx for tx in txs if isinstance(tx, dict)}
+            with self._cond:
+                futures = [(self._futures.get(sig), by_sig.get(sig)) for sig in chunk]
+                self._evict()
+            for fut, tx in futures:
+                if fut is not None and not fut.done():
+                    fut.set_result(tx)
+        except Exception as e:
+            # Whatever went wrong, every waiter in parse() must be released.
+            error = e if isinstance(e, RuntimeError) else RuntimeError(
+                f"Helius parseTransactions failed: {type(e).__name__}: {e}"
+            )
+            with self._cond:
+                # Forget the failures so a later request can try again.
+                pending = [self._futures.pop(sig) for sig in chunk if sig in self._futures]
+            for fut in pending:
+                if not fut.done():
+                    fut.set_exception(error)
+
+    def _evict(self) -> None:
+        # Oldest-used first; only finished entries can go.
+        excess = len(self._futures) - self.cache_size
+        if excess <= 0:
+            return
+        stale: List[str] = []
+        for sig, fut in self._futures.items():
+            if len(stale) >= excess:
+                break
+            if fut.done():
+                stale.append(sig)
+        for sig in stale:
+            del self._futures[sig]
+
+    def summary(self) -> str:
+        shared = self.requested - self.parsed
+        return (
+            f"{self.requested:,} signatures requested, {self.parsed:,} parsed, "
+            f"{shared:,} served from shared/in-flight results"
+        )
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        self._executor.shutdown(wait=True)
 
 
 def filter_wallet_signed_transactions(
@@ -674,9 +1717,19 @@ def analyze_swaps(
     swap_program_ids: Dict[str, str],
     tx_fetch_limit: int,
     helius_api_key: Optional[str],
-) -> SwapStats:
+    batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+    tx_store: Optional[TransactionStore] = None,
+    tx_encoding: str = "base64",
+    alt_cache: Optional[AddressLookupTableCache] = None,
+) -> Tuple[SwapStats, List[str]]:
+    """
+    Detect swaps in the newest tx_fetch_limit signatures.
+
+    Returns the stats together with every matched swap program ID, so callers
+    get both from a single pass over the fetched transactions.
+    """
     if not signatures:
-        return SwapStats(0, 0, 0.0, 0.0, None)
+        return SwapStats(0, 0, 0.0, 0.0, None), []
 
     # Use the available blockTimes to establish a lookback window.
     times = [s.get("blockTime") for s in signatures if s.get("blockTime") is not None]
@@ -688,107 +1741,643 @@ def analyze_swaps(
 
     recent_swaps = 0
     last_swap_time: Optional[int] = None
+    matched_programs: List[str] = []
 
-    # Only fetch transactions for a subset to control RPC cost.
-    for sig_info in signatures[:tx_fetch_limit]:
-        sig = sig_info.get("signature")
-        if not sig:
-            continue
-        tx = rpc_get_transaction(sig, helius_api_key=helius_api_key)
-        if not tx:
-            continue
-        program_ids = extract_program_ids_from_tx(tx)
-        matched = [pid for pid in program_ids if pid in swap_program_ids]
+    per_signature = swap_matches_by_signature(
+        signatures,
+        swap_program_ids=swap_program_ids,
+        tx_fetch_limit=tx_fetch_limit,
+        helius_api_key=helius_api_key,
+        batch_size=batch_size,
+        tx_store=tx_store,
+        tx_encoding=tx_encoding,
+        alt_cache=alt_cache,
+    )
+    for sig_info, matched in zip(signatures, per_signature):
         if matched:
             recent_swaps += 1
+            matched_programs.extend(matched)
             bt = sig_info.get("blockTime")
             if bt is not None:
                 last_swap_time = max(last_swap_time or bt, bt)
 
     swaps_per_day = (recent_swaps / lookback_days) if lookback_days > 0 else 0.0
-    return SwapStats(
+    stats = SwapStats(
         recent_signatures=len(signatures),
         recent_swaps=recent_swaps,
         lookback_days=lookback_days,
         swaps_per_day=swaps_per_day,
         last_swap_time=last_swap_time,
     )
+    return stats, matched_programs
 
 
-def ensure_out_dir() -> None:
-    os.makedirs(OUT_DIR, exist_ok=True)
-    os.makedirs(CACHE_DIR, exist_ok=True)
+def swap_matches_by_signature(
+    signatures: Sequence[Dict[str, Any]],
+    *,
+    swap_program_ids: Dict[str, str],
+    tx_fetch_limit: int,
+    helius_api_key: Optional[str],
+    batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+    tx_store: Optional[TransactionStore] = None,
+    tx_encoding: str = "base64",
+    alt_cache: Optional[AddressLookupTableCache] = None,
+) -> List[Optional[List[str]]]:
+    """
+    Matched swap program IDs for each signature, in order. Only the newest
+    tx_fetch_limit signatures are fetched; the rest (and transactions that
+    could not be fetched) get None.
+    """
+    matches: List[Optional[List[str]]] = [None] * len(signatures)
+    # Only fetch transactions for a subset to control RPC cost.
+    subset = [i for i, s in enumerate(signatures[:tx_fetch_limit]) if s.get("signature")]
+    txs = fetch_transactions(
+        [signatures[i]["signature"] for i in subset],
+        helius_api_key=helius_api_key,
+        tx_store=tx_store,
+        batch_size=batch_size,
+        encoding=tx_encoding,
+        alt_cache=alt_cache,
+    )
+    for i, tx in zip(subset, txs):
+        if tx:
+            program_ids = extract_program_ids_from_tx(tx)
+            matches[i] = [pid for pid in program_ids if pid in swap_program_ids]
+    return matches
 
 
-def _cache_path(wallet: str) -> str:
-    # Wallet pubkeys are safe as filenames.
-    return os.path.join(CACHE_DIR, f"{wallet}.json")
+def _count_items(items: Iterable[str]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for item in items:
+        counts[item] = counts.get(item, 0) + 1
+    return counts
 
 
-def load_cached_profile(wallet: str) -> Optional[Dict[str, Any]]:
-    path = _cache_path(wallet)
-    if not os.path.exists(path):
-        return None
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data if isinstance(data, dict) else None
-    except (OSError, json.JSONDecodeError):
-        return None
+def _add_counts(into: Dict[str, int], other: Dict[str, int]) -> None:
+    for key, value in other.items():
+        into[key] = into.get(key, 0) + value
 
 
-def cache_is_fresh(profile: Dict[str, Any], *, ttl_hours: float) -> bool:
-    try:
-        cached_at = float(profile.get("cached_at") or 0.0)
-    except (TypeError, ValueError):
-        cached_at = 0.0
-    if cached_at <= 0:
-        return False
-    age_seconds = max(0.0, time.time() - cached_at)
-    return age_seconds <= ttl_hours * 3600.0
+def _signature_cursor(sig_infos: Sequence[Dict[str, Any]]) -> Tuple[Optional[str], Optional[int]]:
+    """
+    (signature, slot) of the newest entry in a newest-first signature list.
+    """
+    for info in sig_infos:
+        sig = info.get("signature")
+        if sig:
+            slot = info.get("slot")
+            return str(sig), slot if isinstance(slot, int) else None
+    return None, None
 
 
-def write_cached_profile(profile: Dict[str, Any]) -> None:
-    wallet = str(profile.get("wallet") or "")
-    if not wallet:
-        return
-    path = _cache_path(wallet)
-    try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(profile, f, indent=2, sort_keys=True)
-    except OSError:
-        # Best-effort cache write.
-        return
+def _min_opt(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    return b if a is None else a if b is None else min(a, b)
 
 
-def load_manifest() -> Dict[str, Any]:
-    if not os.path.exists(MANIFEST_PATH):
-        return {"processed_wallets": {}, "updated_at": int(time.time())}
-    try:
-        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if isinstance(data, dict):
-            data.setdefault("processed_wallets", {})
-            data.setdefault("updated_at", int(time.time()))
-            return data
-    except (OSError, json.JSONDecodeError):
-        pass
-    return {"processed_wallets": {}, "updated_at": int(time.time())}
+def _max_opt(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    return b if a is None else a if b is None else max(a, b)
 
 
-def update_manifest(manifest: Dict[str, Any], wallet: str, cached_at: float) -> None:
-    processed = manifest.setdefault("processed_wallets", {})
-    if isinstance(processed, dict):
-        processed[wallet] = int(cached_at)
-    manifest["updated_at"] = int(time.time())
+@dataclass
+class WalletActivity:
+    """
+    Mergeable summary of the transactions seen for a wallet, plus the cursor
+    (newest signature/slot) a delta refresh resumes from.
+
+    Everything a profile derives from transaction history is recomputed from
+    this, so an incremental refresh only has to summarize the new
+    transactions and merge. `entries` keeps the per-signature facts behind
+    the totals (newest first), so a merge can drop what has left the
+    signature/time window and recount: merged totals always describe the
+    same window a full refresh would read. Counterparty maps are kept in
+    full (the profile only shows the top 12) so merged rankings stay exact.
+    """
 
+    helius_used: bool = False
+    newest_signature: Optional[str] = None
+    newest_slot: Optional[int] = None
+    signatures: int = 0
+    first_time: Optional[int] = None
+    last_time: Optional[int] = None
+    swaps: int = 0
+    last_swap_time: Optional[int] = None
+    # Swap program IDs (standard RPC) or Helius swap sources -> count.
+    swap_matches: Dict[str, int] = field(default_factory=dict)
+    type_counts: Dict[str, int] = field(default_factory=dict)
+    source_counts: Dict[str, int] = field(default_factory=dict)
+    recent: List[Dict[str, Any]] = field(default_factory=list)
+    funding_in_lamports: int = 0
+    funding_out_lamports: int = 0
+    funding_in_by: Dict[str, int] = field(default_factory=dict)
+    funding_out_by: Dict[str, int] = field(default_factory=dict)
+    # One per listed signature: sig, bt (blockTime); n/t when it counts as a
+    # wallet transaction (at time t); sw (matches) for a swap; ty/src (Helius
+    # type/source); fi/fo (funding lamports by counterparty).
+    entries: List[Dict[str, Any]] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "WalletActivity":
+        return cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def swap_stats(self) -> SwapStats:
+        if self.first_time is not None and self.last_time is not None:
+            lookback_seconds = self.last_time - self.first_time
+            lookback_days = max(lookback_seconds / 86400, 1 / 24)  # minimum 1 hour window
+        else:
+            lookback_days = 0.0
+        swaps_per_day = (self.swaps / lookback_days) if lookback_days > 0 else 0.0
+        return SwapStats(
+            recent_signatures=self.signatures,
+            recent_swaps=self.swaps,
+            lookback_days=lookback_days,
+            swaps_per_day=swaps_per_day,
+            last_swap_time=self.last_swap_time,
+        )
 
-def write_manifest(manifest: Dict[str, Any]) -> None:
+    def recount(self) -> None:
+        """
+        Rebuild the totals from entries.
+        """
+        totals = WalletActivity()
+        for entry in self.entries:
+            t = entry.get("t")
+            if entry.get("n"):
+                totals.signatures += 1
+                totals.first_time = _min_opt(totals.first_time, t)
+                totals.last_time = _max_opt(totals.last_time, t)
+                if "ty" in entry:
+                    _add_counts(totals.type_counts, {entry["ty"]: 1})
+                    _add_counts(totals.source_counts, {entry["src"]: 1})
+            if "sw" in entry:
+                totals.swaps += 1
+                totals.last_swap_time = _max_opt(totals.last_swap_time, t)
+                _add_counts(totals.swap_matches, _count_items(entry["sw"]))
+            funding_in = entry.get("fi") or {}
+            funding_out = entry.get("fo") or {}
+            totals.funding_in_lamports += sum(funding_in.values())
+            totals.funding_out_lamports += sum(funding_out.values())
+            _add_counts(totals.funding_in_by, funding_in)
+            _add_counts(totals.funding_out_by, funding_out)
+        for name in (
+            "signatures",
+            "first_time",
+            "last_time",
+            "swaps",
+            "last_swap_time",
+            "swap_matches",
+            "type_counts",
+            "source_counts",
+            "funding_in_lamports",
+            "funding_out_lamports",
+            "funding_in_by",
+            "funding_out_by",
+        ):
+            setattr(self, name, getattr(totals, name))
+
+    def trim(
+        self, *, max_signatures: int, since_ts: int, tx_fetch_limit: Optional[int] = None
+    ) -> None:
+        """
+        Drop entries a full refresh would not read (older than since_ts, or
+        past the newest max_signatures; 0 disables either bound) and recount.
+        With tx_fetch_limit, swaps past that many newest entries are forgotten,
+        as a full refresh would not have fetched those transactions.
+        """
+        entries = self.entries
+        if since_ts > 0:
+            # Entries without a blockTime are kept, as SignaturePager does.
+            entries = [e for e in entries if (e.get("bt") or since_ts) >= since_ts]
+        if max_signatures > 0:
+            entries = entries[:max_signatures]
+        if tx_fetch_limit is not None:
+            for entry in entries[tx_fetch_limit:]:
+                entry.pop("sw", None)
+        self.entries = entries
+        self.recount()
+        window = {e.get("sig") for e in entries}
+        self.recent = [r for r in self.recent if r.get("signature") in window]
+
+    def merged_with_newer(
+        self,
+        newer: "WalletActivity",
+        *,
+        max_signatures: int,
+        since_ts: int,
+        tx_fetch_limit: Optional[int] = None,
+        recent_limit: int = 25,
+    ) -> "WalletActivity":
+        """
+        Combine with the summary of transactions strictly newer than this one's
+        cursor, trimmed back to the window a full refresh would read.
+        """
+        merged = copy.deepcopy(self)
+        merged.absorb(newer, newer=True, recent_limit=recent_limit)
+        merged.trim(
+            max_signatures=max_signatures, since_ts=since_ts, tx_fetch_limit=tx_fetch_limit
+        )
+        return merged
+
+    def absorb(self, other: "WalletActivity", *, newer: bool, recent_limit: int = 25) -> None:
+        """
+        In-place merge of a summary of disjoint transactions; `newer` says
+        which side of this one they lie on, which decides the cursor.
+        """
+        if (newer and other.newest_signature) or self.newest_signature is None:
+            self.newest_signature = other.newest_signature
+            self.newest_slot = other.newest_slot
+        self.signatures += other.signatures
+        self.first_time = _min_opt(self.first_time, other.first_time)
+        self.last_time = _max_opt(self.last_time, other.last_time)
+        self.swaps += other.swaps
+        self.last_swap_time = _max_opt(self.last_swap_time, other.last_swap_time)
+        _add_counts(self.swap_matches, other.swap_matches)
+        _add_counts(self.type_counts, other.type_counts)
+        _add_counts(self.source_counts, other.source_counts)
+        newest, oldest = (other.recent, self.recent) if newer else (self.recent, other.recent)
+        seen = {r.get("signature") for r in newest}
+        recent = [*newest, *(r for r in oldest if r.get("signature") not in seen)]
+        recent.sort(key=lambda r: (r.get("timestamp") or 0), reverse=True)
+        self.recent = recent[:recent_limit]
+        self.funding_in_lamports += other.funding_in_lamports
+        self.funding_out_lamports += other.funding_out_lamports
+        _add_counts(self.funding_in_by, other.funding_in_by)
+        _add_counts(self.funding_out_by, other.funding_out_by)
+        if newer:
+            self.entries = [*other.entries, *self.entries]
+        else:
+            self.entries = [*self.entries, *other.entries]
+
+
+def _activity_entry(sig_info: Dict[str, Any]) -> Dict[str, Any]:
+    return {"sig": sig_info.get("signature"), "bt": sig_info.get("blockTime")}
+
+
+def activity_from_signatures(
+    signatures: Sequence[Dict[str, Any]],
+    *,
+    swap_program_ids: Dict[str, str],
+    tx_fetch_limit: int,
+    batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+    tx_store: Optional[TransactionStore] = None,
+    tx_encoding: str = "base64",
+    alt_cache: Optional[AddressLookupTableCache] = None,
+) -> WalletActivity:
+    """
+    Standard-RPC activity: swap detection over getTransaction results.
+    """
+    matches = swap_matches_by_signature(
+        signatures,
+        swap_program_ids=swap_program_ids,
+        tx_fetch_limit=tx_fetch_limit,
+        helius_api_key=None,
+        batch_size=batch_size,
+        tx_store=tx_store,
+        tx_encoding=tx_encoding,
+        alt_cache=alt_cache,
+    )
+    entries: List[Dict[str, Any]] = []
+    for sig_info, matched in zip(signatures, matches):
+        entry = _activity_entry(sig_info)
+        entry.update(n=1, t=entry["bt"])
+        if matched:
+            entry["sw"] = matched
+        entries.append(entry)
+    newest_signature, newest_slot = _signature_cursor(signatures)
+    activity = WalletActivity(
+        helius_used=False,
+        newest_signature=newest_signature,
+        newest_slot=newest_slot,
+        entries=entries,
+    )
+    activity.recount()
+    return activity
+
+
+def activity_from_parsed(
+    sig_infos: Sequence[Dict[str, Any]], parsed: Sequence[Dict[str, Any]], wallet: str
+) -> WalletActivity:
+    """
+    Helius activity: funding flows across all parsed transactions, swaps and
+    type/source counts across the ones the wallet signed.
+    """
+    signed_parsed = filter_wallet_signed_transactions(parsed, wallet)
+    signed = {id(tx) for tx in signed_parsed}
+    entries = [_activity_entry(sig_info) for sig_info in sig_infos]
+    by_sig = {entry["sig"]: entry for entry in entries if entry["sig"]}
+    for tx in parsed:
+        entry = by_sig.get(tx.get("signature"))
+        if entry is None:
+            continue
+        # Funding flows are computed across all parsed transactions in-window.
+        _in, _out, in_by, out_by = aggregate_native_transfers([tx], wallet)
+        if in_by:
+            entry["fi"] = in_by
+        if out_by:
+            entry["fo"] = out_by
+        if id(tx) not in signed:
+            continue
+        entry.update(
+            n=1,
+            t=tx.get("timestamp"),
+            ty=str(tx.get("type") or "UNKNOWN"),
+            src=str(tx.get("source") or "UNKNOWN"),
+        )
+        stats, swap_sources = analyze_swaps_from_parsed_transactions([tx])
+        if stats.recent_swaps:
+            entry["sw"] = swap_sources
+
+    _types, _sources, recent = summarize_parsed_transactions(signed_parsed, limit=25)
+    newest_signature, newest_slot = _signature_cursor(sig_infos)
+    activity = WalletActivity(
+        helius_used=True,
+        newest_signature=newest_signature,
+        newest_slot=newest_slot,
+        recent=recent,
+        entries=entries,
+    )
+    activity.recount()
+    return activity
+
+
+def ensure_out_dir() -> None:
+    os.makedirs(OUT_DIR, exist_ok=True)
+
+
+def _profile_cached_at(profile: Dict[str, Any]) -> float:
     try:
-        with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
-            json.dump(manifest, f, indent=2, sort_keys=True)
-    except OSError:
-        return
+        return float(profile.get("cached_at") or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class ProfileStore:
+    """
+    Wallet profile cache and checkpoint manifest in one SQLite file (WAL).
+
+    - profiles: wallet -> (cached_at, zlib-compressed profile JSON), indexed on
+      cached_at so the TTL check for a whole run is a single query.
+    - manifest: wallet -> processed_at for every wallet a run completed
+      (fresh from cache or newly profiled); failed wallets are left out.
+    - activity: wallet -> WalletActivity behind its profile, the base for
+      incremental refreshes.
+
+    Writes accumulate in one open transaction and become durable on
+    checkpoint(), so checkpointing costs a commit instead of rewriting a file.
+    Only used from the main thread.
+    """
+
+    def __init__(self, path: str = PROFILE_STORE_PATH) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS profiles (
+                wallet TEXT PRIMARY KEY, cached_at REAL NOT NULL, data BLOB NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS profiles_cached_at ON profiles (cached_at);
+            CREATE TABLE IF NOT EXISTS manifest (
+                wallet TEXT PRIMARY KEY, processed_at INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS activity (
+                wallet TEXT PRIMARY KEY, helius_used INTEGER NOT NULL, data BLOB NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _encode(profile: Dict[str, Any]) -> bytes:
+        return zlib.compress(json.dumps(profile, separators=(",", ":")).encode("utf-8"))
+
+    @staticmethod
+    def _decode(data: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            profile = json.loads(zlib.decompress(data))
+        except (zlib.error, json.JSONDecodeError):
+            return None
+        return profile if isinstance(profile, dict) else None
+
+    def get(self, wallet: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT data FROM profiles WHERE wallet = ?", (wallet,)
+        ).fetchone()
+        return self._decode(row[0]) if row else None
+
+    def _select_wanted(
+        self, wallets: Iterable[str], sql: str, params: Sequence[Any]
+    ) -> List[Tuple[Any, ...]]:
+        """
+        Run `sql` (which joins the temp table `wanted`) for a set of wallets in
+        one query, without hitting SQLite's bound-parameter limit.
+        """
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (wallet TEXT PRIMARY KEY)")
+        self._conn.execute("DELETE FROM wanted")
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO wanted (wallet) VALUES (?)", ((w,) for w in wallets)
+        )
+        rows = self._conn.execute(sql, params).fetchall()
+        self._conn.execute("DELETE FROM wanted")
+        return rows
+
+    def fresh_profiles(
+        self, wallets: Iterable[str], *, ttl_hours: float
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Cached profiles of `wallets` whose cached_at is within ttl_hours of now.
+        """
+        wanted = set(wallets)
+        # Stale rows come back without their blob, only to be counted.
+        rows = self._select_wanted(
+            wanted,
+            "SELECT p.wallet, CASE WHEN p.cached_at > 0 AND p.cached_at >= ? THEN p.data END "
+            "FROM wanted w JOIN profiles p ON p.wallet = w.wallet",
+            (time.time() - ttl_hours * 3600.0,),
+        )
+        fresh: Dict[str, Dict[str, Any]] = {}
+        for wallet, data in rows:
+            profile = self._decode(data) if data is not None else None
+            if profile is not None:
+                fresh[wallet] = profile
+        metrics = run_metrics.registry()
+        metrics.cache_event("profile_store", "hit", len(fresh))
+        metrics.cache_event("profile_store", "stale", len(rows) - len(fresh))
+        metrics.cache_event("profile_store", "miss", len(wanted) - len(rows))
+        return fresh
+
+    def activities(
+        self, wallets: Iterable[str], *, helius_used: bool
+    ) -> Dict[str, WalletActivity]:
+        """
+        Stored activity summaries for `wallets` built from the same source
+        (Helius or standard RPC) as the current run.
+        """
+        rows = self._select_wanted(
+            wallets,
+            "SELECT a.wallet, a.data FROM wanted w JOIN activity a ON a.wallet = w.wallet "
+            "WHERE a.helius_used = ?",
+            (int(helius_used),),
+        )
+        found: Dict[str, WalletActivity] = {}
+        for wallet, data in rows:
+            decoded = self._decode(data)
+            if decoded is not None:
+                found[wallet] = WalletActivity.from_dict(decoded)
+        return found
+
+    def put(self, profile: Dict[str, Any], activity: Optional[WalletActivity] = None) -> None:
+        wallet = str(profile.get("wallet") or "")
+        if not wallet:
+            return
+        cached_at = _profile_cached_at(profile)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO profiles (wallet, cached_at, data) VALUES (?, ?, ?)",
+            (wallet, cached_at, self._encode(profile)),
+        )
+        if activity is not None:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO activity (wallet, helius_used, data) VALUES (?, ?, ?)",
+                (wallet, int(activity.helius_used), self._encode(activity.to_dict())),
+            )
+        self.mark_processed(wallet, cached_at or time.time())
+
+    def iter_profiles(self) -> Iterator[Dict[str, Any]]:
+        """
+        Every stored profile, oldest cached_at first, streamed off a cursor.
+        """
+        for (data,) in self._conn.execute("SELECT data FROM profiles ORDER BY cached_at"):
+            profile = self._decode(data)
+            if profile is not None:
+                yield profile
+
+    def import_jsonl(self, path: str) -> int:
+        """
+        Replay an append-only JSONL profile log, keeping per wallet whichever
+        of the stored and logged profiles has the newest cached_at (a later
+        line wins a tie). Returns the number of lines read.
+        """
+        if not os.path.exists(path):
+            return 0
+        sql = (
+            "INSERT INTO profiles (wallet, cached_at, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (wallet) DO UPDATE SET cached_at = excluded.cached_at, "
+            "data = excluded.data WHERE excluded.cached_at >= profiles.cached_at"
+        )
+        lines = 0
+        batch: List[Tuple[str, float, bytes]] = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    profile = json.loads(line)
+                except json.JSONDecodeError:
+                    # Most likely a line cut short by an interrupted run.
+                    continue
+                if not isinstance(profile, dict) or not profile.get("wallet"):
+                    continue
+                lines += 1
+                batch.append(
+                    (str(profile["wallet"]), _profile_cached_at(profile), self._encode(profile))
+                )
+                if len(batch) >= 1000:
+                    self._conn.executemany(sql, batch)
+                    batch = []
+        self._conn.executemany(sql, batch)
+        self._conn.commit()
+        return lines
+
+    def mark_processed(self, wallet: str, processed_at: float) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO manifest (wallet, processed_at) VALUES (?, ?)",
+            (wallet, int(processed_at)),
+        )
+
+    def checkpoint(self) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('updated_at', ?)",
+            (str(int(time.time())),),
+        )
+        self._conn.commit()
+
+    def migrate_legacy(
+        self,
+        cache_dir: str = LEGACY_CACHE_DIR,
+        manifest_path: str = LEGACY_MANIFEST_PATH,
+    ) -> Tuple[int, int]:
+        """
+        One-shot import of the old per-wallet JSON cache and JSON manifest.
+
+        Runs once per store (recorded in meta); the legacy files are left in
+        place. Returns (profiles imported, manifest entries imported).
+        """
+        if self._conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_migrated'").fetchone():
+            return 0, 0
+
+        profiles = 0
+        if os.path.isdir(cache_dir):
+            batch: List[Tuple[str, float, bytes]] = []
+            for name in sorted(os.listdir(cache_dir)):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(cache_dir, name), "r", encoding="utf-8") as f:
+                        profile = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    continue
+                if not isinstance(profile, dict) or not profile.get("wallet"):
+                    continue
+                batch.append(
+                    (str(profile["wallet"]), _profile_cached_at(profile), self._encode(profile))
+                )
+                if len(batch) >= 1000:
+                    profiles += self._import_profiles(batch)
+                    batch = []
+            profiles += self._import_profiles(batch)
+
+        entries = 0
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            manifest = None
+        processed = manifest.get("processed_wallets") if isinstance(manifest, dict) else None
+        if isinstance(processed, dict):
+            rows = []
+            for wallet, processed_at in processed.items():
+                try:
+                    rows.append((str(wallet), int(processed_at)))
+                except (TypeError, ValueError):
+                    continue
+            # Keep anything the store already recorded.
+            entries = self._conn.executemany(
+                "INSERT OR IGNORE INTO manifest (wallet, processed_at) VALUES (?, ?)", rows
+            ).rowcount
+
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_migrated', ?)",
+            (str(int(time.time())),),
+        )
+        self._conn.commit()
+        return profiles, max(0, entries)
+
+    def _import_profiles(self, rows: List[Tuple[str, float, bytes]]) -> int:
+        if not rows:
+            return 0
+        return max(
+            0,
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO profiles (wallet, cached_at, data) VALUES (?, ?, ?)",
+                rows,
+            ).rowcount,
+        )
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
 
 
 def append_jsonl(profile: Dict[str, Any]) -> None:
@@ -803,66 +2392,223 @@ def append_jsonl(profile: Dict[str, Any]) -> None:
         return
 
 
-def write_profiles_json(profiles: List[Dict[str, Any]]) -> str:
-    ensure_out_dir()
-    path = os.path.join(OUT_DIR, "wallet_profiles.json")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(profiles, f, indent=2, sort_keys=True)
-    return path
+PROFILE_CSV_FIELDS = [
+    "wallet",
+    "mode",
+    "helius_used",
+    "delegated_lamports",
+    "delegated_sol",
+    "stake_accounts",
+    "balance_lamports",
+    "balance_sol",
+    "token_accounts_nonzero",
+    "recent_signatures",
+    "recent_swaps_detected",
+    "lookback_days",
+    "swaps_per_day",
+    "last_swap_time",
+    "last_swap_time_iso",
+    "swap_programs_used",
+    "top_token_mints",
+    "tx_type_counts_json",
+    "tx_source_counts_json",
+    "recent_tx_summaries_json",
+    "funding_in_lamports",
+    "funding_in_sol",
+    "funding_out_lamports",
+    "funding_out_sol",
+    "funding_sources_top_json",
+    "funding_destinations_top_json",
+]
+
+
+def _profile_csv_row(p: Dict[str, Any]) -> Dict[str, Any]:
+    row = {k: p.get(k) for k in PROFILE_CSV_FIELDS}
+    # Serialize nested structures for CSV consumption.
+    row["tx_type_counts_json"] = json.dumps(p.get("tx_type_counts", {}), sort_keys=True)
+    row["tx_source_counts_json"] = json.dumps(p.get("tx_source_counts", {}), sort_keys=True)
+    row["recent_tx_summaries_json"] = json.dumps(
+        p.get("recent_tx_summaries", []), sort_keys=True
+    )
+    row["funding_sources_top_json"] = json.dumps(
+        p.get("funding_sources_top", []), sort_keys=True
+    )
+    row["funding_destinations_top_json"] = json.dumps(
+        p.get("funding_destinations_top", []), sort_keys=True
+    )
+    return row
+
+
+TOKEN_CONCENTRATION_FIELDS = [
+    "mint",
+    "symbol",
+    "token_program",
+    "decimals",
+    "holders",
+    "total_ui",
+    "top_holder",
+    "top_holder_ui",
+    "top_holder_share",
+    "hhi",
+    "supply_ui",
+    "share_of_supply",
+]
+
+
+class TokenConcentration:
+    """
+    Per-mint holder statistics over a set of profiles, built from their
+    "tokens" lists as they stream past: holder count, total and top holder,
+    and the Herfindahl index of the holders' shares. Memory is O(mints).
+    """
 
+    def __init__(self) -> None:
+        # mint -> [holders, total, sum of squares, top holder, top amount]
+        self._mints: Dict[str, List[Any]] = {}
+
+    def add(self, profile: Dict[str, Any]) -> None:
+        per_mint: Dict[str, float] = {}
+        for h in profile.get("tokens") or []:
+            mint = h.get("mint")
+            if mint and h.get("amount_ui"):
+                per_mint[mint] = per_mint.get(mint, 0.0) + float(h["amount_ui"])
+        wallet = profile.get("wallet")
+        for mint, amount in per_mint.items():
+            stats = self._mints.setdefault(mint, [0, 0.0, 0.0, None, 0.0])
+            stats[0] += 1
+            stats[1] += amount
+            stats[2] += amount * amount
+            if amount > stats[4]:
+                stats[3], stats[4] = wallet, amount
+
+    def mints(self) -> List[str]:
+        return list(self._mints)
+
+    def rows(self, mint_info: Dict[str, MintInfo]) -> List[Dict[str, Any]]:
+        """
+        One row per mint, most held first; metadata columns are blank for
+        mints missing from mint_info.
+        """
+        rows: List[Dict[str, Any]] = []
+        for mint, (holders, total, sum_sq, top_holder, top_amount) in self._mints.items():
+            info = mint_info.get(mint)
+            supply_ui = info.supply / 10**info.decimals if info else None
+            rows.append(
+                {
+                    "mint": mint,
+                    "symbol": info.symbol if info else None,
+                    "token_program": info.program_id if info else None,
+                    "decimals": info.decimals if info else None,
+                    "holders": holders,
+                    "total_ui": total,
+                    "top_holder": top_holder,
+                    "top_holder_ui": top_amount,
+                    "top_holder_share": top_amount / total if total else None,
+                    "hhi": sum_sq / (total * total) if total else None,
+                    "supply_ui": supply_ui,
+                    # Scaled-UI balances aren't in the supply's units.
+                    "share_of_supply": (
+                        total / supply_ui if supply_ui and not info.ui_scaled else None
+                    ),
+                }
+            )
+        rows.sort(key=lambda r: (r["holders"], r["total_ui"]), reverse=True)
+        return rows
 
-def write_profiles_csv(profiles: List[Dict[str, Any]]) -> str:
-    ensure_out_dir()
-    path = os.path.join(OUT_DIR, "wallet_profiles.csv")
-    fieldnames = [
-        "wallet",
-        "mode",
-        "helius_used",
-        "delegated_lamports",
-        "delegated_sol",
-        "stake_accounts",
-        "balance_lamports",
-        "balance_sol",
-        "token_accounts_nonzero",
-        "recent_signatures",
-        "recent_swaps_detected",
-        "lookback_days",
-        "swaps_per_day",
-        "last_swap_time",
-        "last_swap_time_iso",
-        "swap_programs_used",
-        "top_token_mints",
-        "tx_type_counts_json",
-        "tx_source_counts_json",
-        "recent_tx_summaries_json",
-        "funding_in_lamports",
-        "funding_in_sol",
-        "funding_out_lamports",
-        "funding_out_sol",
-        "funding_sources_top_json",
-        "funding_destinations_top_json",
-    ]
-    with open(path, "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+
+def write_token_concentration(
+    concentration: TokenConcentration,
+    mint_cache: MintInfoCache,
+    *,
+    path: str = TOKEN_CONCENTRATION_PATH,
+) -> int:
+    """
+    Write the cross-wallet concentration report, resolving every mint once
+    through the mint cache (unknown or stale mints in getMultipleAccounts
+    batches). Returns the number of mints written.
+    """
+    mints = concentration.mints()
+    mint_info = mint_cache.resolve(dict.fromkeys(mints), fresh=True) if mints else {}
+    rows = concentration.rows(mint_info)
+    with open(path + ".tmp", "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=TOKEN_CONCENTRATION_FIELDS)
         writer.writeheader()
-        for p in profiles:
-            row = {k: p.get(k) for k in fieldnames}
-            # Serialize nested structures for CSV consumption.
-            row["tx_type_counts_json"] = json.dumps(p.get("tx_type_counts", {}), sort_keys=True)
-            row["tx_source_counts_json"] = json.dumps(
-                p.get("tx_source_counts", {}), sort_keys=True
-            )
-            row["recent_tx_summaries_json"] = json.dumps(
-                p.get("recent_tx_summaries", []), sort_keys=True
-            )
-            row["funding_sources_top_json"] = json.dumps(
-                p.get("funding_sources_top", []), sort_keys=True
-            )
-            row["funding_destinations_top_json"] = json.dumps(
-                p.get("funding_destinations_top", []), sort_keys=True
-            )
-            writer.writerow(row)
-    return path
+        writer.writerows(rows)
+    os.replace(path + ".tmp", path)
+    return len(rows)
+
+
+class ProfileOutputWriter:
+    """
+    Streams profiles into wallet_profiles.json and wallet_profiles.csv as they
+    are produced, so nothing is held in memory until the end of a run.
+
+    Both files are written under a .tmp name and renamed into place on a clean
+    exit (an exception discards them, leaving the previous outputs intact).
+    The JSON is byte-identical to json.dump(profiles, indent=2, sort_keys=True).
+    Token holdings are also folded into `tokens` for write_token_concentration.
+    """
+
+    def __init__(self, out_dir: str = OUT_DIR) -> None:
+        ensure_out_dir()
+        self.json_path = os.path.join(out_dir, "wallet_profiles.json")
+        self.csv_path = os.path.join(out_dir, "wallet_profiles.csv")
+        self.count = 0
+        self.tokens = TokenConcentration()
+        self._json = open(self.json_path + ".tmp", "w", encoding="utf-8")
+        self._csv = open(self.csv_path + ".tmp", "w", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._csv, fieldnames=PROFILE_CSV_FIELDS)
+        self._writer.writeheader()
+        self._json.write("[")
+
+    def write(self, profile: Dict[str, Any]) -> None:
+        item = json.dumps(profile, indent=2, sort_keys=True)
+        self._json.write("\n" if self.count == 0 else ",\n")
+        self._json.write("\n".join("  " + line for line in item.split("\n")))
+        self._writer.writerow(_profile_csv_row(profile))
+        self.tokens.add(profile)
+        self.count += 1
+
+    def close(self) -> None:
+        self._json.write("\n]" if self.count else "]")
+        self._json.close()
+        self._csv.close()
+        os.replace(self.json_path + ".tmp", self.json_path)
+        os.replace(self.csv_path + ".tmp", self.csv_path)
+
+    def discard(self) -> None:
+        for f, path in ((self._json, self.json_path), (self._csv, self.csv_path)):
+            f.close()
+            try:
+                os.remove(path + ".tmp")
+            except OSError:
+                pass
+
+    def __enter__(self) -> "ProfileOutputWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def materialize_outputs(
+    profile_store: "ProfileStore", *, jsonl_path: str = JSONL_PATH
+) -> Tuple[int, ProfileOutputWriter]:
+    """
+    Rebuild wallet_profiles.json/csv from the JSONL log and the profile store.
+
+    The log is replayed into the store first (newest cached_at per wallet wins,
+    ties going to the later line), then every stored profile is streamed out
+    in cached_at order. Memory stays flat in the number of wallets.
+    """
+    replayed = profile_store.import_jsonl(jsonl_path)
+    with ProfileOutputWriter() as out:
+        for profile in profile_store.iter_profiles():
+            out.write(profile)
+    return replayed, out
 
 
 def summarize_swap_programs(matches: Sequence[str], labels: Dict[str, str]) -> str:
@@ -877,11 +2623,12 @@ def summarize_swap_programs(matches: Sequence[str], labels: Dict[str, str]) -> s
 
 
 def summarize_swap_sources(sources: Sequence[str]) -> str:
-    if not sources:
+    return summarize_swap_source_counts(_count_items(sources))
+
+
+def summarize_swap_source_counts(counts: Dict[str, int]) -> str:
+    if not counts:
         return ""
-    counts: Dict[str, int] = {}
-    for s in sources:
-        counts[s] = counts.get(s, 0) + 1
     top = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:8]
     return " | ".join(f"{src}:{cnt}" for src, cnt in top)
 
@@ -900,85 +2647,153 @@ def collect_wallet_profile(
     helius_lookback_days: int,
     helius_token_accounts: str,
     helius_strict_last_n: bool,
-) -> Dict[str, Any]:
-    balance_lamports = rpc_get_balance(wallet, helius_api_key=helius_api_key)
-    balance_sol = lamports_to_sol(balance_lamports)
+    rpc_batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+    tx_store: Optional[TransactionStore] = None,
+    base_activity: Optional[WalletActivity] = None,
+    max_signatures: int = 0,
+    history_days: float = 0.0,
+    helius_parse_concurrency: int = HELIUS_PARSE_CONCURRENCY,
+    parse_scheduler: Optional[HeliusParseScheduler] = None,
+    tx_encoding: str = "base64",
+    alt_cache: Optional[AddressLookupTableCache] = None,
+    token_encoding: str = "base64",
+    mint_cache: Optional[MintInfoCache] = None,
+    balances: Optional[Dict[str, int]] = None,
+) -> Tuple[Dict[str, Any], WalletActivity]:
+    """
+    Profile a wallet and return it with the activity summary it was built from.
+
+    Signatures are read page by page (signatures_limit per page on standard
+    RPC, helius_tx_limit on Helius, up to 1000 each) back to max_signatures and/or
+    history_days; with neither, a single page is read. Each page is parsed
+    and folded into the activity summary before the next is fetched.
+
+    With base_activity (from the wallet's previous profile) only signatures
+    newer than its cursor are read, merged in, and the result trimmed back to
+    the window a full refresh would read; an idle wallet costs a single
+    batched request. If a bound stops the delta before it reaches the
+    cursor there may be a gap, so the history is rebuilt from scratch instead.
+
+    With token_encoding="base64" token accounts come back as mint+amount
+    slices and are decoded by decode_token_holdings; holdings are the same.
+    A wallet found in balances (from rpc_get_balances) skips getBalance.
+    """
+    page_size = min(helius_tx_limit if helius_api_key else signatures_limit, 1000)
+    if base_activity is not None:
+        cursor = base_activity.newest_slot if helius_api_key else base_activity.newest_signature
+        # Summaries stored before entries were kept cannot be trimmed.
+        if (
+            base_activity.helius_used != bool(helius_api_key)
+            or cursor is None
+            or not base_activity.entries
+        ):
+            base_activity = None
+    max_listed = max_signatures or (0 if history_days > 0 else page_size)
+
+    def _query(after: Optional[WalletActivity]) -> SignatureQuery:
+        return SignatureQuery(
+            wallet=wallet,
+            page_size=page_size,
+            helius_api_key=helius_api_key,
+            helius_lookback_days=helius_lookback_days,
+            helius_token_accounts=helius_token_accounts,
+            helius_strict_last_n=helius_strict_last_n,
+            until=after.newest_signature if after and not helius_api_key else None,
+            after_slot=after.newest_slot if after and helius_api_key else None,
+        )
 
-    spl_accounts = rpc_get_token_accounts_by_owner(
-        wallet, TOKEN_PROGRAM_ID, helius_api_key=helius_api_key
-    )
-    t22_accounts = rpc_get_token_accounts_by_owner(
-        wallet, TOKEN_2022_PROGRAM_ID, helius_api_key=helius_api_key
-    )
-    holdings = extract_token_holdings([*spl_accounts, *t22_accounts])
+    def _since_ts() -> int:
+        return int(time.time() - history_days * 86400) if history_days > 0 else 0
 
-    matched_programs: List[str] = []
-    swap_stats: SwapStats
-    tx_type_counts: Dict[str, int] = {}
-    tx_source_counts: Dict[str, int] = {}
-    recent_tx_summaries: List[Dict[str, Any]] = []
-    funding_in_lamports = 0
-    funding_out_lamports = 0
-    funding_sources_top: List[Dict[str, Any]] = []
-    funding_destinations_top: List[Dict[str, Any]] = []
-
-    helius_used = bool(helius_api_key)
-    if helius_api_key:
-        # 1) Get recent signatures with token-account awareness.
-        sig_infos = helius_get_signatures_for_address(
+    def _pager(query: SignatureQuery, **kwargs: Any) -> SignaturePager:
+        return SignaturePager(query, max_signatures=max_listed, since_ts=_since_ts(), **kwargs)
+
+    # Both token programs, the first signature page and (unless the run's
+    # pre-pass already has it) the balance are independent reads, so they go
+    # out as a single JSON-RPC batch.
+    first_query = _query(base_activity)
+    url = _rpc_url(helius_api_key)
+    balance_lamports = balances.get(wallet) if balances else None
+    calls = [
+        _token_accounts_call(wallet, TOKEN_PROGRAM_ID, encoding=token_encoding),
+        _token_accounts_call(wallet, TOKEN_2022_PROGRAM_ID, encoding=token_encoding),
+        first_query.page_call(None),
+    ]
+    if balance_lamports is None:
+        calls.append(_balance_call(wallet))
+    batch = _post_json_rpc_batch_url(url, calls, max_batch_size=rpc_batch_size)
+
+    if balance_lamports is None:
+        balance_lamports = _balance_value(batch[3].unwrap())
+    balance_sol = lamports_to_sol(balance_lamports)
+
+    spl_accounts = _token_accounts_value(batch[0].unwrap())
+    t22_accounts = _token_accounts_value(batch[1].unwrap())
+    if token_encoding == "base64":
+        holdings = decode_token_holdings(
             wallet,
-            helius_api_key=helius_api_key,
-            limit=min(helius_tx_limit, 100),
-            lookback_days=helius_lookback_days,
-            token_accounts=helius_token_accounts,
-            strict_last_n=helius_strict_last_n,
-        )
-        signatures = [s.get("signature") for s in sig_infos if s.get("signature")]
-        # 2) Parse the most recent transactions into human-readable form.
-        parsed = helius_parse_transactions(signatures[:100], helius_api_key=helius_api_key)
-        # Funding flows are computed across all parsed transactions in-window.
-        (
-            funding_in_lamports,
-            funding_out_lamports,
-            in_by,
-            out_by,
-        ) = aggregate_native_transfers(parsed, wallet)
-        funding_sources_top = top_counterparties(in_by, n=12)
-        funding_destinations_top = top_counterparties(out_by, n=12)
-
-        signed_parsed = filter_wallet_signed_transactions(parsed, wallet)
-        swap_stats, swap_sources = analyze_swaps_from_parsed_transactions(signed_parsed)
-        matched_programs = swap_sources
-        tx_type_counts, tx_source_counts, recent_tx_summaries = summarize_parsed_transactions(
-            signed_parsed, limit=25
+            [(TOKEN_PROGRAM_ID, spl_accounts), (TOKEN_2022_PROGRAM_ID, t22_accounts)],
+            url=url,
+            mint_cache=mint_cache or MintInfoCache(url, path=None, batch_size=rpc_batch_size),
+            batch_size=rpc_batch_size,
         )
     else:
-        signatures = rpc_get_signatures(
-            wallet, limit=signatures_limit, helius_api_key=helius_api_key
-        )
-        swap_stats = analyze_swaps(
-            signatures,
-            swap_program_ids=swap_program_ids,
-            tx_fetch_limit=tx_fetch_limit,
-            helius_api_key=helius_api_key,
-        )
-        # Collect which swap programs were actually matched by scanning the same subset.
-        for sig_info in signatures[:tx_fetch_limit]:
-            sig = sig_info.get("signature")
-            if not sig:
-                continue
-            tx = rpc_get_transaction(sig, helius_api_key=helius_api_key)
-            if not tx:
-                continue
-            program_ids = extract_program_ids_from_tx(tx)
-            matched_programs.extend([pid for pid in program_ids if pid in swap_program_ids])
+        holdings = extract_token_holdings([*spl_accounts, *t22_accounts])
+
+    def _summarize(pager: SignaturePager) -> WalletActivity:
+        activity = WalletActivity(helius_used=bool(helius_api_key))
+        tx_budget = tx_fetch_limit
+        for page in pager:
+            if helius_api_key:
+                signatures = [s.get("signature") for s in page if s.get("signature")]
+                # Parse the page's transactions into human-readable form.
+                if parse_scheduler is not None:
+                    parsed = parse_scheduler.parse(signatures)
+                else:
+                    parsed = helius_parse_transactions(
+                        signatures,
+                        helius_api_key=helius_api_key,
+                        concurrency=helius_parse_concurrency,
+                    )
+                page_activity = activity_from_parsed(page, parsed, wallet)
+            else:
+                page_activity = activity_from_signatures(
+                    page,
+                    swap_program_ids=swap_program_ids,
+                    tx_fetch_limit=tx_budget,
+                    batch_size=rpc_batch_size,
+                    tx_store=tx_store,
+                    tx_encoding=tx_encoding,
+                    alt_cache=alt_cache,
+                )
+                tx_budget = max(0, tx_budget - len(page))
+            activity.absorb(page_activity, newer=False)
+        return activity
+
+    pager = _pager(first_query, first_result=batch[2].unwrap())
+    activity = _summarize(pager)
+    if base_activity is not None:
+        if pager.truncated:
+            base_activity = None
+            activity = _summarize(_pager(_query(None)))
+        else:
+            since_ts = _since_ts()
+            if helius_api_key and helius_lookback_days > 0 and not helius_strict_last_n:
+                since_ts = max(since_ts, int(time.time()) - helius_lookback_days * 86400)
+            activity = base_activity.merged_with_newer(
+                activity,
+                max_signatures=max_listed,
+                since_ts=since_ts,
+                tx_fetch_limit=None if helius_api_key else tx_fetch_limit,
+            )
 
+    swap_stats = activity.swap_stats()
     top_token_mints = ",".join(h["mint"] for h in holdings[:6] if h.get("mint"))
 
     profile: Dict[str, Any] = {
         "wallet": wallet,
         "mode": mode,
-        "helius_used": helius_used,
+        "helius_used": bool(helius_api_key),
         "cached_at": time.time(),
         "delegated_lamports": delegated_lamports,
         "delegated_sol": lamports_to_sol(delegated_lamports),
@@ -994,38 +2809,92 @@ def collect_wallet_profile(
         "last_swap_time": swap_stats.last_swap_time,
         "last_swap_time_iso": _iso(swap_stats.last_swap_time),
         "swap_programs_used": (
-            summarize_swap_sources(matched_programs)
+            summarize_swap_source_counts(activity.swap_matches)
             if helius_api_key
-            else summarize_swap_programs(matched_programs, swap_program_ids)
+            else summarize_swap_programs(list(activity.swap_matches), swap_program_ids)
         ),
         "top_token_mints": top_token_mints,
-        "tx_type_counts": tx_type_counts,
-        "tx_source_counts": tx_source_counts,
-        "recent_tx_summaries": recent_tx_summaries,
-        "funding_in_lamports": funding_in_lamports,
-        "funding_in_sol": lamports_to_sol(funding_in_lamports),
-        "funding_out_lamports": funding_out_lamports,
-        "funding_out_sol": lamports_to_sol(funding_out_lamports),
-        "funding_sources_top": funding_sources_top,
-        "funding_destinations_top": funding_destinations_top,
+        "tx_type_counts": dict(activity.type_counts),
+        "tx_source_counts": dict(activity.source_counts),
+        "recent_tx_summaries": list(activity.recent),
+        "funding_in_lamports": activity.funding_in_lamports,
+        "funding_in_sol": lamports_to_sol(activity.funding_in_lamports),
+        "funding_out_lamports": activity.funding_out_lamports,
+        "funding_out_sol": lamports_to_sol(activity.funding_out_lamports),
+        "funding_sources_top": top_counterparties(activity.funding_in_by, n=12),
+        "funding_destinations_top": top_counterparties(activity.funding_out_by, n=12),
     }
-    return profile
+    return profile, activity
 
 
-def build_swap_program_map() -> Dict[str, str]:
+def build_swap_program_map(*, jupiter_ttl_hours: float = JUPITER_MAP_TTL_HOURS) -> Dict[str, str]:
     """
     Build a swap program ID -> label map.
 
     Includes:
     - Orca Whirlpools (static)
-    - Jupiter's program map (dynamic, when reachable)
+    - Jupiter's program map (dynamic, cached on disk; see load_jupiter_program_ids)
     """
     mapping: Dict[str, str] = {ORCA_WHIRLPOOLS_PROGRAM_ID: "Orca Whirlpools"}
-    jup_map = load_jupiter_program_ids()
+    jup_map = load_jupiter_program_ids(ttl_hours=jupiter_ttl_hours)
     mapping.update(jup_map)
     return mapping
 
 
+WalletJob = Tuple[int, str, Dict[str, int]]
+ProfileResult = Tuple[Dict[str, Any], WalletActivity]
+
+
+def iter_profile_results(
+    jobs: Iterable[WalletJob],
+    profile_fn: Callable[[WalletJob], ProfileResult],
+    *,
+    concurrency: int,
+) -> Iterator[Tuple[WalletJob, Optional[ProfileResult], Optional[RuntimeError]]]:
+    """
+    Run profile_fn over jobs and yield (job, result, error) as each finishes.
+
+    With concurrency <= 1 jobs run inline and in order. Otherwise a bounded
+    thread pool keeps at most `concurrency` wallets in flight and results are
+    yielded in completion order, so the caller can persist them from a single
+    thread. Closing the generator early (e.g. the caller stops on an
+    unrecoverable error) cancels queued wallets and waits for in-flight ones,
+    so shared stores can be closed safely afterwards.
+    """
+    if concurrency <= 1:
+        for job in jobs:
+            try:
+                yield job, profile_fn(job), None
+            except RuntimeError as e:
+                yield job, None, e
+        return
+
+    pending = iter(jobs)
+    in_flight: Dict[Future, WalletJob] = {}
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="profile")
+
+    def _fill() -> None:
+        while len(in_flight) < concurrency:
+            job = next(pending, None)
+            if job is None:
+                return
+            in_flight[executor.submit(profile_fn, job)] = job
+
+    try:
+        _fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                job = in_flight.pop(fut)
+                try:
+                    yield job, fut.result(), None
+                except RuntimeError as e:
+                    yield job, None, e
+            _fill()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
 def parse_args(argv: Sequence[str]) -> argparse.Namespace:
     p = argparse.ArgumentParser(description=__doc__)
     p.add_argument(
@@ -1034,6 +2903,12 @@ def parse_args(argv: Sequence[str]) -> argparse.Namespace:
         default="staker",
         help="Which authorities to aggregate from stake data (default: staker).",
     )
+    p.add_argument(
+        "--ingest-workers",
+        type=int,
+        default=0,
+        help="Processes used to aggregate stake CSVs (default: 0 = one per CPU).",
+    )
     p.add_argument(
         "--top-n",
         type=int,
@@ -1051,11 +2926,29 @@ def parse_args(argv: Sequence[str]) -> argparse.Namespace:
         default=24.0,
         help="Reuse cached wallet profiles newer than this TTL in hours (default: 24).",
     )
+    p.add_argument(
+        "--jupiter-map-ttl-hours",
+        type=float,
+        default=JUPITER_MAP_TTL_HOURS,
+        help=(
+            "Use the cached Jupiter program-ID map without revalidating it for this many "
+            "hours (default: 24; 0 revalidates on every run that needs it)."
+        ),
+    )
     p.add_argument(
         "--force-refresh",
         action="store_true",
         help="Ignore cache TTL and refetch all selected wallets.",
     )
+    p.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "Refresh expired profiles incrementally: fetch only signatures newer than "
+            "the last run's cursor and merge them into the stored activity summary, "
+            "which is trimmed back to the same signature/time window a full refresh reads."
+        ),
+    )
     p.add_argument(
         "--cache-only",
         action="store_true",
@@ -1064,13 +2957,24 @@ def parse_args(argv: Sequence[str]) -> argparse.Namespace:
     p.add_argument(
         "--no-materialize-output",
         action="store_true",
-        help="Skip writing wallet_profiles.json/csv (useful for large append-only runs).",
+        help=(
+            "Skip writing wallet_profiles.json/csv (useful for large append-only runs; "
+            "rebuild them later with --materialize)."
+        ),
+    )
+    p.add_argument(
+        "--materialize",
+        action="store_true",
+        help=(
+            "Only rebuild wallet_profiles.json/csv from wallet_profiles.jsonl and the "
+            "profile store (last write per wallet wins), in constant memory, then exit."
+        ),
     )
     p.add_argument(
         "--manifest-every",
         type=int,
         default=25,
-        help="Write the checkpoint manifest every N wallets (default: 25).",
+        help="Commit the profile store (cache + manifest) every N wallets (default: 25).",
     )
     p.add_argument(
         "--signatures-limit",
@@ -1078,11 +2982,78 @@ def parse_args(argv: Sequence[str]) -> argparse.Namespace:
         default=200,
         help="How many recent signatures to fetch per wallet.",
     )
+    p.add_argument(
+        "--max-signatures",
+        type=int,
+        default=0,
+        help=(
+            "Page further back through each wallet's history, up to this many signatures "
+            "(default: 0 = a single page of --signatures-limit / --helius-tx-limit)."
+        ),
+    )
+    p.add_argument(
+        "--history-days",
+        type=float,
+        default=0.0,
+        help=(
+            "Page back through signatures until this many days ago (default: 0 = no time "
+            "bound). Without --max-signatures the count is then unbounded."
+        ),
+    )
     p.add_argument(
         "--tx-fetch-limit",
         type=int,
         default=80,
-        help="How many recent transactions to fetch per wallet for swap detection.",
+        help=(
+            "How many recent transactions to fetch per wallet for swap detection "
+            "(a budget across all signature pages)."
+        ),
+    )
+    p.add_argument(
+        "--tx-encoding",
+        choices=("base64", "jsonParsed"),
+        default="base64",
+        help=(
+            "getTransaction encoding on standard RPC (default: base64, with account keys "
+            "decoded locally and v0 lookup tables resolved; jsonParsed has the node "
+            "render the whole transaction)."
+        ),
+    )
+    p.add_argument(
+        "--no-balance-prepass",
+        action="store_true",
+        help=(
+            "Fetch each wallet's balance with its own getBalance instead of one "
+            "getMultipleAccounts per 100 wallets before profiling."
+        ),
+    )
+    p.add_argument(
+        "--mint-cache-ttl-hours",
+        type=float,
+        default=MINT_CACHE_TTL_HOURS,
+        help=(
+            "Refetch mint supply older than this for the token concentration report "
+            f"(default: {MINT_CACHE_TTL_HOURS:g}; decimals are cached for good)."
+        ),
+    )
+    p.add_argument(
+        "--token-encoding",
+        choices=("base64", "jsonParsed"),
+        default="base64",
+        help=(
+            "getTokenAccountsByOwner encoding (default: base64, sliced to mint and amount "
+            "with decimals from the mint cache; jsonParsed has the node render "
+            "every account)."
+        ),
+    )
+    p.add_argument(
+        "--rpc-batch-size",
+        type=int,
+        default=DEFAULT_RPC_BATCH_SIZE,
+        help=(
+            "Maximum JSON-RPC calls packed into one HTTP request "
+            f"(default: {DEFAULT_RPC_BATCH_SIZE}; 1 sends plain, non-batch requests)."
+        ),
     )
     p.add_argument(
         "--helius-api-key",
@@ -1094,7 +3065,19 @@ def parse_args(argv: Sequence[str]) -> argparse.Namespace:
         "--helius-tx-limit",
         type=int,
         default=100,
-        help="Transactions to fetch per wallet via Helius (max 100 in full mode).",
+        help=(
+            "Signatures per page via Helius (max 1000); every one is parsed, in chunks "
+            f"of {HELIUS_PARSE_CHUNK_SIZE}."
+        ),
+    )
+    p.add_argument(
+        "--helius-parse-concurrency",
+        type=int,
+        default=HELIUS_PARSE_CONCURRENCY,
+        help=(
+            "parseTransactions requests in flight, shared by all wallets "
+            f"(default: {HELIUS_PARSE_CONCURRENCY})."
+        ),
     )
     p.add_argument(
         "--helius-lookback-days",
@@ -1119,8 +3102,60 @@ def parse_args(argv: Sequence[str]) -> argparse.Namespace:
     p.add_argument(
         "--sleep-ms",
         type=int,
-        default=150,
-        help="Sleep between wallet profiles to be polite to the RPC.",
+        default=0,
+        help=(
+            "Fixed sleep between wallet profiles in sequential runs (default: 0). "
+            "Usually unnecessary: each endpoint has an adaptive rate limiter that "
+            "backs off on 429s."
+        ),
+    )
+    p.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of wallets to profile in parallel (default: 1).",
+    )
+    p.add_argument(
+        "--progress-interval",
+        type=float,
+        default=5.0,
+        help="Seconds between progress/ETA lines while profiling (default: 5; 0 disables).",
+    )
+    p.add_argument(
+        "--metrics-out",
+        default=METRICS_BASE_PATH,
+        help=(
+            "Write the run report (per-method latency/bytes/retries, cache hit rates) to "
+            f"<path>.json and <path>.prom (default: {METRICS_BASE_PATH}; empty disables)."
+        ),
+    )
+    p.add_argument(
+        "--max-rps",
+        type=float,
+        default=0.0,
+        help=(
+            "Requests-per-second ceiling per RPC endpoint, shared by all workers "
+            "(default: 0 = no ceiling; the limiter still backs off on 429s)."
+        ),
+    )
+    p.add_argument(
+        "--max-retries",
+        type=int,
+        default=rpc_transport.DEFAULT_MAX_RETRIES,
+        help=(
+            "Retries per RPC request on 429/5xx/network errors, with jittered "
+            f"exponential backoff (default: {rpc_transport.DEFAULT_MAX_RETRIES})."
+        ),
+    )
+    p.add_argument(
+        "--max-outage-s",
+        type=float,
+        default=rpc_transport.BREAKER_MAX_OUTAGE_S,
+        help=(
+            "Abort the run once an endpoint has been failing for this long; until then "
+            "its circuit breaker pauses requests "
+            f"(default: {rpc_transport.BREAKER_MAX_OUTAGE_S:g})."
+        ),
     )
     return p.parse_args(argv)
 
@@ -1128,25 +3163,36 @@ def parse_args(argv: Sequence[str]) -> argparse.Namespace:
 def main(argv: Sequence[str]) -> int:
     args = parse_args(argv)
     ensure_out_dir()
-    manifest = load_manifest()
+    profile_store = ProfileStore()
+    migrated_profiles, migrated_entries = profile_store.migrate_legacy()
+    if migrated_profiles or migrated_entries:
+        print(
+            f"Migrated legacy cache into {PROFILE_STORE_PATH}: "
+            f"{migrated_profiles:,} profiles, {migrated_entries:,} manifest entries"
+        )
+    if args.materialize:
+        replayed, output = materialize_outputs(profile_store)
+        profile_store.close()
+        print(f"Replayed {replayed:,} JSONL entries into {PROFILE_STORE_PATH}")
+        print(f"Wrote {output.count:,} profiles JSON -> {output.json_path}")
+        print(f"Wrote profiles CSV  -> {output.csv_path}")
+        # Offline rebuild: mints are described from the mint store only.
+        mint_cache = MintInfoCache(None)
+        mints_written = write_token_concentration(output.tokens, mint_cache)
+        mint_cache.close()
+        print(f"Wrote token concentration ({mints_written:,} mints) -> {TOKEN_CONCENTRATION_PATH}")
+        return 0
 
     csv_paths = discover_csvs(INPUT_DIR)
-    authority_agg = aggregate_authorities(csv_paths, mode=args.mode)
+    authority_agg = aggregate_authorities(
+        csv_paths, mode=args.mode, workers=args.ingest_workers
+    )
     if args.all_wallets:
-        top = sorted(
-            authority_agg.items(),
-            key=lambda kv: (kv[1]["delegated_lamports"], kv[1]["stake_accounts"]),
-            reverse=True,
-        )
+        top = sorted(authority_agg.items(), key=_authority_rank, reverse=True)
     else:
         top = top_wallets(authority_agg, top_n=args.top_n)
 
-    swap_program_ids = build_swap_program_map()
     helius_api_key = _parse_api_key(args.helius_api_key)
-    print(
-        f"Loaded {len(swap_program_ids)} swap program IDs "
-        f"(Jupiter reachable: {'yes' if len(swap_program_ids) > 1 else 'no'})"
-    )
     print(
         "Transaction source: "
         + (
@@ -1165,27 +3211,115 @@ def main(argv: Sequence[str]) -> int:
     if args.helius_strict_last_n:
         print("Helius strict-last-n mode: blockTime lookback filter is disabled.")
 
-    profiles: List[Dict[str, Any]] = []
-    for i, (wallet, stats) in enumerate(top, start=1):
-        cached = None if args.force_refresh else load_cached_profile(wallet)
-        if cached and cache_is_fresh(cached, ttl_hours=args.cache_ttl_hours):
-            profiles.append(cached)
-            update_manifest(manifest, wallet, float(cached.get("cached_at") or time.time()))
-            if args.manifest_every > 0 and i % args.manifest_every == 0:
-                write_manifest(manifest)
-            print(f"[{i}/{len(top)}] Using cache for {wallet}")
-            continue
+    rpc_transport.configure(
+        max_rps=args.max_rps, max_retries=args.max_retries, max_outage_s=args.max_outage_s
+    )
+    concurrency = max(1, args.concurrency)
+    sleep_s = args.sleep_ms / 1000.0 if concurrency == 1 else 0.0
+    print(
+        f"Concurrency: {concurrency} wallet(s) in flight, "
+        + (
+            f"adaptive rate limit up to {args.max_rps:g} requests/sec per endpoint"
+            if args.max_rps > 0
+            else "adaptive rate limit (no ceiling)"
+        )
+    )
 
-        if args.cache_only:
-            print(f"[{i}/{len(top)}] Cache miss for {wallet} (skipping in cache-only mode)")
-            continue
+    output = None if args.no_materialize_output else ProfileOutputWriter()
+    completed = 0
+
+    def _checkpoint() -> None:
+        nonlocal completed
+        completed += 1
+        if args.manifest_every > 0 and completed % args.manifest_every == 0:
+            profile_store.checkpoint()
+
+    # Only the standard-RPC path fetches raw transactions; on Helius, parses
+    # go through one scheduler so transactions shared by wallets are parsed once.
+    tx_store = TransactionStore() if not helius_api_key and not args.cache_only else None
+    alt_cache = (
+        AddressLookupTableCache(RPC_URL, batch_size=args.rpc_batch_size)
+        if tx_store is not None
+        else None
+    )
+    # Shared by base64 holdings decoding and the concentration report.
+    mint_cache = MintInfoCache(
+        None if args.cache_only else _rpc_url(helius_api_key),
+        ttl_hours=args.mint_cache_ttl_hours,
+        batch_size=args.rpc_batch_size,
+    )
+    parse_scheduler = (
+        HeliusParseScheduler(helius_api_key, concurrency=args.helius_parse_concurrency)
+        if helius_api_key and not args.cache_only
+        else None
+    )
 
-        print(
-            f"[{i}/{len(top)}] Profiling {wallet} "
-            f"({lamports_to_sol(stats['delegated_lamports']):,.2f} SOL delegated)"
+    try:
+        fresh = (
+            {}
+            if args.force_refresh
+            else profile_store.fresh_profiles(
+                (wallet for wallet, _ in top), ttl_hours=args.cache_ttl_hours
+            )
         )
-        try:
-            profile = collect_wallet_profile(
+        jobs: List[WalletJob] = []
+        for i, (wallet, stats) in enumerate(top, start=1):
+            cached = fresh.get(wallet)
+            if cached:
+                if output is not None:
+                    output.write(cached)
+                profile_store.mark_processed(wallet, _profile_cached_at(cached) or time.time())
+                _checkpoint()
+                print(f"[{i}/{len(top)}] Using cache for {wallet}")
+                continue
+
+            if args.cache_only:
+                print(f"[{i}/{len(top)}] Cache miss for {wallet} (skipping in cache-only mode)")
+                continue
+
+            jobs.append((i, wallet, stats))
+
+        base_activities = (
+            profile_store.activities(
+                (wallet for _i, wallet, _stats in jobs), helius_used=bool(helius_api_key)
+            )
+            if args.incremental and not args.force_refresh
+            else {}
+        )
+        if args.incremental:
+            print(f"Incremental refresh: {len(base_activities):,} of {len(jobs):,} wallet(s) have a cursor")
+            run_metrics.registry().cache_event("activity_base", "hit", len(base_activities))
+            run_metrics.registry().cache_event("activity_base", "miss", len(jobs) - len(base_activities))
+
+        # Only standard-RPC swap detection matches program IDs (Helius labels
+        # swaps itself), so runs served from cache never load the map.
+        swap_program_ids: Dict[str, str] = {}
+        if jobs and not helius_api_key:
+            swap_program_ids = build_swap_program_map(jupiter_ttl_hours=args.jupiter_map_ttl_hours)
+            print(
+                f"Loaded {len(swap_program_ids)} swap program IDs "
+                f"(Jupiter map available: {'yes' if len(swap_program_ids) > 1 else 'no'})"
+            )
+
+        # One getMultipleAccounts per 100 wallets instead of a getBalance each.
+        balances: Dict[str, int] = {}
+        if jobs and not args.no_balance_prepass:
+            with run_metrics.registry().phase("balance_prepass"):
+                balances = rpc_get_balances(
+                    [wallet for _i, wallet, _stats in jobs],
+                    helius_api_key=helius_api_key,
+                    batch_size=args.rpc_batch_size,
+                )
+            print(f"Balance pre-pass: {len(balances):,} of {len(jobs):,} wallet(s)")
+
+        def _profile(job: WalletJob) -> ProfileResult:
+            i, wallet, stats = job
+            base_activity = base_activities.get(wallet)
+            print(
+                f"[{i}/{len(top)}] {'Refreshing' if base_activity else 'Profiling'} {wallet} "
+                f"({lamports_to_sol(stats['delegated_lamports']):,.2f} SOL delegated)"
+            )
+            return collect_wallet_profile(
                 wallet,
                 mode=args.mode,
                 delegated_lamports=stats["delegated_lamports"],
@@ -1198,27 +3332,122 @@ def main(argv: Sequence[str]) -> int:
                 helius_lookback_days=args.helius_lookback_days,
                 helius_token_accounts=args.helius_token_accounts,
                 helius_strict_last_n=args.helius_strict_last_n,
+                rpc_batch_size=args.rpc_batch_size,
+                tx_store=tx_store,
+                base_activity=base_activity,
+                max_signatures=args.max_signatures,
+                history_days=args.history_days,
+                helius_parse_concurrency=args.helius_parse_concurrency,
+                parse_scheduler=parse_scheduler,
+                tx_encoding=args.tx_encoding,
+                alt_cache=alt_cache,
+                token_encoding=args.token_encoding,
+                mint_cache=mint_cache,
+                balances=balances,
             )
-            profiles.append(profile)
-            write_cached_profile(profile)
-            update_manifest(manifest, wallet, float(profile.get("cached_at") or time.time()))
-            append_jsonl(profile)
-        except RuntimeError as e:
-            print(f"  RPC error: {e}", file=sys.stderr)
-        if args.manifest_every > 0 and i % args.manifest_every == 0:
-            write_manifest(manifest)
-        time.sleep(args.sleep_ms / 1000.0)
 
-    write_manifest(manifest)
-    if args.no_materialize_output:
+        # Results are persisted here, on the main thread, so profile store/JSONL
+        # writes stay serialized regardless of how many wallets are in flight.
+        failed: List[str] = []
+        profiled = 0
+        aborted = False
+        progress = (
+            run_metrics.ProgressLine(
+                len(jobs),
+                unit="wallets",
+                interval=args.progress_interval,
+                registry=run_metrics.registry(),
+            )
+            if jobs and args.progress_interval > 0
+            else None
+        )
+        results = iter_profile_results(jobs, _profile, concurrency=concurrency)
+        for (i, wallet, _stats), result, error in results:
+            if progress is not None:
+                progress.advance(failed=result is None)
+            if result is not None:
+                profile, activity = result
+                if output is not None:
+                    output.write(profile)
+                profile_store.put(profile, activity)
+                append_jsonl(profile)
+                profiled += 1
+            elif isinstance(error, rpc_transport.CircuitOpenError):
+                # The endpoint is down for good; stop instead of failing every
+                # remaining wallet. Completed work is already checkpointed.
+                print(f"  Aborting run: {error}", file=sys.stderr)
+                failed.append(wallet)
+                aborted = True
+                break
+            else:
+                print(f"  RPC error ({wallet}): {error}", file=sys.stderr)
+                failed.append(wallet)
+            _checkpoint()
+            if sleep_s > 0:
+                with run_metrics.registry().phase("sleep"):
+                    time.sleep(sleep_s)
+        # Waits for wallets still in flight before the stores below are closed.
+        results.close()
+    except BaseException:
+        # Keep the previous wallet_profiles.json/csv; the store and JSONL log
+        # hold everything completed so far (see --materialize).
+        if output is not None:
+            output.discard()
+        raise
+
+    skipped = len(jobs) - profiled - len(failed)
+    if aborted:
+        # As above: an incomplete run must not replace the last complete outputs.
+        if output is not None:
+            output.discard()
+            output = None
+        print(
+            f"Run aborted: {profiled:,} wallet(s) profiled, {len(failed):,} failed, "
+            f"{skipped:,} not completed; previous wallet_profiles.json/csv kept.",
+            file=sys.stderr,
+        )
+    if failed:
+        print(
+            f"{len(failed):,} wallet(s) failed; "
+            "they are not in the manifest and will be retried on the next run.",
+            file=sys.stderr,
+        )
+
+    if tx_store is not None:
+        tx_store.close()
+    if parse_scheduler is not None:
+        parse_scheduler.close()
+        print(f"Helius parse: {parse_scheduler.summary()}")
+
+    if output is not None:
+        with run_metrics.registry().phase("token_concentration"):
+            mints_written = write_token_concentration(output.tokens, mint_cache)
+        print(f"Wrote token concentration ({mints_written:,} mints) -> {TOKEN_CONCENTRATION_PATH}")
+    mint_cache.close()
+
+    print(f"HTTP transport: {rpc_transport.stats().summary()}")
+    if args.metrics_out:
+        run_metrics.write_report(
+            args.metrics_out,
+            transport=rpc_transport.stats().as_dict(),
+            wallets_selected=len(top),
+            wallets_profiled=profiled,
+            wallets_failed=len(failed),
+            wallets_skipped=skipped,
+            aborted=aborted,
+        )
+    profile_store.checkpoint()
+    profile_store.close()
+    if aborted:
+        return 1
+    if output is None:
         print("Skipped materializing wallet_profiles.json/csv (--no-materialize-output).")
         print(f"Append-only log -> {JSONL_PATH}")
         return 0
 
-    json_path = write_profiles_json(profiles)
-    csv_path = write_profiles_csv(profiles)
-    print(f"Wrote profiles JSON -> {json_path}")
-    print(f"Wrote profiles CSV  -> {csv_path}")
+    output.close()
+    print(f"Wrote {output.count:,} profiles JSON -> {output.json_path}")
+    print(f"Wrote profiles CSV  -> {output.csv_path}")
     print(f"Append-only log -> {JSONL_PATH}")
     return 0
 
@@ -0,0 +1,1310 @@
+#!/usr/bin/env python3
+
+"""
+Shared HTTP/JSON-RPC transport for the Solana data-collection scripts.
+
+Used by collect_validator_stake.py and profile_wallets.py. Compared to a bare
+urllib.request.urlopen per call, this:
+- keeps a pool of persistent (keep-alive) connections per host, so repeated
+  calls skip DNS, TCP and TLS setup;
+- asks for gzip/deflate-compressed responses and decodes them transparently;
+- applies per-call timeouts with a configurable default;
+- rate-limits each endpoint with an adaptive token bucket that ramps up while
+  responses are healthy and backs off on 429s (honouring Retry-After);
+- retries idempotent reads with jittered exponential backoff, and pauses all
+  callers behind a per-endpoint circuit breaker during sustained failures;
+- counts requests, new vs reused connections, retries and bytes on the wire,
+  and records per-method latency/bytes/retries/errors in run_metrics.
+"""
+
+from __future__ import annotations
+
+import email.utils
+import gzip
+import http.client
+import codecs
+import json
+import math
+import random
+import socket
+import ssl
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+import run_metrics
+
+
+DEFAULT_TIMEOUT_S = 60.0
+DEFAULT_MAX_IDLE_PER_HOST = 16
+
+# Retry / backoff policy for idempotent reads.
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 30.0
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Adaptive limiter: never throttle below this, whatever the provider says.
+MIN_RPS = 0.5
+
+# Circuit breaker: open after this many consecutive failed requests, pause for
+# the cooldown (doubling while the endpoint keeps failing), and give up once an
+# outage has lasted max_outage_s (configure(max_outage_s=...) to change it).
+BREAKER_THRESHOLD = 8
+BREAKER_COOLDOWN_S = 15.0
+BREAKER_MAX_COOLDOWN_S = 240.0
+BREAKER_MAX_OUTAGE_S = 300.0
+
+# Default number of calls packed into one JSON-RPC array request.
+DEFAULT_RPC_BATCH_SIZE = 50
+
+RpcCall = Tuple[str, Sequence[Any]]
+
+_T = TypeVar("_T")
+
+# Errors that mean a pooled keep-alive connection was closed by the server
+# while idle; the request is retried once on a fresh connection.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+class HttpError(RuntimeError):
+    """
+    Non-2xx HTTP response. Keeps status and headers (e.g. Retry-After).
+    """
+
+    def __init__(
+        self,
+        code: int,
+        reason: str,
+        headers: Mapping[str, str],
+        body: bytes,
+        *,
+        message: Optional[str] = None,
+    ) -> None:
+        super().__init__(message or f"{code} {reason}")
+        self.code = code
+        self.reason = reason
+        self.headers = dict(headers)
+        self.body = body
+
+
+class NetworkError(RuntimeError):
+    """
+    Connection-level failure: DNS, connect, TLS, timeout or a dropped socket.
+    """
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    An endpoint kept failing for longer than the breaker is willing to pause.
+    Callers should stop the run rather than continue with the next item.
+    """
+
+
+@dataclass
+class HttpResponse:
+    status: int
+    reason: str
+    headers: Dict[str, str]
+    body: bytes
+
+
+@dataclass
+class TransportStats:
+    requests: int = 0
+    connections_opened: int = 0
+    connections_reused: int = 0
+    stale_retries: int = 0
+    retries: int = 0
+    throttled: int = 0
+    breaker_trips: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    bytes_decoded: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+    def summary(self) -> str:
+        return (
+            f"{self.requests:,} HTTP requests, "
+            f"{self.connections_opened:,} connections opened, "
+            f"{self.connections_reused:,} reused, "
+            f"{self.retries:,} retries ({self.throttled:,} throttled), "
+            f"{self.bytes_received / 1e6:,.2f} MB received "
+            f"({self.bytes_decoded / 1e6:,.2f} MB decoded)"
+        )
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket.
+
+    Callers reserve tokens up front and sleep off any deficit, so concurrent
+    workers are released in arrival order at no more than `rate` requests/sec
+    (after an initial burst of `burst` requests).
+    """
+
+    def __init__(self, rate: float, *, burst: Optional[float] = None) -> None:
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: float = 1.0) -> None:
+        if self.rate <= 0 or n <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= n
+            deficit = -self._tokens
+        if deficit > 0:
+            time.sleep(deficit / self.rate)
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    Token bucket whose rate follows the endpoint's responses (AIMD).
+
+    The rate grows by max(1, 10%) after every `increase_every` healthy
+    responses, up to max_rate, and is halved on throttling responses (at most
+    once per second, so one burst of 429s counts as one congestion event). A
+    Retry-After pauses the whole bucket until that time. An unlimited limiter
+    (rate=inf) only starts limiting once it is throttled, from half the rate
+    it was actually sending at.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        *,
+        max_rate: float = math.inf,
+        min_rate: float = MIN_RPS,
+        increase_every: int = 10,
+    ) -> None:
+        super().__init__(rate if math.isfinite(rate) else 1.0)
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.increase_every = increase_every
+        self._healthy = 0
+        self._paused_until = 0.0
+        self._last_decrease = -math.inf
+        self._window: List[Tuple[float, float]] = []
+
+    def acquire(self, n: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                pause = self._paused_until - now
+                if pause <= 0:
+                    self._window.append((now, n))
+                    if len(self._window) > 1024:
+                        del self._window[:512]
+                    break
+            time.sleep(pause)
+        if math.isfinite(self.rate):
+            super().acquire(n)
+
+    def _observed_rate(self, now: float) -> float:
+        recent = [(t, n) for t, n in self._window if now - t <= 5.0]
+        if len(recent) < 2:
+            return 2.0 * self.min_rate
+        return sum(n for _t, n in recent) / max(now - recent[0][0], 0.25)
+
+    def on_success(self) -> None:
+        with self._lock:
+            if not math.isfinite(self.rate):
+                return
+            self._healthy += 1
+            if self._healthy >= self.increase_every:
+                self._healthy = 0
+                step = max(1.0, self.rate * 0.1)
+                self.rate = min(self.max_rate, self.rate + step)
+                self.capacity = max(1.0, self.rate)
+
+    def on_throttled(self, retry_after: Optional[float]) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._healthy = 0
+            if now - self._last_decrease >= 1.0:
+                self._last_decrease = now
+                current = self.rate if math.isfinite(self.rate) else self._observed_rate(now)
+                self.rate = max(self.min_rate, current / 2.0)
+                self.capacity = max(1.0, self.rate)
+                self._tokens = min(self._tokens, 0.0)
+                self._updated = now
+            if retry_after is not None and retry_after > 0:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker that pauses callers instead of failing them.
+
+    After `threshold` consecutive failed requests the circuit opens and every
+    caller blocks in wait_ready() for the cooldown. Then a single trial request
+    is let through: success closes the circuit, failure reopens it with a
+    doubled cooldown. Once an outage has lasted max_outage_s, waiting callers
+    get CircuitOpenError.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        threshold: int = BREAKER_THRESHOLD,
+        cooldown_s: float = BREAKER_COOLDOWN_S,
+        max_cooldown_s: float = BREAKER_MAX_COOLDOWN_S,
+        max_outage_s: float = BREAKER_MAX_OUTAGE_S,
+        on_trip: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.name = name
+        self.threshold = threshold
+        self.base_cooldown_s = cooldown_s
+        self.max_cooldown_s = max_cooldown_s
+        self.max_outage_s = max_outage_s
+        self._on_trip = on_trip
+        self._cond = threading.Condition()
+        self._state = "closed"
+        self._failures = 0
+        self._cooldown_s = cooldown_s
+        self._reopen_at = 0.0
+        self._outage_started: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def wait_ready(self) -> None:
+        with self._cond:
+            while True:
+                if self._state == "closed":
+                    return
+                now = time.monotonic()
+                if (
+                    self._outage_started is not None
+                    and now - self._outage_started > self.max_outage_s
+                ):
+                    raise CircuitOpenError(
+                        f"{self.name} has been failing for "
+                        f"{now - self._outage_started:,.0f}s; giving up"
+                    )
+                if not self._trial_in_flight and now >= self._reopen_at:
+                    self._state = "half-open"
+                    self._trial_in_flight = True
+                    return
+                self._cond.wait(timeout=max(0.05, min(5.0, self._reopen_at - now)))
+
+    def record_success(self) -> None:
+        with self._cond:
+            if self._state != "closed":
+                print(f"[rpc] {self.name} recovered; resuming.", file=sys.stderr)
+            self._state = "closed"
+            self._failures = 0
+            self._cooldown_s = self.base_cooldown_s
+            self._outage_started = None
+            self._trial_in_flight = False
+            self._cond.notify_all()
+
+    def record_failure(self) -> None:
+        with self._cond:
+            self._failures += 1
+            now = time.monotonic()
+            if self._state == "half-open":
+                self._cooldown_s = min(self.max_cooldown_s, self._cooldown_s * 2)
+            elif self._state == "closed" and self._failures >= self.threshold:
+                self._outage_started = now
+                if self._on_trip is not None:
+                    self._on_trip()
+            else:
+                return
+            self._state = "open"
+            self._trial_in_flight = False
+            self._reopen_at = now + self._cooldown_s
+            print(
+                f"[rpc] {self.name}: {self._failures} consecutive failures; "
+                f"pausing {self._cooldown_s:.0f}s.",
+                file=sys.stderr,
+            )
+            self._cond.notify_all()
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Full-jitter exponential backoff, never shorter than the server's Retry-After.
+    """
+    delay = random.uniform(0.0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+@dataclass
+class _Endpoint:
+    limiter: AdaptiveRateLimiter
+    breaker: CircuitBreaker
+
+
+def _decode_body(raw: bytes, encoding: str) -> bytes:
+    encoding = encoding.strip().lower()
+    if not encoding or encoding == "identity":
+        return raw
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.decompress(raw)
+    if encoding == "deflate":
+        # Servers disagree on whether "deflate" means zlib-wrapped or raw.
+        try:
+            return zlib.decompress(raw)
+        except zlib.error:
+            return zlib.decompress(raw, -zlib.MAX_WBITS)
+    raise NetworkError(f"unsupported Content-Encoding: {encoding}")
+
+
+@dataclass
+class _HostPool:
+    idle: List[http.client.HTTPConnection] = field(default_factory=list)
+
+
+class HttpTransport:
+    """
+    Thread-safe HTTP client with a keep-alive connection pool per host.
+
+    A connection is checked out for the duration of one request, so any number
+    of threads can share a transport; up to max_idle_per_host connections per
+    host are kept open between requests. Each host also gets its own adaptive
+    rate limiter and circuit breaker; a request spends its `cost` in tokens
+    (e.g. the number of calls in a JSON-RPC batch) before it is sent.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout: float = DEFAULT_TIMEOUT_S,
+        max_idle_per_host: int = DEFAULT_MAX_IDLE_PER_HOST,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        max_rps: float = 0.0,
+        max_outage_s: float = BREAKER_MAX_OUTAGE_S,
+        user_agent: str = "solana-ai-agent-collector/1.0",
+    ) -> None:
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.max_retries = max_retries
+        self.max_rps = max_rps
+        self.max_outage_s = max_outage_s
+        self.user_agent = user_agent
+        self._endpoints: Dict[Tuple[str, str, int], _Endpoint] = {}
+        self.stats = TransportStats()
+        self._pools: Dict[Tuple[str, str, int], _HostPool] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ssl_context = ssl.create_default_context()
+
+    def set_max_rps(self, max_rps: float) -> None:
+        """
+        Per-endpoint ceiling for the adaptive limiters (0 = no ceiling: start
+        unlimited and only slow down when the provider pushes back).
+        """
+        with self._lock:
+            self.max_rps = max_rps
+            self._endpoints.clear()
+
+    def set_max_outage_s(self, max_outage_s: float) -> None:
+        """
+        How long every endpoint's circuit breaker pauses callers before
+        giving up with CircuitOpenError.
+        """
+        with self._lock:
+            self.max_outage_s = max_outage_s
+            for endpoint in self._endpoints.values():
+                endpoint.breaker.max_outage_s = max_outage_s
+
+    def _endpoint(self, key: Tuple[str, str, int]) -> _Endpoint:
+        with self._lock:
+            endpoint = self._endpoints.get(key)
+            if endpoint is None:
+                ceiling = self.max_rps if self.max_rps > 0 else math.inf
+                endpoint = _Endpoint(
+                    limiter=AdaptiveRateLimiter(ceiling, max_rate=ceiling),
+                    breaker=CircuitBreaker(
+                        f"{key[0]}://{key[1]}",
+                        max_outage_s=self.max_outage_s,
+                        on_trip=self._count_trip,
+                    ),
+                )
+                self._endpoints[key] = endpoint
+            return endpoint
+
+    def _count_trip(self) -> None:
+        # Called with the breaker's lock held; only touches stats.
+        self.stats.breaker_trips += 1
+
+    def _new_connection(self, key: Tuple[str, str, int], timeout: float) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(
+                host, port, timeout=timeout, context=self._ssl_context
+            )
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _checkout(
+        self, key: Tuple[str, str, int], timeout: float
+    ) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            pool = self._pools.setdefault(key, _HostPool())
+            conn = pool.idle.pop() if pool.idle else None
+            if conn is not None:
+                self.stats.connections_reused += 1
+            else:
+                self.stats.connections_opened += 1
+        if conn is None:
+            return self._new_connection(key, timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _checkin(self, key: Tuple[str, str, int], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            pool = self._pools.setdefault(key, _HostPool())
+            if len(pool.idle) < self.max_idle_per_host:
+                pool.idle.append(conn)
+                return
+        conn.close()
+
+    def _prepare(
+        self, url: str, headers: Optional[Mapping[str, str]]
+    ) -> Tuple[Tuple[str, str, int], str, Dict[str, str]]:
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https"):
+            raise NetworkError(f"unsupported URL scheme: {url}")
+        host = parts.hostname or ""
+        port = parts.port or (443 if scheme == "https" else 80)
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+
+        send_headers = {
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+            "User-Agent": self.user_agent,
+        }
+        if headers:
+            send_headers.update(headers)
+        return (scheme, host, port), target, send_headers
+
+    def _with_policy(
+        self,
+        key: Tuple[str, str, int],
+        *,
+        cost: float,
+        idempotent: bool,
+        attempt_once: Callable[[], _T],
+    ) -> _T:
+        endpoint = self._endpoint(key)
+        metrics = run_metrics.registry()
+        attempt = 0
+        while True:
+            with metrics.phase("circuit_breaker_wait"):
+                endpoint.breaker.wait_ready()
+            with metrics.phase("rate_limit_wait"):
+                endpoint.limiter.acquire(cost)
+            try:
+                result = attempt_once()
+            except (HttpError, NetworkError) as e:
+                retry_after: Optional[float] = None
+                if isinstance(e, HttpError):
+                    if e.code not in RETRYABLE_STATUSES:
+                        # The endpoint answered; this request is just bad.
+                        endpoint.breaker.record_success()
+                        raise
+                    retry_after = _parse_retry_after(e.headers.get("retry-after"))
+                    if e.code == 429 or retry_after is not None:
+                        endpoint.limiter.on_throttled(retry_after)
+                        with self._lock:
+                            self.stats.throttled += 1
+                endpoint.breaker.record_failure()
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                with self._lock:
+                    self.stats.retries += 1
+                self._local.retries = getattr(self._local, "retries", 0) + 1
+                with metrics.phase("retry_backoff"):
+                    time.sleep(backoff_delay(attempt, retry_after))
+                attempt += 1
+                continue
+            endpoint.limiter.on_success()
+            endpoint.breaker.record_success()
+            return result
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        body: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        timeout: Optional[float] = None,
+        cost: float = 1.0,
+        idempotent: bool = True,
+    ) -> HttpResponse:
+        """
+        Send one request and return the decoded response.
+
+        429/5xx responses and network errors are retried with jittered
+        exponential backoff when the request is idempotent. Raises HttpError
+        for non-2xx statuses and NetworkError for connection-level failures
+        once retries are exhausted, and CircuitOpenError when the endpoint's
+        breaker gives up.
+        """
+        key, target, send_headers = self._prepare(url, headers)
+        timeout = self.timeout if timeout is None else timeout
+        return self._with_policy(
+            key,
+            cost=cost,
+            idempotent=idempotent,
+            attempt_once=lambda: self._send_once(
+                key, method, target, body, send_headers, timeout
+            ),
+        )
+
+    def open_stream(
+        self,
+        method: str,
+        url: str,
+        *,
+        body: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        timeout: Optional[float] = None,
+        cost: float = 1.0,
+        idempotent: bool = True,
+    ) -> "StreamingResponse":
+        """
+        Like request(), but returns as soon as the status line and headers are
+        in; the body is read incrementally from the returned StreamingResponse.
+
+        Retries only cover failures before the body starts streaming.
+        """
+        key, target, send_headers = self._prepare(url, headers)
+        timeout = self.timeout if timeout is None else timeout
+        return self._with_policy(
+            key,
+            cost=cost,
+            idempotent=idempotent,
+            attempt_once=lambda: self._open_once(
+                key, method, target, body, send_headers, timeout
+            ),
+        )
+
+    def _exchange(
+        self,
+        key: Tuple[str, str, int],
+        method: str,
+        target: str,
+        body: Optional[bytes],
+        headers: Mapping[str, str],
+        timeout: float,
+    ) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        for attempt in range(2):
+            conn, reused = self._checkout(key, timeout)
+            try:
+                conn.request(method, target, body=body, headers=dict(headers))
+                resp = conn.getresponse()
+            except _STALE_CONNECTION_ERRORS as e:
+                conn.close()
+                if reused and attempt == 0:
+                    with self._lock:
+                        self.stats.stale_retries += 1
+                    continue
+                raise NetworkError(str(e) or type(e).__name__) from e
+            except (socket.timeout, OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise NetworkError(str(e) or type(e).__name__) from e
+            with self._lock:
+                self.stats.requests += 1
+                self.stats.bytes_sent += len(body or b"")
+            return conn, resp
+        raise NetworkError("connection closed")  # pragma: no cover - loop always returns/raises
+
+    def _read_all(
+        self,
+        key: Tuple[str, str, int],
+        conn: http.client.HTTPConnection,
+        resp: http.client.HTTPResponse,
+    ) -> HttpResponse:
+        try:
+            raw = resp.read()
+        except (socket.timeout, OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise NetworkError(str(e) or type(e).__name__) from e
+        self._release(key, conn, resp)
+
+        resp_headers = {k.lower(): v for k, v in resp.getheaders()}
+        try:
+            decoded = _decode_body(raw, resp_headers.get("content-encoding", ""))
+        except (OSError, EOFError, zlib.error) as e:
+            raise NetworkError(f"failed to decode response body: {e}") from e
+
+        self._count_bytes(len(raw), len(decoded))
+        return HttpResponse(resp.status, resp.reason, resp_headers, decoded)
+
+    def _count_bytes(self, received: int, decoded: int) -> None:
+        with self._lock:
+            self.stats.bytes_received += received
+            self.stats.bytes_decoded += decoded
+        self._local.bytes_received = getattr(self._local, "bytes_received", 0) + received
+
+    def thread_bytes_received(self) -> int:
+        """
+        Wire bytes received by the calling thread so far; diff two readings to
+        attribute traffic to one unit of work when requests run concurrently.
+        """
+        return getattr(self._local, "bytes_received", 0)
+
+    def thread_retries(self) -> int:
+        """
+        Retries made by the calling thread so far (same diffing use as
+        thread_bytes_received).
+        """
+        return getattr(self._local, "retries", 0)
+
+    def _release(
+        self,
+        key: Tuple[str, str, int],
+        conn: http.client.HTTPConnection,
+        resp: http.client.HTTPResponse,
+    ) -> None:
+        if resp.will_close:
+            conn.close()
+        else:
+            self._checkin(key, conn)
+
+    def _send_once(
+        self,
+        key: Tuple[str, str, int],
+        method: str,
+        target: str,
+        body: Optional[bytes],
+        headers: Mapping[str, str],
+        timeout: float,
+    ) -> HttpResponse:
+        conn, resp = self._exchange(key, method, target, body, headers, timeout)
+        result = self._read_all(key, conn, resp)
+        if not 200 <= result.status < 300:
+            raise HttpError(result.status, result.reason, result.headers, result.body)
+        return result
+
+    def _open_once(
+        self,
+        key: Tuple[str, str, int],
+        method: str,
+        target: str,
+        body: Optional[bytes],
+        headers: Mapping[str, str],
+        timeout: float,
+    ) -> "StreamingResponse":
+        conn, resp = self._exchange(key, method, target, body, headers, timeout)
+        if not 200 <= resp.status < 300:
+            result = self._read_all(key, conn, resp)
+            raise HttpError(result.status, result.reason, result.headers, result.body)
+        return StreamingResponse(self, key, conn, resp)
+
+    def close(self) -> None:
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            for conn in pool.idle:
+                conn.close()
+
+
+class StreamingResponse:
+    """
+    A 2xx response whose body is consumed incrementally via iter_chunks().
+
+    The connection goes back to the pool only if the body was read to the end;
+    closing early (or on error) discards it.
+    """
+
+    def __init__(
+        self,
+        transport: HttpTransport,
+        key: Tuple[str, str, int],
+        conn: http.client.HTTPConnection,
+        resp: http.client.HTTPResponse,
+    ) -> None:
+        self.status = resp.status
+        self.headers = {k.lower(): v for k, v in resp.getheaders()}
+        self._transport = transport
+        self._key = key
+        self._conn: Optional[http.client.HTTPConnection] = conn
+        self._resp = resp
+        self._finished = False
+        encoding = self.headers.get("content-encoding", "").strip().lower()
+        if encoding not in ("", "identity", "gzip", "x-gzip", "deflate"):
+            conn.close()
+            raise NetworkError(f"unsupported Content-Encoding: {encoding}")
+        self._deflate = encoding == "deflate"
+        self._decoder: Optional[Any] = (
+            zlib.decompressobj(16 + zlib.MAX_WBITS) if encoding in ("gzip", "x-gzip") else None
+        )
+
+    def iter_chunks(self, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+        count_bytes = self._transport._count_bytes
+        try:
+            while True:
+                try:
+                    raw = self._resp.read(chunk_size)
+                except (socket.timeout, OSError, http.client.HTTPException) as e:
+                    raise NetworkError(str(e) or type(e).__name__) from e
+                if not raw:
+                    break
+                if self._deflate and self._decoder is None:
+                    # zlib-wrapped deflate starts with a 0x78 CMF byte; else raw.
+                    wbits = zlib.MAX_WBITS if raw[0] == 0x78 else -zlib.MAX_WBITS
+                    self._decoder = zlib.decompressobj(wbits)
+                try:
+                    out = self._decoder.decompress(raw) if self._decoder is not None else raw
+                except zlib.error as e:
+                    raise NetworkError(f"failed to decode response body: {e}") from e
+                count_bytes(len(raw), len(out))
+                if out:
+                    yield out
+            if self._decoder is not None:
+                tail = self._decoder.flush()
+                if tail:
+                    count_bytes(0, len(tail))
+                    yield tail
+            self._finished = True
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if self._finished:
+            self._transport._release(self._key, conn, self._resp)
+        else:
+            conn.close()
+
+    def __enter__(self) -> "StreamingResponse":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+_DEFAULT_TRANSPORT = HttpTransport()
+
+
+def default_transport() -> HttpTransport:
+    return _DEFAULT_TRANSPORT
+
+
+def configure(
+    *,
+    timeout: Optional[float] = None,
+    max_idle_per_host: Optional[int] = None,
+    max_rps: Optional[float] = None,
+    max_retries: Optional[int] = None,
+    max_outage_s: Optional[float] = None,
+) -> HttpTransport:
+    """
+    Adjust the shared transport's defaults (e.g. from CLI flags).
+
+    max_rps caps each endpoint's adaptive rate limiter; 0 removes the cap.
+    max_outage_s is how long a failing endpoint's circuit breaker keeps
+    pausing callers before they get CircuitOpenError.
+    """
+    if timeout is not None:
+        _DEFAULT_TRANSPORT.timeout = timeout
+    if max_idle_per_host is not None:
+        _DEFAULT_TRANSPORT.max_idle_per_host = max_idle_per_host
+    if max_rps is not None:
+        _DEFAULT_TRANSPORT.set_max_rps(max_rps)
+    if max_retries is not None:
+        _DEFAULT_TRANSPORT.max_retries = max_retries
+    if max_outage_s is not None:
+        _DEFAULT_TRANSPORT.set_max_outage_s(max_outage_s)
+    return _DEFAULT_TRANSPORT
+
+
+def _labelled(e: RuntimeError, label: str) -> RuntimeError:
+    if isinstance(e, HttpError):
+        return HttpError(
+            e.code,
+            e.reason,
+            e.headers,
+            e.body,
+            message=f"HTTP error calling {label}: {e.code} {e.reason}",
+        )
+    if isinstance(e, NetworkError):
+        return NetworkError(f"Network error calling {label}: {e.reason}")
+    return e
+
+
+class _RequestMeter:
+    """
+    Measures one logical request (retries included) on the calling thread
+    and records it in run_metrics under `key`.
+    """
+
+    def __init__(self, key: str, *, calls: int = 1, request_bytes: int = 0) -> None:
+        self.key = key
+        self.calls = calls
+        self.request_bytes = request_bytes
+        self._started = time.perf_counter()
+        self._bytes = _DEFAULT_TRANSPORT.thread_bytes_received()
+        self._retries = _DEFAULT_TRANSPORT.thread_retries()
+
+    def finish(self, *, error: bool = False) -> None:
+        run_metrics.registry().observe_request(
+            self.key,
+            time.perf_counter() - self._started,
+            calls=self.calls,
+            request_bytes=self.request_bytes,
+            response_bytes=_DEFAULT_TRANSPORT.thread_bytes_received() - self._bytes,
+            retries=_DEFAULT_TRANSPORT.thread_retries() - self._retries,
+            error=error,
+        )
+
+
+def post_json(
+    url: str,
+    payload: Any,
+    *,
+    label: str,
+    timeout: Optional[float] = None,
+    cost: float = 1.0,
+    idempotent: bool = True,
+    metric: Optional[str] = None,
+    calls: int = 1,
+) -> Any:
+    """
+    POST a JSON payload and return the decoded JSON response.
+
+    Errors are raised as RuntimeError (HttpError/NetworkError) with `label`
+    naming the call in the message. The request is recorded in run_metrics
+    under `metric` (default: label) as `calls` calls.
+    """
+    body = json.dumps(payload).encode("utf-8")
+    meter = _RequestMeter(metric or label, calls=calls, request_bytes=len(body))
+    try:
+        resp = _DEFAULT_TRANSPORT.request(
+            "POST",
+            url,
+            body=body,
+            headers={"Content-Type": "application/json"},
+            timeout=timeout,
+            cost=cost,
+            idempotent=idempotent,
+        )
+    except RuntimeError as e:
+        meter.finish(error=True)
+        if isinstance(e, (HttpError, NetworkError)):
+            raise _labelled(e, label) from e
+        raise
+
+    try:
+        with run_metrics.registry().phase("json_decode"):
+            parsed = json.loads(resp.body)
+    except json.JSONDecodeError as e:
+        meter.finish(error=True)
+        raise RuntimeError(f"Invalid JSON from {label}: {resp.body[:200]!r}") from e
+    meter.finish()
+    return parsed
+
+
+def post_json_rpc(
+    url: str, method: str, params: Sequence[Any], *, timeout: Optional[float] = None
+) -> Any:
+    payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": list(params)}
+    parsed = post_json(url, payload, label=method, timeout=timeout)
+    if "error" in parsed:
+        run_metrics.registry().count_errors(method)
+        raise RuntimeError(f"RPC error calling {method}: {parsed['error']}")
+    return parsed["result"]
+
+
+@dataclass
+class RpcBatchItem:
+    method: str
+    result: Any = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def unwrap(self) -> Any:
+        if self.error is not None:
+            raise RuntimeError(f"RPC error calling {self.method}: {self.error}")
+        return self.result
+
+
+def post_json_rpc_batch(
+    url: str,
+    calls: Sequence[RpcCall],
+    *,
+    max_batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+    timeout: Optional[float] = None,
+) -> List[RpcBatchItem]:
+    """
+    Send many JSON-RPC calls as array requests of at most max_batch_size items.
+
+    Responses are matched back to their calls by id, so the returned list lines
+    up with `calls`. A failing item carries its error without failing the rest
+    of the batch; transport failures (HTTP, network, invalid JSON) still raise.
+    With max_batch_size 1 every call goes out as a plain (non-array) request,
+    for providers that reject batches altogether.
+    """
+    items = [RpcBatchItem(method=method) for method, _params in calls]
+    size = max(1, max_batch_size)
+
+    for start in range(0, len(calls), size):
+        chunk = calls[start : start + size]
+        payload: Any = [
+            {"jsonrpc": "2.0", "id": start + offset, "method": method, "params": list(params)}
+            for offset, (method, params) in enumerate(chunk)
+        ]
+        label = f"batch of {len(chunk)} ({chunk[0][0]}...)"
+        if size == 1:
+            payload, label = payload[0], chunk[0][0]
+        metric = _batch_metric_key(chunk)
+        parsed = post_json(
+            url,
+            payload,
+            label=label,
+            timeout=timeout,
+            cost=len(chunk),
+            metric=metric,
+            calls=len(chunk),
+        )
+        if size == 1 and isinstance(parsed, dict):
+            # A plain request's response (result or error) answers that call.
+            parsed = [{**parsed, "id": start}]
+
+        if not isinstance(parsed, list):
+            # Some providers reject the whole array with a single error object
+            # (e.g. batch too large); surface it on every item of the chunk.
+            error = parsed.get("error") if isinstance(parsed, dict) else None
+            for offset in range(len(chunk)):
+                items[start + offset].error = str(error or f"unexpected response: {parsed!r:.200}")
+            run_metrics.registry().count_errors(metric, len(chunk))
+            continue
+
+        seen = set()
+        for entry in parsed:
+            if not isinstance(entry, dict):
+                continue
+            idx = entry.get("id")
+            if not isinstance(idx, int) or not start <= idx < start + len(chunk):
+                continue
+            seen.add(idx)
+            if "error" in entry:
+                items[idx].error = str(entry["error"])
+            else:
+                items[idx].result = entry.get("result")
+        for offset in range(len(chunk)):
+            if start + offset not in seen:
+                items[start + offset].error = "missing from batch response"
+        run_metrics.registry().count_errors(
+            metric, sum(1 for item in items[start : start + len(chunk)] if not item.ok)
+        )
+
+    return items
+
+
+def _batch_metric_key(chunk: Sequence[RpcCall]) -> str:
+    """
+    Metrics key for one batch request: the method when the batch is uniform,
+    otherwise batch[m1+m2+...] over its distinct methods.
+    """
+    methods = sorted({method for method, _params in chunk})
+    return methods[0] if len(methods) == 1 else f"batch[{'+'.join(methods)}]"
+
+
+_JSON_WHITESPACE = " \t\n\r"
+
+
+class _JsonCursor:
+    """
+    Pull-based cursor over a JSON document arriving in byte chunks.
+
+    Only the unread tail of the text is buffered; complete values are decoded
+    with the C-accelerated json.JSONDecoder.raw_decode.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            text = self._utf8.decode(b"", final=True)
+        else:
+            text = self._utf8.decode(chunk)
+        self._buf = self._buf[self._pos :] + text
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            buf, pos = self._buf, self._pos
+            while pos < len(buf) and buf[pos] in _JSON_WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                raise ValueError("unexpected end of JSON stream")
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r} in JSON stream, got {self._buf[self._pos]!r}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A scalar ending exactly at the buffer edge (e.g. a number) may
+            # continue in the next chunk.
+            if end == len(self._buf) and not self._eof and self._fill():
+                continue
+            self._pos = end
+            return obj
+
+
+def iter_json_rpc_result_items(chunks: Iterable[bytes], *, label: str) -> Iterator[Any]:
+    """
+    Yield the elements of a JSON-RPC response's array `result` one at a time.
+
+    Raises RuntimeError for an `error` response or a non-array result.
+    """
+    cur = _JsonCursor(chunks)
+    try:
+        cur.expect("{")
+        while cur.peek() != "}":
+            key = cur.value()
+            cur.expect(":")
+            if key == "result":
+                if cur.peek() != "[":
+                    raise RuntimeError(f"Unexpected {label} result type: {type(cur.value())}")
+                cur.expect("[")
+                if cur.peek() == "]":
+                    cur.expect("]")
+                else:
+                    while True:
+                        yield cur.value()
+                        if cur.peek() == ",":
+                            cur.expect(",")
+                            continue
+                        cur.expect("]")
+                        break
+            else:
+                value = cur.value()
+                if key == "error":
+                    raise RuntimeError(f"RPC error calling {label}: {value}")
+            if cur.peek() == ",":
+                cur.expect(",")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise RuntimeError(f"Invalid JSON from {label}: {e}") from e
+
+
+def stream_json_rpc_result(
+    url: str, method: str, params: Sequence[Any], *, timeout: Optional[float] = None
+) -> Iterator[Any]:
+    """
+    Call a JSON-RPC method whose result is an array and yield its elements as
+    they arrive, so peak memory stays flat regardless of the response size.
+    """
+    payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": list(params)}
+    body = json.dumps(payload).encode("utf-8")
+    # Latency covers the whole stream, including time the consumer spends
+    # between items.
+    meter = _RequestMeter(method, request_bytes=len(body))
+    try:
+        stream = _DEFAULT_TRANSPORT.open_stream(
+            "POST",
+            url,
+            body=body,
+            headers={"Content-Type": "application/json"},
+            timeout=timeout,
+        )
+    except RuntimeError as e:
+        meter.finish(error=True)
+        if isinstance(e, (HttpError, NetworkError)):
+            raise _labelled(e, method) from e
+        raise
+
+    error = False
+    with stream:
+        try:
+            yield from iter_json_rpc_result_items(stream.iter_chunks(), label=method)
+        except GeneratorExit:
+            # The consumer stopped early (break/close); still a completed request.
+            raise
+        except BaseException as e:
+            error = True
+            if isinstance(e, NetworkError):
+                raise _labelled(e, method) from e
+            raise
+        finally:
+            meter.finish(error=error)
+
+
+def get_json(url: str, *, timeout: Optional[float] = None) -> Any:
+    """
+    GET a JSON document; returns None when unreachable or not valid JSON.
+    """
+    meter = _RequestMeter(_get_metric_key(url))
+    try:
+        resp = _DEFAULT_TRANSPORT.request("GET", url, timeout=timeout, cost=0)
+    except RuntimeError:
+        meter.finish(error=True)
+        return None
+    try:
+        data = json.loads(resp.body)
+    except json.JSONDecodeError:
+        meter.finish(error=True)
+        return None
+    meter.finish()
+    return data
+
+
+def _get_metric_key(url: str) -> str:
+    return f"GET {urllib.parse.urlsplit(url).netloc}"
+
+
+@dataclass
+class ConditionalJson:
+    """
+    Result of get_json_conditional: either a fresh document with its
+    validators, or not_modified when the server answered 304.
+    """
+
+    not_modified: bool
+    data: Any = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def get_json_conditional(
+    url: str,
+    *,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> Optional[ConditionalJson]:
+    """
+    GET a JSON document, revalidating a cached copy with If-None-Match /
+    If-Modified-Since. Returns None when unreachable or not valid JSON.
+    """
+    headers: Dict[str, str] = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    meter = _RequestMeter(_get_metric_key(url))
+    try:
+        resp = _DEFAULT_TRANSPORT.request("GET", url, headers=headers, timeout=timeout, cost=0)
+    except HttpError as e:
+        meter.finish(error=e.code != 304)
+        if e.code != 304:
+            return None
+        return ConditionalJson(
+            not_modified=True,
+            etag=e.headers.get("etag") or etag,
+            last_modified=e.headers.get("last-modified") or last_modified,
+        )
+    except RuntimeError:
+        meter.finish(error=True)
+        return None
+    try:
+        data = json.loads(resp.body)
+    except json.JSONDecodeError:
+        meter.finish(error=True)
+        return None
+    meter.finish()
+    return ConditionalJson(
+        not_modified=False,
+        data=data,
+        etag=resp.headers.get("etag"),
+        last_modified=resp.headers.get("last-modified"),
+    )
+
+
+def stats() -> TransportStats:
+    return _DEFAULT_TRANSPORT.stats
+
+
+def thread_retries() -> int:
+    return _DEFAULT_TRANSPORT.thread_retries()
+
+
+def thread_bytes_received() -> int:
+    return _DEFAULT_TRANSPORT.thread_bytes_received()
+
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+
+"""
+Run-level instrumentation shared by the Solana data-collection scripts.
+
+rpc_transport records every request here, keyed by JSON-RPC method (or a
+"batch[...]" key for mixed batches, "GET host" for plain GETs): HTTP requests,
+calls, errors, retries, request/response bytes and a latency histogram. The
+scripts add cache outcomes (hit/miss/stale per cache) and time spent in named
+phases such as JSON decoding, rate-limit waits and backoff sleeps.
+
+At the end of a run the registry is written as a JSON report and in
+Prometheus text exposition format (e.g. for a node_exporter textfile
+collector). ProgressLine prints periodic throughput/ETA lines while work runs.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+
+# Geometric latency buckets, 1 ms .. ~2 min; quantiles interpolate inside them.
+LATENCY_BUCKETS_S: Tuple[float, ...] = tuple(round(0.001 * 1.5**i, 6) for i in range(30))
+QUANTILES = (0.5, 0.95, 0.99)
+CACHE_OUTCOMES = ("hit", "miss", "stale")
+PROMETHEUS_PREFIX = "solana_collector"
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram (Prometheus-style upper bounds plus +Inf).
+    Not thread-safe on its own; MetricsRegistry serializes access.
+    """
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS_S) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        lo, hi = 0, len(self.bounds)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if value <= self.bounds[mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+        self.counts[lo] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else (self.max or lower)
+                estimate = lower + (upper - lower) * max(rank - seen, 0.0) / n
+                return min(max(estimate, self.min or 0.0), self.max or estimate)
+            seen += n
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum_s": round(self.sum, 6),
+            "min_s": self.min,
+            "max_s": self.max,
+            **{f"p{int(q * 100)}_s": _round(self.quantile(q)) for q in QUANTILES},
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 6)
+
+
+@dataclass
+class MethodMetrics:
+    requests: int = 0
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    request_bytes: int = 0
+    response_bytes: int = 0
+    latency: Histogram = field(default_factory=Histogram)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "latency": self.latency.to_dict(),
+        }
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store for one run's metrics.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self.methods: Dict[str, MethodMetrics] = {}
+        self.caches: Dict[str, Dict[str, int]] = {}
+        self.phases: Dict[str, Histogram] = {}
+
+    def observe_request(
+        self,
+        key: str,
+        seconds: float,
+        *,
+        calls: int = 1,
+        request_bytes: int = 0,
+        response_bytes: int = 0,
+        retries: int = 0,
+        error: bool = False,
+    ) -> None:
+        with self._lock:
+            m = self.methods.get(key)
+            if m is None:
+                m = self.methods[key] = MethodMetrics()
+            m.requests += 1
+            m.calls += calls
+            m.errors += int(error)
+            m.retries += retries
+            m.request_bytes += request_bytes
+            m.response_bytes += response_bytes
+            m.latency.observe(seconds)
+
+    def count_errors(self, key: str, n: int = 1) -> None:
+        """
+        Errors reported inside a successful response (JSON-RPC error objects).
+        """
+        if n <= 0:
+            return
+        with self._lock:
+            m = self.methods.get(key)
+            if m is None:
+                m = self.methods[key] = MethodMetrics()
+            m.errors += n
+
+    def cache_event(self, cache: str, outcome: str, n: int = 1) -> None:
+        if outcome not in CACHE_OUTCOMES:
+            raise ValueError(f"unknown cache outcome {outcome!r}")
+        if n <= 0:
+            return
+        with self._lock:
+            counts = self.caches.setdefault(cache, dict.fromkeys(CACHE_OUTCOMES, 0))
+            counts[outcome] += n
+
+    def observe_phase(self, name: str, seconds: float) -> None:
+        with self._lock:
+            hist = self.phases.get(name)
+            if hist is None:
+                hist = self.phases[name] = Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_phase(name, time.perf_counter() - started)
+
+    def total_calls(self) -> int:
+        with self._lock:
+            return sum(m.calls for m in self.methods.values())
+
+    def report(self, **extra: Any) -> Dict[str, Any]:
+        with self._lock:
+            caches = {}
+            for name, counts in sorted(self.caches.items()):
+                looked_up = sum(counts.values())
+                caches[name] = {
+                    **counts,
+                    "hit_rate": round(counts["hit"] / looked_up, 4) if looked_up else None,
+                }
+            return {
+                "started_at": self.started_at,
+                "elapsed_s": round(time.time() - self.started_at, 3),
+                **extra,
+                "methods": {k: m.to_dict() for k, m in sorted(self.methods.items())},
+                "caches": caches,
+                "phases": {k: h.to_dict() for k, h in sorted(self.phases.items())},
+            }
+
+    def prometheus_text(self) -> str:
+        p = PROMETHEUS_PREFIX
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+
+        with self._lock:
+            methods = sorted(self.methods.items())
+            counters = (
+                ("rpc_requests_total", "requests", "HTTP requests sent per RPC method."),
+                ("rpc_calls_total", "calls", "JSON-RPC calls per method (batch items count individually)."),
+                ("rpc_errors_total", "errors", "Failed requests and JSON-RPC error responses per method."),
+                ("rpc_retries_total", "retries", "Transport retries per RPC method."),
+                ("rpc_request_bytes_total", "request_bytes", "Request body bytes sent per RPC method."),
+                ("rpc_response_bytes_total", "response_bytes", "Response bytes received on the wire per RPC method."),
+            )
+            for name, attr, help_text in counters:
+                family(name, "counter", help_text)
+                for key, m in methods:
+                    lines.append(f'{p}_{name}{{method="{_escape(key)}"}} {getattr(m, attr)}')
+
+            family("rpc_latency_seconds", "histogram", "Request latency per RPC method, retries included.")
+            for key, m in methods:
+                _histogram_lines(lines, f"{p}_rpc_latency_seconds", f'method="{_escape(key)}"', m.latency)
+
+            family("cache_events_total", "counter", "Cache lookups by cache and outcome.")
+            for cache, counts in sorted(self.caches.items()):
+                for outcome in CACHE_OUTCOMES:
+                    lines.append(
+                        f'{p}_cache_events_total{{cache="{_escape(cache)}",outcome="{outcome}"}} '
+                        f"{counts[outcome]}"
+                    )
+
+            family("phase_seconds", "histogram", "Time spent in named phases (decode, waits, sleeps).")
+            for name, hist in sorted(self.phases.items()):
+                _histogram_lines(lines, f"{p}_phase_seconds", f'phase="{_escape(name)}"', hist)
+
+        return "\n".join(lines) + "\n"
+
+    def summary_lines(self, limit: int = 8) -> List[str]:
+        """
+        Human-readable digest: busiest methods with latency quantiles, then
+        cache hit rates and the largest phases.
+        """
+        with self._lock:
+            methods = sorted(self.methods.items(), key=lambda kv: -kv[1].latency.sum)[:limit]
+            out = []
+            for key, m in methods:
+                q = [m.latency.quantile(x) for x in QUANTILES]
+                out.append(
+                    f"{key}: {m.calls:,} calls in {m.requests:,} requests, "
+                    f"p50/p95/p99 {'/'.join(_ms(v) for v in q)}, "
+                    f"{m.response_bytes / 1e6:,.2f} MB, {m.retries:,} retries, {m.errors:,} errors"
+                )
+            for cache, counts in sorted(self.caches.items()):
+                looked_up = sum(counts.values())
+                rate = f"{100 * counts['hit'] / looked_up:.1f}% hit" if looked_up else "unused"
+                out.append(
+                    f"cache {cache}: {counts['hit']:,} hit / {counts['miss']:,} miss / "
+                    f"{counts['stale']:,} stale ({rate})"
+                )
+            for name, hist in sorted(self.phases.items(), key=lambda kv: -kv[1].sum)[:limit]:
+                out.append(f"phase {name}: {hist.sum:,.2f}s over {hist.count:,}")
+            return out
+
+    def write(self, base_path: str, **extra: Any) -> Tuple[str, str]:
+        """
+        Write <base_path>.json and <base_path>.prom; returns both paths.
+        """
+        os.makedirs(os.path.dirname(base_path) or ".", exist_ok=True)
+        json_path, prom_path = base_path + ".json", base_path + ".prom"
+        with open(json_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.report(**extra), f, indent=2, sort_keys=True)
+        os.replace(json_path + ".tmp", json_path)
+        with open(prom_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(prom_path + ".tmp", prom_path)
+        return json_path, prom_path
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:,.0f}ms"
+
+
+def _histogram_lines(lines: List[str], name: str, labels: str, hist: Histogram) -> None:
+    cumulative = 0
+    for bound, n in zip(hist.bounds, hist.counts):
+        cumulative += n
+        lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+    lines.append(f"{name}_sum{{{labels}}} {hist.sum:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+
+class ProgressLine:
+    """
+    Periodic "[done/total] rate, ETA" line, printed at most every `interval`
+    seconds and once more when the last item completes. Printed as whole lines
+    rather than redrawn in place so it interleaves cleanly with per-item logs.
+    """
+
+    def __init__(
+        self,
+        total: int,
+        *,
+        unit: str = "items",
+        stream: Optional[TextIO] = None,
+        interval: float = 5.0,
+        registry: Optional[MetricsRegistry] = None,
+    ) -> None:
+        self.total = total
+        self.unit = unit
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.registry = registry
+        self.done = 0
+        self.failed = 0
+        self._started = time.monotonic()
+        self._last_draw = self._started
+
+    def advance(self, n: int = 1, *, failed: bool = False) -> None:
+        self.done += n
+        self.failed += n if failed else 0
+        now = time.monotonic()
+        if now - self._last_draw >= self.interval or self.done >= self.total:
+            self._last_draw = now
+            print(self.line(now), file=self.stream, flush=True)
+
+    def line(self, now: Optional[float] = None) -> str:
+        elapsed = (now or time.monotonic()) - self._started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.done, 0)
+        eta = _duration(remaining / rate) if rate > 0 else "?"
+        text = (
+            f"Progress: {self.done:,}/{self.total:,} {self.unit}, {rate:,.2f}/s, "
+            f"elapsed {_duration(elapsed)}, ETA {eta}"
+        )
+        if self.failed:
+            text += f", {self.failed:,} failed"
+        if self.registry is not None and elapsed > 0:
+            text += f", {self.registry.total_calls() / elapsed:,.1f} RPC calls/s"
+        return text
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m{seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def registry() -> MetricsRegistry:
+    return REGISTRY
+
+
+def write_report(base_path: str, **extra: Any) -> None:
+    """
+    Print the registry's digest and write <base_path>.json/.prom; a failed
+    write only warns, since the run's real outputs are already on disk.
+    """
+    for line in REGISTRY.summary_lines():
+        print(f"  {line}")
+    try:
+        json_path, prom_path = REGISTRY.write(base_path, **extra)
+    except OSError as e:
+        print(f"WARN: could not write run metrics to {base_path}: {e}", file=sys.stderr)
+        return
+    print(f"Run metrics -> {json_path}, {prom_path}")
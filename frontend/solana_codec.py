@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+"""
+Small binary codecs shared by the Solana data-collection scripts.
+
+Solana RPC can return account data and transactions as base64 instead of
+jsonParsed; decoding the raw layouts locally needs base58 for pubkeys, which
+the stdlib lacks, plus the shortvec lengths used by the transaction format.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import struct
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_B58_INDEX = {c: i for i, c in enumerate(B58_ALPHABET)}
+
+PUBKEY_LENGTH = 32
+
+
+def b58encode(data: bytes) -> str:
+    n = int.from_bytes(data, "big")
+    out = []
+    while n:
+        n, rem = divmod(n, 58)
+        out.append(B58_ALPHABET[rem])
+    leading_zeros = len(data) - len(data.lstrip(b"\0"))
+    return "1" * leading_zeros + "".join(reversed(out))
+
+
+def b58decode(value: str) -> bytes:
+    n = 0
+    for ch in value:
+        try:
+            n = n * 58 + _B58_INDEX[ch]
+        except KeyError as e:
+            raise ValueError(f"Invalid base58 character {ch!r} in {value!r}") from e
+    leading_ones = len(value) - len(value.lstrip("1"))
+    body = n.to_bytes((n.bit_length() + 7) // 8, "big") if n else b""
+    return b"\0" * leading_ones + body
+
+
+@lru_cache(maxsize=1 << 16)
+def encode_pubkey(raw: bytes) -> str:
+    """
+    base58 for a 32-byte pubkey. Memoized: authorities, voters and mints repeat
+    heavily across accounts.
+    """
+    return b58encode(raw)
+
+
+def account_data_bytes(data: Any) -> Optional[bytes]:
+    """
+    Raw bytes of an RPC account `data` field in ["<b64>", "base64"] form.
+    Returns None for any other encoding (e.g. jsonParsed dicts).
+    """
+    if isinstance(data, list) and len(data) == 2 and data[1] == "base64":
+        try:
+            return base64.b64decode(data[0])
+        except (binascii.Error, ValueError):
+            return None
+    return None
+
+
+# Address lookup table account: 56-byte LookupTableMeta header (u32 type tag,
+# deactivation_slot, last_extended_slot, start index, Option<authority>,
+# padding) followed by the stored addresses.
+LOOKUP_TABLE_META_SIZE = 56
+# Versioned messages set the top bit of the first message byte.
+MESSAGE_VERSION_PREFIX = 0x80
+SIGNATURE_LENGTH = 64
+
+
+def read_compact_u16(data: bytes, offset: int) -> Tuple[int, int]:
+    """
+    Decode a shortvec (compact-u16) length; returns (value, next offset).
+    """
+    value = 0
+    for i in range(3):
+        if offset >= len(data):
+            raise ValueError("truncated compact-u16")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return value, offset
+    raise ValueError("compact-u16 longer than 3 bytes")
+
+
+@dataclass
+class AddressTableLookup:
+    table: str
+    writable_indexes: List[int]
+    readonly_indexes: List[int]
+
+
+@dataclass
+class TransactionKeys:
+    """
+    The account-key part of a transaction message: static keys in message
+    order and, for v0 messages, the lookup-table references that extend them
+    (all writable lookups, then all readonly ones).
+    """
+
+    version: Optional[int]  # None for legacy messages
+    static_keys: List[str]
+    lookups: List[AddressTableLookup]
+
+
+def decode_transaction_keys(raw: bytes) -> TransactionKeys:
+    """
+    Decode just enough of a wire-format transaction for its account keys:
+    signatures, header, static keys and address-table lookups. Instruction
+    bodies are skipped by length without being decoded.
+    """
+    try:
+        n_signatures, offset = read_compact_u16(raw, 0)
+        offset += n_signatures * SIGNATURE_LENGTH
+
+        version: Optional[int] = None
+        if raw[offset] & MESSAGE_VERSION_PREFIX:
+            version = raw[offset] & ~MESSAGE_VERSION_PREFIX
+            if version != 0:
+                raise ValueError(f"unsupported transaction version {version}")
+            offset += 1
+        offset += 3  # header: required signatures, readonly signed/unsigned
+
+        n_keys, offset = read_compact_u16(raw, offset)
+        end = offset + n_keys * PUBKEY_LENGTH
+        if end > len(raw):
+            raise ValueError("truncated account keys")
+        static_keys = [
+            encode_pubkey(raw[i : i + PUBKEY_LENGTH]) for i in range(offset, end, PUBKEY_LENGTH)
+        ]
+        offset = end + 32  # recent blockhash
+
+        lookups: List[AddressTableLookup] = []
+        if version is not None:
+            n_instructions, offset = read_compact_u16(raw, offset)
+            for _ in range(n_instructions):
+                offset += 1  # program id index
+                n_accounts, offset = read_compact_u16(raw, offset)
+                offset += n_accounts
+                n_data, offset = read_compact_u16(raw, offset)
+                offset += n_data
+            n_lookups, offset = read_compact_u16(raw, offset)
+            for _ in range(n_lookups):
+                table = encode_pubkey(raw[offset : offset + PUBKEY_LENGTH])
+                offset += PUBKEY_LENGTH
+                n_writable, offset = read_compact_u16(raw, offset)
+                writable = list(raw[offset : offset + n_writable])
+                offset += n_writable
+                n_readonly, offset = read_compact_u16(raw, offset)
+                readonly = list(raw[offset : offset + n_readonly])
+                offset += n_readonly
+                if offset > len(raw):
+                    raise ValueError("truncated address table lookups")
+                lookups.append(AddressTableLookup(table, writable, readonly))
+    except IndexError as e:
+        raise ValueError("truncated transaction") from e
+
+    return TransactionKeys(version=version, static_keys=static_keys, lookups=lookups)
+
+
+def decode_lookup_table_addresses(data: bytes) -> List[str]:
+    """
+    Addresses stored in an address lookup table account.
+    """
+    if len(data) < LOOKUP_TABLE_META_SIZE:
+        raise ValueError("lookup table account shorter than its header")
+    body = data[LOOKUP_TABLE_META_SIZE:]
+    return [
+        encode_pubkey(body[i : i + PUBKEY_LENGTH])
+        for i in range(0, len(body) - len(body) % PUBKEY_LENGTH, PUBKEY_LENGTH)
+    ]
+
+
+# SPL token account: mint (32), owner (32), amount (u64) lead the layout, so a
+# 72-byte dataSlice carries everything a balance needs. Token-2022 accounts
+# share the base layout.
+TOKEN_ACCOUNT_SLICE_LENGTH = 72
+TOKEN_AMOUNT_OFFSET = 64
+# Mint: mint_authority COption<Pubkey> (36), supply (u64), decimals (u8),
+# is_initialized, freeze_authority COption<Pubkey>: 82 bytes.
+MINT_LENGTH = 82
+MINT_SUPPLY_OFFSET = 36
+MINT_DECIMALS_OFFSET = 44
+# dataSlice covering supply and decimals.
+MINT_SUPPLY_SLICE_LENGTH = 9
+# Token-2022 extensions: the base account is padded to 165 bytes, followed by
+# an account-type byte (1 = mint), then TLV entries (u16 type, u16 length, value).
+TOKEN_2022_ACCOUNT_TYPE_OFFSET = 165
+TOKEN_2022_EXTENSIONS_OFFSET = 166
+EXTENSION_INTEREST_BEARING_CONFIG = 10
+EXTENSION_TOKEN_METADATA = 19
+EXTENSION_SCALED_UI_AMOUNT = 25
+
+
+def decode_token_account_slice(data: bytes) -> Tuple[str, int]:
+    """
+    (mint, raw amount) from the first TOKEN_ACCOUNT_SLICE_LENGTH bytes of a
+    token account.
+    """
+    if len(data) < TOKEN_ACCOUNT_SLICE_LENGTH:
+        raise ValueError("token account slice shorter than mint+owner+amount")
+    (amount,) = struct.unpack_from("<Q", data, TOKEN_AMOUNT_OFFSET)
+    return encode_pubkey(data[:PUBKEY_LENGTH]), amount
+
+
+def decode_mint_supply(data: bytes, offset: int = MINT_SUPPLY_OFFSET) -> Tuple[int, int]:
+    """
+    (supply, decimals) from mint account data, or from a dataSlice starting
+    at the supply (offset=0).
+    """
+    if len(data) < offset + MINT_SUPPLY_SLICE_LENGTH:
+        raise ValueError("mint data shorter than supply+decimals")
+    supply, decimals = struct.unpack_from("<QB", data, offset)
+    return supply, decimals
+
+
+def is_mint_account(data: bytes) -> bool:
+    """
+    Whether full token-program account data is a mint (not a token account).
+    """
+    if len(data) == MINT_LENGTH:
+        return True
+    return len(data) > TOKEN_2022_ACCOUNT_TYPE_OFFSET and data[TOKEN_2022_ACCOUNT_TYPE_OFFSET] == 1
+
+
+def mint_extensions(data: bytes) -> Dict[int, bytes]:
+    """
+    Extension type -> value for a Token-2022 mint (empty for plain mints).
+    """
+    extensions: Dict[int, bytes] = {}
+    offset = TOKEN_2022_EXTENSIONS_OFFSET
+    while offset + 4 <= len(data):
+        ext_type, length = struct.unpack_from("<HH", data, offset)
+        if ext_type == 0:  # Uninitialized: padding, nothing follows
+            break
+        extensions[ext_type] = data[offset + 4 : offset + 4 + length]
+        offset += 4 + length
+    return extensions
+
+
+def token_metadata_symbol(value: bytes) -> Optional[str]:
+    """
+    Symbol from a TokenMetadata extension value: update authority and mint
+    (32 bytes each), then Borsh strings name, symbol, uri (u32 length + UTF-8).
+    """
+    offset = 2 * PUBKEY_LENGTH
+    try:
+        (name_length,) = struct.unpack_from("<I", value, offset)
+        offset += 4 + name_length
+        (symbol_length,) = struct.unpack_from("<I", value, offset)
+    except struct.error:
+        return None
+    raw = value[offset + 4 : offset + 4 + symbol_length]
+    if len(raw) != symbol_length:
+        return None
+    try:
+        return raw.decode("utf-8").strip() or None
+    except UnicodeDecodeError:
+        return None
+
+
+def ui_amount_string(amount: int, decimals: int) -> str:
+    """
+    Raw token amount as the RPC's uiAmountString: exact decimal, trailing
+    zeros (and a trailing point) trimmed.
+    """
+    if decimals <= 0:
+        return str(amount)
+    digits = str(amount).rjust(decimals + 1, "0")
+    return f"{digits[:-decimals]}.{digits[-decimals:]}".rstrip("0").rstrip(".")
+
+
+def ui_amount(amount: int, decimals: int) -> float:
+    """
+    Raw token amount as the RPC's uiAmount float: amount and 10^decimals are
+    each rounded to f64 before dividing, like spl_token's amount_to_ui_amount.
+    """
+    return float(amount) / float(10**decimals)
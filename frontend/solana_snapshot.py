@@ -0,0 +1,216 @@
+"""
+Read accounts straight from a Solana snapshot's account storage files
+(AppendVecs), without an RPC node.
+
+A snapshot archive (snapshot-<slot>-<hash>.tar.zst) unpacks to a directory
+whose accounts/ holds one storage file per slot, named <slot>.<id>. Each file
+is a run of stored accounts, every one an 8-byte-aligned record:
+
+  0    u64   write_version (obsolete)
+  8    u64   data_len
+  16   [32]  pubkey
+  48   u64   lamports
+  56   u64   rent_epoch
+  64   [32]  owner
+  96   bool  executable (+7 padding)
+  104  [32]  hash
+  136  data_len bytes of account data, padded to a multiple of 8
+
+Files are memory-mapped and walked record by record; only accounts whose
+owner (and optionally data size) or pubkey was asked for are copied out.
+An account can appear in several slots: the newest slot wins, and a
+zero-lamport record there means the account was closed. Storage files are
+scanned in parallel processes and merged in slot order.
+
+write_append_vec / write_snapshot_dir build small synthetic snapshots with
+the same layout, e.g. for offline fixtures (see mock_solana_rpc.py).
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+STORED_ACCOUNT_HEADER = struct.Struct("<QQ32sQQ32s?7x32s")  # 136 bytes
+# Largest account data the runtime allows; a bigger data_len means the rest
+# of the file is not account records.
+MAX_PERMITTED_DATA_LENGTH = 10 * 1024 * 1024
+_EMPTY_KEY = bytes(32)
+
+# owner -> (required data_len or None for any, bytes of data kept or None for all)
+OwnerFilter = Dict[bytes, Tuple[Optional[int], Optional[int]]]
+
+
+@dataclass
+class StoredAccount:
+    pubkey: bytes
+    lamports: int
+    owner: bytes
+    data: bytes
+    executable: bool = False
+    rent_epoch: int = 2**64 - 1
+
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def storage_files(snapshot_dir: str) -> List[Tuple[int, str]]:
+    """
+    (slot, path) of every storage file, oldest slot first. snapshot_dir is
+    an unpacked snapshot (containing accounts/) or the accounts directory.
+    """
+    accounts_dir = os.path.join(snapshot_dir, "accounts")
+    if not os.path.isdir(accounts_dir):
+        accounts_dir = snapshot_dir
+    files: List[Tuple[int, int, str]] = []
+    for name in os.listdir(accounts_dir):
+        slot, _, storage_id = name.partition(".")
+        if slot.isdigit() and storage_id.isdigit():
+            files.append((int(slot), int(storage_id), os.path.join(accounts_dir, name)))
+    if not files:
+        raise RuntimeError(f"No account storage files (<slot>.<id>) found under {snapshot_dir}")
+    files.sort()
+    return [(slot, path) for slot, _storage_id, path in files]
+
+
+def scan_storage_file(
+    path: str, *, owners: OwnerFilter, pubkeys: Sequence[bytes] = ()
+) -> Tuple[List[StoredAccount], List[bytes]]:
+    """
+    Accounts in one storage file matching `owners` or `pubkeys`, and the
+    pubkeys of zero-lamport (closed) records. Pubkey matches keep all their data.
+    """
+    wanted = frozenset(pubkeys)
+    matched: List[StoredAccount] = []
+    closed: List[bytes] = []
+    if os.path.getsize(path) == 0:
+        return matched, closed
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        offset = 0
+        while offset + STORED_ACCOUNT_HEADER.size <= size:
+            (
+                _write_version,
+                data_len,
+                pubkey,
+                lamports,
+                rent_epoch,
+                owner,
+                executable,
+                _hash,
+            ) = STORED_ACCOUNT_HEADER.unpack_from(mm, offset)
+            start = offset + STORED_ACCOUNT_HEADER.size
+            if data_len > MAX_PERMITTED_DATA_LENGTH or start + data_len > size:
+                break
+            if pubkey == _EMPTY_KEY and owner == _EMPTY_KEY and lamports == 0:
+                break  # zeroed tail past the last record
+            if lamports == 0:
+                closed.append(pubkey)
+            else:
+                spec = owners.get(owner)
+                keep: Optional[int] = None
+                if pubkey in wanted:
+                    keep = data_len
+                elif spec is not None and (spec[0] is None or spec[0] == data_len):
+                    keep = data_len if spec[1] is None else min(spec[1], data_len)
+                if keep is not None:
+                    matched.append(
+                        StoredAccount(
+                            pubkey=pubkey,
+                            lamports=lamports,
+                            owner=owner,
+                            data=mm[start : start + keep],
+                            executable=executable,
+                            rent_epoch=rent_epoch,
+                        )
+                    )
+            offset = _aligned(start + data_len)
+    return matched, closed
+
+
+def _scan_storage_file(
+    args: Tuple[str, OwnerFilter, Sequence[bytes]]
+) -> Tuple[List[StoredAccount], List[bytes]]:
+    path, owners, pubkeys = args
+    return scan_storage_file(path, owners=owners, pubkeys=pubkeys)
+
+
+def scan_snapshot(
+    snapshot_dir: str,
+    *,
+    owners: OwnerFilter,
+    pubkeys: Sequence[bytes] = (),
+    workers: Optional[int] = None,
+) -> Dict[bytes, StoredAccount]:
+    """
+    Live matching accounts of a snapshot, pubkey -> newest version, in the
+    order they first appear (oldest storage file first). Files are scanned by
+    up to `workers` processes (default: CPU count; 1 scans in-process).
+    """
+    files = storage_files(snapshot_dir)
+    jobs = [(path, owners, tuple(pubkeys)) for _slot, path in files]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        results: Iterable[Tuple[List[StoredAccount], List[bytes]]] = map(_scan_storage_file, jobs)
+        return _merge(results)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map() yields in submission order, i.e. oldest slot first.
+        return _merge(executor.map(_scan_storage_file, jobs, chunksize=1))
+
+
+def _merge(
+    results: Iterable[Tuple[List[StoredAccount], List[bytes]]]
+) -> Dict[bytes, StoredAccount]:
+    live: Dict[bytes, StoredAccount] = {}
+    for matched, closed in results:
+        for pubkey in closed:
+            live.pop(pubkey, None)
+        for account in matched:
+            live[account.pubkey] = account
+    return live
+
+
+def write_append_vec(path: str, accounts: Iterable[StoredAccount]) -> int:
+    """
+    Write accounts as one storage file; returns the number written.
+    """
+    count = 0
+    with open(path, "wb") as f:
+        for account in accounts:
+            header = STORED_ACCOUNT_HEADER.pack(
+                0,
+                len(account.data),
+                account.pubkey,
+                account.lamports,
+                account.rent_epoch,
+                account.owner,
+                account.executable,
+                bytes(32),
+            )
+            record = header + account.data
+            f.write(record + bytes(_aligned(len(record)) - len(record)))
+            count += 1
+    return count
+
+
+def write_snapshot_dir(
+    snapshot_dir: str, storages: Dict[int, Iterable[StoredAccount]]
+) -> List[str]:
+    """
+    Lay out storages (slot -> accounts) as <snapshot_dir>/accounts/<slot>.<id>,
+    the unpacked-snapshot shape storage_files expects.
+    """
+    accounts_dir = os.path.join(snapshot_dir, "accounts")
+    os.makedirs(accounts_dir, exist_ok=True)
+    paths: List[str] = []
+    for storage_id, (slot, accounts) in enumerate(sorted(storages.items())):
+        path = os.path.join(accounts_dir, f"{slot}.{storage_id}")
+        write_append_vec(path, accounts)
+        paths.append(path)
+    return paths
@@ -0,0 +1,514 @@
+"""
+Stake activation state of delegations at a given epoch: how many of each
+account's delegated lamports are effective, still activating (warming up) or
+deactivating (cooling down), following the stake program's warmup/cooldown
+rules against the cluster's StakeHistory sysvar.
+
+The history is read once per epoch (with the epoch the reduced 9% warmup /
+cooldown rate took effect) and cached at STAKE_HISTORY_CACHE_PATH, so no
+per-account RPC is needed. activation_arrays steps every delegation through
+the history together, one epoch at a time, as numpy vector operations when
+numpy is installed; otherwise the same rules run per delegation
+(activation_status).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback below
+    np = None
+
+import rpc_transport
+import run_metrics
+from solana_codec import account_data_bytes
+
+
+STAKE_HISTORY_SYSVAR = "SysvarStakeHistory1111111111111111111111111"
+CLOCK_SYSVAR = "SysvarC1ock11111111111111111111111111111111"
+EPOCH_SCHEDULE_SYSVAR = "SysvarEpochSchedu1e111111111111111111111111"
+# Feature gate for the reduced warmup/cooldown rate; its account records the
+# slot it was activated at.
+REDUCE_STAKE_WARMUP_COOLDOWN_FEATURE = "GwtDQBghCTBgmX2cpEGNPxTEBUTQRaDMGTr5qychdGMj"
+DEFAULT_WARMUP_COOLDOWN_RATE = 0.25
+NEW_WARMUP_COOLDOWN_RATE = 0.09
+# activation_epoch of bootstrap stakes; deactivation_epoch of stakes never deactivated.
+U64_MAX = 2**64 - 1
+# EpochSchedule warmup: epoch lengths double from 32 slots until first_normal_slot.
+MINIMUM_SLOTS_PER_EPOCH = 32
+STAKE_HISTORY_CACHE_PATH = "output/stake_history.json"
+
+_STAKE_HISTORY_ENTRY = struct.Struct("<QQQQ")  # epoch, effective, activating, deactivating
+_CLOCK_EPOCH = struct.Struct("<16xQ")  # slot, epoch_start_timestamp, epoch
+# slots_per_epoch, leader_schedule_slot_offset, warmup, first_normal_epoch, first_normal_slot
+_EPOCH_SCHEDULE = struct.Struct("<QQ?QQ")
+
+# (effective, activating, deactivating) lamports
+Activation = Tuple[int, int, int]
+# epoch -> (effective, activating, deactivating) cluster-wide lamports
+HistoryEntries = Dict[int, Tuple[int, int, int]]
+
+
+@dataclass
+class StakeHistory:
+    # Epoch the history was read in; entries run up to epoch - 1.
+    epoch: int
+    entries: HistoryEntries = field(default_factory=dict)
+    new_rate_activation_epoch: Optional[int] = None
+
+    def rate(self, epoch: int) -> float:
+        if self.new_rate_activation_epoch is not None and epoch >= self.new_rate_activation_epoch:
+            return NEW_WARMUP_COOLDOWN_RATE
+        return DEFAULT_WARMUP_COOLDOWN_RATE
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "epoch": self.epoch,
+            "new_rate_activation_epoch": self.new_rate_activation_epoch,
+            "entries": [[e, *values] for e, values in sorted(self.entries.items())],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StakeHistory":
+        return cls(
+            epoch=int(data["epoch"]),
+            entries={
+                int(e): (int(eff), int(act), int(deact)) for e, eff, act, deact in data["entries"]
+            },
+            new_rate_activation_epoch=(
+                int(data["new_rate_activation_epoch"])
+                if data.get("new_rate_activation_epoch") is not None
+                else None
+            ),
+        )
+
+
+def decode_stake_history(data: bytes) -> HistoryEntries:
+    """
+    StakeHistory sysvar data: a u64 count, then (epoch, effective, activating,
+    deactivating) u64 quadruples, newest epoch first.
+    """
+    if len(data) < 8:
+        raise ValueError("stake history shorter than its length prefix")
+    (count,) = struct.unpack_from("<Q", data, 0)
+    if 8 + count * _STAKE_HISTORY_ENTRY.size > len(data):
+        raise ValueError("stake history truncated")
+    entries: HistoryEntries = {}
+    for epoch, effective, activating, deactivating in _STAKE_HISTORY_ENTRY.iter_unpack(
+        data[8 : 8 + count * _STAKE_HISTORY_ENTRY.size]
+    ):
+        entries[epoch] = (effective, activating, deactivating)
+    return entries
+
+
+def epoch_for_slot(slot: int, schedule: Dict[str, Any]) -> int:
+    """
+    EpochSchedule.get_epoch, from a getEpochSchedule result.
+    """
+    first_normal_slot = int(schedule.get("firstNormalSlot", 0))
+    if slot < first_normal_slot:
+        return (slot + MINIMUM_SLOTS_PER_EPOCH).bit_length() - MINIMUM_SLOTS_PER_EPOCH.bit_length()
+    return int(schedule.get("firstNormalEpoch", 0)) + (slot - first_normal_slot) // int(
+        schedule["slotsPerEpoch"]
+    )
+
+
+def decode_epoch_schedule(data: bytes) -> Dict[str, Any]:
+    """
+    EpochSchedule sysvar data, keyed like a getEpochSchedule result.
+    """
+    if len(data) < _EPOCH_SCHEDULE.size:
+        raise ValueError("epoch schedule truncated")
+    slots, offset, warmup, first_normal_epoch, first_normal_slot = _EPOCH_SCHEDULE.unpack_from(
+        data
+    )
+    return {
+        "slotsPerEpoch": slots,
+        "leaderScheduleSlotOffset": offset,
+        "warmup": warmup,
+        "firstNormalEpoch": first_normal_epoch,
+        "firstNormalSlot": first_normal_slot,
+    }
+
+
+def _feature_activation_slot(data: Optional[bytes]) -> Optional[int]:
+    # Feature { activated_at: Option<u64> } (bincode).
+    if not data or data[0] != 1 or len(data) < 9:
+        return None
+    (slot,) = struct.unpack_from("<Q", data, 1)
+    return slot
+
+
+def fetch_stake_history(url: str, *, epoch: int) -> StakeHistory:
+    """
+    The StakeHistory sysvar and the reduced-rate feature gate, in one batch.
+    """
+    items = rpc_transport.post_json_rpc_batch(
+        url,
+        [
+            ("getEpochSchedule", []),
+            (
+                "getMultipleAccounts",
+                [
+                    [STAKE_HISTORY_SYSVAR, REDUCE_STAKE_WARMUP_COOLDOWN_FEATURE],
+                    {"commitment": "finalized", "encoding": "base64"},
+                ],
+            ),
+        ],
+        timeout=60,
+    )
+    schedule = items[0].unwrap()
+    sysvar, feature = (items[1].unwrap().get("value") or [None, None])[:2]
+    data = account_data_bytes((sysvar or {}).get("data"))
+    if data is None:
+        raise RuntimeError("StakeHistory sysvar is not available from the RPC node")
+    return _stake_history(epoch, data, account_data_bytes((feature or {}).get("data")), schedule)
+
+
+def _stake_history(
+    epoch: int, data: bytes, feature: Optional[bytes], schedule: Dict[str, Any]
+) -> StakeHistory:
+    try:
+        entries = decode_stake_history(data)
+    except ValueError as e:
+        raise RuntimeError(f"Could not decode the StakeHistory sysvar: {e}") from e
+    activated_slot = _feature_activation_slot(feature)
+    return StakeHistory(
+        epoch=epoch,
+        entries=entries,
+        new_rate_activation_epoch=(
+            epoch_for_slot(activated_slot, schedule) if activated_slot is not None else None
+        ),
+    )
+
+
+def stake_history_from_accounts(accounts: Dict[str, bytes]) -> StakeHistory:
+    """
+    Stake history from raw account data keyed by pubkey (e.g. read out of a
+    snapshot): the StakeHistory, Clock and EpochSchedule sysvars, plus the
+    reduced-rate feature account when it exists. The epoch is the Clock's.
+    """
+    missing = [
+        key
+        for key in (STAKE_HISTORY_SYSVAR, CLOCK_SYSVAR, EPOCH_SCHEDULE_SYSVAR)
+        if key not in accounts
+    ]
+    if missing:
+        raise RuntimeError(f"Sysvar account(s) not found: {', '.join(missing)}")
+    clock = accounts[CLOCK_SYSVAR]
+    if len(clock) < _CLOCK_EPOCH.size:
+        raise RuntimeError("Could not decode the Clock sysvar: truncated")
+    (epoch,) = _CLOCK_EPOCH.unpack_from(clock)
+    try:
+        schedule = decode_epoch_schedule(accounts[EPOCH_SCHEDULE_SYSVAR])
+    except ValueError as e:
+        raise RuntimeError(f"Could not decode the EpochSchedule sysvar: {e}") from e
+    return _stake_history(
+        epoch,
+        accounts[STAKE_HISTORY_SYSVAR],
+        accounts.get(REDUCE_STAKE_WARMUP_COOLDOWN_FEATURE),
+        schedule,
+    )
+
+
+def _read_history_cache(path: str) -> Tuple[Optional[StakeHistory], Optional[str]]:
+    # (history, genesis hash of the cluster it was read from)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return StakeHistory.from_dict(data), data.get("genesis_hash")
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None, None
+
+
+def _write_history_cache(path: str, history: StakeHistory, genesis_hash: str) -> None:
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"genesis_hash": genesis_hash, **history.to_dict()}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"WARN: could not write {path}: {e}")
+
+
+def load_stake_history(url: str, *, cache_path: str = STAKE_HISTORY_CACHE_PATH) -> StakeHistory:
+    """
+    Stake history for the current epoch: from cache_path when it was read in
+    this epoch from the same cluster (identified by its genesis hash; both
+    checks cost one batched request), otherwise fetched and cached.
+    """
+    info, genesis = rpc_transport.post_json_rpc_batch(
+        url,
+        [("getEpochInfo", [{"commitment": "finalized"}]), ("getGenesisHash", [])],
+        timeout=60,
+    )
+    epoch = int(info.unwrap()["epoch"])
+    genesis_hash = str(genesis.unwrap())
+    metrics = run_metrics.registry()
+    cached, cached_genesis = _read_history_cache(cache_path)
+    if cached is not None and cached.epoch == epoch and cached_genesis == genesis_hash:
+        metrics.cache_event("stake_history", "hit")
+        return cached
+    metrics.cache_event("stake_history", "stale" if cached is not None else "miss")
+    history = fetch_stake_history(url, epoch=epoch)
+    _write_history_cache(cache_path, history, genesis_hash)
+    return history
+
+
+def parse_epoch(value: Optional[str]) -> int:
+    """
+    Epoch column value (decimal string, or None for undelegated accounts) as
+    an int; None reads as U64_MAX, which yields no stake in any state.
+    """
+    return int(value) if value is not None else U64_MAX
+
+
+def activation_status(
+    stake: int,
+    activation_epoch: int,
+    deactivation_epoch: int,
+    target_epoch: int,
+    history: StakeHistory,
+) -> Activation:
+    """
+    (effective, activating, deactivating) lamports of one delegation at
+    target_epoch; Delegation::stake_activating_and_deactivating.
+    """
+    entries = history.entries
+    # Warmup: effective and activating stake as of target_epoch.
+    if activation_epoch == U64_MAX:  # bootstrap stake
+        effective, activating = stake, 0
+    elif activation_epoch == deactivation_epoch:
+        effective, activating = 0, 0
+    elif target_epoch == activation_epoch:
+        effective, activating = 0, stake
+    elif target_epoch < activation_epoch:
+        effective, activating = 0, 0
+    elif activation_epoch in entries:
+        prev_epoch, effective = activation_epoch, 0
+        while True:
+            cluster_effective, cluster_activating, _ = entries[prev_epoch]
+            current_epoch = prev_epoch + 1
+            if cluster_activating == 0:
+                break
+            weight = float(stake - effective) / float(cluster_activating)
+            newly_effective_cluster = float(cluster_effective) * history.rate(current_epoch)
+            effective += max(1, int(weight * newly_effective_cluster))
+            if effective >= stake:
+                effective = stake
+                break
+            if current_epoch >= target_epoch or current_epoch >= deactivation_epoch:
+                break
+            if current_epoch not in entries:
+                break
+            prev_epoch = current_epoch
+        activating = stake - effective
+    else:
+        # Activated before the history starts.
+        effective, activating = stake, 0
+
+    # Cooldown.
+    if target_epoch < deactivation_epoch:
+        return effective, activating, 0
+    if target_epoch == deactivation_epoch:
+        return effective, 0, effective
+    if deactivation_epoch not in entries:
+        return 0, 0, 0
+    prev_epoch = deactivation_epoch
+    while True:
+        cluster_effective, _, cluster_deactivating = entries[prev_epoch]
+        current_epoch = prev_epoch + 1
+        if cluster_deactivating == 0:
+            break
+        weight = float(effective) / float(cluster_deactivating)
+        newly_not_effective_cluster = float(cluster_effective) * history.rate(current_epoch)
+        effective = max(0, effective - max(1, int(weight * newly_not_effective_cluster)))
+        if effective == 0 or current_epoch >= target_epoch or current_epoch not in entries:
+            break
+        prev_epoch = current_epoch
+    return effective, 0, effective
+
+
+def activation_arrays(
+    stake: Sequence[int],
+    activation_epoch: Sequence[int],
+    deactivation_epoch: Sequence[int],
+    *,
+    target_epoch: int,
+    history: StakeHistory,
+) -> Tuple[List[int], List[int], List[int]]:
+    """
+    activation_status over whole columns: (effective, activating,
+    deactivating) lists, one value per delegation.
+    """
+    if np is None or not stake:
+        states = [
+            activation_status(s, a, d, target_epoch, history)
+            for s, a, d in zip(stake, activation_epoch, deactivation_epoch)
+        ]
+        return [s[0] for s in states], [s[1] for s in states], [s[2] for s in states]
+    effective, activating, deactivating = _activation_numpy(
+        stake, activation_epoch, deactivation_epoch, target_epoch, history
+    )
+    return effective.tolist(), activating.tolist(), deactivating.tolist()
+
+
+class _HistoryColumns:
+    """
+    History entries as dense arrays indexed by epoch - first, for lookups
+    across many delegations at once.
+    """
+
+    def __init__(self, history: StakeHistory) -> None:
+        self.first = min(history.entries, default=0)
+        size = max(history.entries, default=-1) - self.first + 1
+        self.present = np.zeros(size, dtype=bool)
+        for epoch in history.entries:
+            self.present[epoch - self.first] = True
+
+    def has(self, epochs: Any) -> Any:
+        idx = epochs - self.first
+        inside = (idx >= 0) & (idx < self.present.size)
+        found = np.zeros(epochs.shape, dtype=bool)
+        found[inside] = self.present[idx[inside]]
+        return found
+
+
+def _activation_numpy(
+    stake: Sequence[int],
+    activation_epoch: Sequence[int],
+    deactivation_epoch: Sequence[int],
+    target_epoch: int,
+    history: StakeHistory,
+) -> Tuple[Any, Any, Any]:
+    never = np.iinfo(np.int64).max  # stands in for U64_MAX
+    s = np.asarray(stake, dtype=np.int64)
+    a = np.minimum(np.array(activation_epoch, dtype=np.uint64), never).astype(np.int64)
+    d = np.minimum(np.array(deactivation_epoch, dtype=np.uint64), never).astype(np.int64)
+    columns = _HistoryColumns(history)
+
+    effective = np.zeros(s.size, dtype=np.int64)
+    activating = np.zeros(s.size, dtype=np.int64)
+    bootstrap = a == never
+    pending = ~bootstrap & (a != d)
+    effective[bootstrap] = s[bootstrap]
+    activating[pending & (a == target_epoch)] = s[pending & (a == target_epoch)]
+    started = pending & (a < target_epoch)
+    warming = started & columns.has(a)
+    effective[started & ~warming] = s[started & ~warming]
+    warming_idx = np.nonzero(warming)[0]
+    _warmup(s, a, d, effective, warming_idx, target_epoch, history)
+    activating[warming_idx] = s[warming_idx] - effective[warming_idx]
+
+    deactivating = np.zeros(s.size, dtype=np.int64)
+    at_deactivation = d == target_epoch
+    deactivating[at_deactivation] = effective[at_deactivation]
+    activating[at_deactivation] = 0
+    cooled = d < target_epoch
+    cooling_idx = np.nonzero(cooled & columns.has(d))[0]
+    effective[cooled & ~columns.has(d)] = 0
+    _cooldown(d, effective, cooling_idx, target_epoch, history)
+    deactivating[cooled] = effective[cooled]
+    activating[cooled] = 0
+    return effective, activating, deactivating
+
+
+def _to_int64(values: Any) -> Any:
+    # `as u64` truncation. Anything past 2^62 exceeds every delegation, so
+    # clamping there first keeps the cast defined without changing results.
+    return np.minimum(values, float(2**62)).astype(np.int64)
+
+
+def _warmup(
+    s: Any, a: Any, d: Any, effective: Any, idx: Any, target_epoch: int, history: StakeHistory
+) -> None:
+    """
+    Warmup walk for the delegations in idx (activation epoch in the history,
+    before target_epoch), writing their effective stake in place. All rows
+    whose walk reaches an epoch are advanced together.
+    """
+    order = idx[np.argsort(a[idx], kind="stable")]
+    starts = a[order]
+    admitted = 0
+    active = np.empty(0, dtype=np.int64)
+    current = np.empty(0, dtype=np.int64)
+    prev_epoch = int(starts[0]) if order.size else target_epoch
+    while prev_epoch < target_epoch:
+        end = int(np.searchsorted(starts, prev_epoch, side="right"))
+        if end > admitted:
+            active = np.concatenate((active, order[admitted:end]))
+            current = np.concatenate((current, np.zeros(end - admitted, dtype=np.int64)))
+            admitted = end
+        if active.size == 0:
+            if admitted == order.size:
+                break
+            prev_epoch = int(starts[admitted])
+            continue
+        cluster_effective, cluster_activating, _ = history.entries[prev_epoch]
+        current_epoch = prev_epoch + 1
+        if cluster_activating == 0:
+            done = np.ones(active.size, dtype=bool)
+        else:
+            remaining = s[active] - current
+            weight = remaining.astype(np.float64) / float(cluster_activating)
+            newly = weight * (float(cluster_effective) * history.rate(current_epoch))
+            newly = np.maximum(_to_int64(newly), 1)
+            capped = newly >= remaining
+            current = np.where(capped, s[active], current + newly)
+            done = capped | (current_epoch >= d[active])
+            if current_epoch >= target_epoch or current_epoch not in history.entries:
+                done[:] = True
+        effective[active[done]] = current[done]
+        active, current = active[~done], current[~done]
+        prev_epoch = current_epoch
+    effective[active] = current
+
+
+def _cooldown(
+    d: Any, effective: Any, idx: Any, target_epoch: int, history: StakeHistory
+) -> None:
+    """
+    Cooldown walk for the delegations in idx (deactivation epoch in the
+    history, before target_epoch), starting from their effective stake at
+    deactivation and writing what is still effective in place.
+    """
+    order = idx[np.argsort(d[idx], kind="stable")]
+    starts = d[order]
+    admitted = 0
+    active = np.empty(0, dtype=np.int64)
+    current = np.empty(0, dtype=np.int64)
+    prev_epoch = int(starts[0]) if order.size else target_epoch
+    while prev_epoch < target_epoch:
+        end = int(np.searchsorted(starts, prev_epoch, side="right"))
+        if end > admitted:
+            active = np.concatenate((active, order[admitted:end]))
+            current = np.concatenate((current, effective[order[admitted:end]]))
+            admitted = end
+        if active.size == 0:
+            if admitted == order.size:
+                break
+            prev_epoch = int(starts[admitted])
+            continue
+        cluster_effective, _, cluster_deactivating = history.entries[prev_epoch]
+        current_epoch = prev_epoch + 1
+        if cluster_deactivating == 0:
+            done = np.ones(active.size, dtype=bool)
+        else:
+            weight = current.astype(np.float64) / float(cluster_deactivating)
+            newly = weight * (float(cluster_effective) * history.rate(current_epoch))
+            newly = np.maximum(_to_int64(newly), 1)
+            current = np.where(newly >= current, 0, current - newly)
+            done = current == 0
+            if current_epoch >= target_epoch or current_epoch not in history.entries:
+                done[:] = True
+        effective[active[done]] = current[done]
+        active, current = active[~done], current[~done]
+        prev_epoch = current_epoch
+    effective[active] = current
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The collectors are plain scripts importing their siblings by name.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,88 @@
+"""
+aggregate_authorities / top_wallets against the row-by-row DictReader
+aggregation and full sort they replaced.
+"""
+
+import csv
+import random
+
+import pytest
+
+import profile_wallets
+
+FIELDS = ["stake_pubkey", "staker_authority", "withdraw_authority", "delegated_stake_lamports"]
+
+
+def _reference_aggregate(paths, mode):
+    agg = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                delegated = int(row.get("delegated_stake_lamports") or 0)
+                wallets = []
+                if mode in ("staker", "both"):
+                    wallets.append(row.get("staker_authority") or "UNKNOWN")
+                if mode in ("withdrawer", "both"):
+                    wallets.append(row.get("withdraw_authority") or "UNKNOWN")
+                for wallet in wallets:
+                    entry = agg.setdefault(wallet, {"delegated_lamports": 0, "stake_accounts": 0})
+                    entry["delegated_lamports"] += delegated
+                    entry["stake_accounts"] += 1
+    agg.pop("UNKNOWN", None)
+    return agg
+
+
+@pytest.fixture
+def stake_csvs(tmp_path):
+    rnd = random.Random(18)
+    authorities = [f"auth{i}" for i in range(40)] + [""]
+    paths = []
+    for n in range(5):
+        path = tmp_path / f"v{n}.stake_accounts.csv"
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for i in range(0 if n == 4 else 300):
+                # Past 2**53 now and then, where float sums would round (but
+                # nowhere near 2**63: all the SOL in existence is ~2**59 lamports).
+                lamports = rnd.choice([0, rnd.randrange(10**9, 10**13), 2**53 + i])
+                writer.writerow(
+                    [f"stake{n}_{i}", rnd.choice(authorities), rnd.choice(authorities), lamports]
+                )
+        paths.append(str(path))
+    return paths
+
+
+@pytest.mark.parametrize("mode", ["staker", "withdrawer", "both"])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_aggregate_matches_row_by_row(stake_csvs, mode, workers):
+    expected = _reference_aggregate(stake_csvs, mode)
+    result = profile_wallets.aggregate_authorities(stake_csvs, mode=mode, workers=workers)
+    # Same values and the same key order.
+    assert list(result.items()) == list(expected.items())
+
+
+def test_aggregate_without_numpy(stake_csvs, monkeypatch):
+    monkeypatch.setattr(profile_wallets, "np", None)
+    expected = _reference_aggregate(stake_csvs, "both")
+    result = profile_wallets.aggregate_authorities(stake_csvs, mode="both", workers=1)
+    assert list(result.items()) == list(expected.items())
+
+
+@pytest.mark.parametrize("top_n", [0, 1, 7, 25, 1000])
+def test_top_wallets_matches_full_sort(top_n):
+    rnd = random.Random(top_n)
+    # Few distinct values, so many ties that must keep their input order.
+    agg = {
+        f"w{i}": {
+            "delegated_lamports": rnd.choice([5, 10, 20]),
+            "stake_accounts": rnd.randint(1, 3),
+        }
+        for i in range(200)
+    }
+    expected = sorted(
+        agg.items(),
+        key=lambda kv: (kv[1]["delegated_lamports"], kv[1]["stake_accounts"]),
+        reverse=True,
+    )[:top_n]
+    assert profile_wallets.top_wallets(agg, top_n=top_n) == expected
@@ -0,0 +1,79 @@
+"""
+activation_arrays (numpy) against activation_status row by row, and the
+per-cluster stake history cache.
+"""
+
+import random
+
+import pytest
+
+import stake_activation
+from mock_solana_rpc import MockDataset, MockSolanaServer
+from stake_activation import U64_MAX, StakeHistory
+
+FIRST_EPOCH, LAST_EPOCH = 100, 199
+
+
+def _history(rnd, *, gap):
+    entries = {}
+    for epoch in range(FIRST_EPOCH, LAST_EPOCH + 1):
+        effective = rnd.randrange(3 * 10**17, 4 * 10**17)
+        # Quiet epochs (nothing activating/deactivating) end a walk early.
+        activating = 0 if rnd.random() < 0.1 else rnd.randrange(10**12, 10**16)
+        deactivating = 0 if rnd.random() < 0.1 else rnd.randrange(10**12, 10**16)
+        entries[epoch] = (effective, activating, deactivating)
+    if gap:
+        for epoch in range(150, 153):
+            del entries[epoch]
+    return StakeHistory(
+        epoch=LAST_EPOCH + 1, entries=entries, new_rate_activation_epoch=FIRST_EPOCH + 60
+    )
+
+
+def _delegations(rnd, count):
+    epochs = list(range(FIRST_EPOCH - 5, LAST_EPOCH + 6))
+    stake, activation, deactivation = [], [], []
+    for _ in range(count):
+        stake.append(rnd.choice([1, rnd.randrange(10**9, 10**15), 5 * 10**16]))
+        a = U64_MAX if rnd.random() < 0.05 else rnd.choice(epochs)
+        roll = rnd.random()
+        if roll < 0.5:
+            d = U64_MAX
+        elif roll < 0.55:
+            d = a
+        else:
+            d = rnd.choice(epochs)
+        activation.append(a)
+        deactivation.append(d)
+    return stake, activation, deactivation
+
+
+@pytest.mark.parametrize("gap", [False, True])
+@pytest.mark.parametrize("target_epoch", [FIRST_EPOCH - 3, FIRST_EPOCH, 130, 151, 199, 200, 204])
+def test_activation_arrays_match_activation_status(gap, target_epoch):
+    pytest.importorskip("numpy")
+    rnd = random.Random(target_epoch * 2 + gap)
+    history = _history(rnd, gap=gap)
+    stake, activation, deactivation = _delegations(rnd, 3000)
+    expected = [
+        stake_activation.activation_status(s, a, d, target_epoch, history)
+        for s, a, d in zip(stake, activation, deactivation)
+    ]
+    columns = stake_activation.activation_arrays(
+        stake, activation, deactivation, target_epoch=target_epoch, history=history
+    )
+    assert list(zip(*columns)) == expected
+
+
+def test_stake_history_cache_is_per_cluster(tmp_path):
+    cache_path = str(tmp_path / "stake_history.json")
+    with MockSolanaServer(MockDataset(stake_accounts=50, seed=1)) as first:
+        history = stake_activation.load_stake_history(first.url, cache_path=cache_path)
+        calls = first.stats().rpc_calls["getMultipleAccounts"]
+        assert calls > 0
+        assert stake_activation.load_stake_history(first.url, cache_path=cache_path) == history
+        assert first.stats().rpc_calls["getMultipleAccounts"] == calls
+    # Same epoch, different genesis hash: the cached history must not be reused.
+    with MockSolanaServer(MockDataset(stake_accounts=50, seed=2)) as second:
+        stake_activation.load_stake_history(second.url, cache_path=cache_path)
+        assert second.stats().rpc_calls["getMultipleAccounts"] > 0
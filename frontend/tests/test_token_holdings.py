@@ -0,0 +1,45 @@
+"""
+Token holdings decoded from sliced base64 accounts against the jsonParsed
+accounts they replace, over the mock's wallets (dust and zero balances,
+Token-2022 mints with metadata and a scaled UI amount).
+"""
+
+import pytest
+
+import profile_wallets
+from mock_solana_rpc import MockDataset, MockSolanaServer
+from profile_wallets import TOKEN_2022_PROGRAM_ID, TOKEN_PROGRAM_ID
+
+PROGRAMS = (TOKEN_PROGRAM_ID, TOKEN_2022_PROGRAM_ID)
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockSolanaServer(MockDataset(validators=2, stake_accounts=200, wallets=80)) as srv:
+        yield srv
+
+
+def _token_accounts(url, wallet, encoding):
+    calls = [
+        profile_wallets._token_accounts_call(wallet, program, encoding=encoding)
+        for program in PROGRAMS
+    ]
+    batch = profile_wallets._post_json_rpc_batch_url(url, calls)
+    return [profile_wallets._token_accounts_value(item.unwrap()) for item in batch]
+
+
+def test_base64_holdings_match_json_parsed(server):
+    mint_cache = profile_wallets.MintInfoCache(server.url, path=None)
+    compared = dropped = 0
+    for wallet in server.network.wallets:
+        parsed = _token_accounts(server.url, wallet, "jsonParsed")
+        sliced = _token_accounts(server.url, wallet, "base64")
+        expected = profile_wallets.extract_token_holdings([*parsed[0], *parsed[1]])
+        holdings = profile_wallets.decode_token_holdings(
+            wallet, list(zip(PROGRAMS, sliced)), url=server.url, mint_cache=mint_cache
+        )
+        assert holdings == expected, wallet
+        compared += len(holdings)
+        dropped += len(sliced[0]) + len(sliced[1]) - len(holdings)
+    # The fixture really exercised both kept and dropped accounts.
+    assert compared and dropped